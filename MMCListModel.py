@@ -0,0 +1,264 @@
+import time
+import typing
+from PyQt5 import QtCore
+from PyQt5.QtCore import Qt
+from background_jobs import get_details_job_runner
+import tracing
+from reconcile import ReconcileResult
+
+ROW_MIME_TYPE = "application/x-mmc-list-row"
+
+MODS_COLUMNS = [("name", "Name"), ("jars", "Jars"), ("size", "Size"), ("loader", "Loader"), ("last_applied", "Last applied")]
+OPTIONS_COLUMNS = [("name", "Name"), ("size", "Size"), ("last_applied", "Last applied")]
+
+
+def format_size(size: int) -> str:
+    """
+    :param size: A size in bytes
+    :return: The size in the largest unit that keeps it above 1, e.g. "1.5 MB"
+    """
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def format_detail(key: str, value: typing.Any) -> str:
+    """
+    Formats a value of a details column for display
+    :param key: The key of the column
+    :param value: The value to be displayed
+    :return: The text shown in the column
+    """
+    if value is None:
+        return ""
+    if key == "size":
+        return format_size(value)
+    if key == "last_applied":
+        return time.strftime("%Y-%m-%d %H:%M", time.localtime(value))
+    return str(value)
+
+
+class MMCListModel(QtCore.QAbstractTableModel):
+    """
+    The resolved list of mods folders/options files, with details columns filled in lazily
+    The details of a row are only computed when the view first asks for them, i.e. when the row scrolls into view,
+    in a background job, and are cached until they are invalidated.
+    While filtered, e.g. by a search, only the matching items are rows, in the same order.
+    """
+
+    # Emitted after the user moved a row by dragging it
+    order_changed = QtCore.pyqtSignal()
+
+    def __init__(self, is_mods: bool) -> None:
+        super(MMCListModel, self).__init__()
+
+        self.is_mods = is_mods
+        self.columns = MODS_COLUMNS if is_mods else OPTIONS_COLUMNS
+        # The rows shown, every item unless filtered
+        self.items: typing.List[str] = []
+        self.all_items: typing.List[str] = []
+        self.filter_names: typing.Optional[typing.Set[str]] = None
+
+        # Called with a name to compute its details, a dict keyed like self.columns
+        self.detail_provider: typing.Optional[typing.Callable[[str], typing.Dict[str, typing.Any]]] = None
+        self._details: typing.Dict[str, typing.Dict[str, typing.Any]] = {}
+        # Name -> the invalidation count when its details were requested, details requested before an invalidation may
+        # be stale and are computed again instead of kept
+        self._loading_details: typing.Dict[str, int] = {}
+        self._details_generation = 0
+        # The detail provider must only look up thread-safe ModController state, e.g. the metadata index and the state
+        # store, anything slower, like reading jars, is left to the shared jobs, which invalidate the details afterwards
+        self._details_runner = get_details_job_runner()
+
+    def rowCount(self, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.items)
+
+    def columnCount(self, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.columns)
+
+    def data(self, index: QtCore.QModelIndex, role: int = Qt.DisplayRole) -> typing.Any:
+        if not index.isValid() or role not in (Qt.DisplayRole, Qt.ToolTipRole):
+            return None
+
+        name = self.items[index.row()]
+        key = self.columns[index.column()][0]
+        if key == "name":
+            return name
+        return format_detail(key, self.details(name).get(key))
+
+    def headerData(self, section: int, orientation: Qt.Orientation, role: int = Qt.DisplayRole) -> typing.Any:
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.columns[section][1]
+        return None
+
+    def details(self, name: str) -> typing.Dict[str, typing.Any]:
+        """
+        Retrieves the details of a row, starting to compute them on first use
+        :param name: The name of the mods folder/options file
+        :return: The details, keyed like self.columns, empty while they are being computed
+        """
+        details = self._details.get(name)
+        if details is not None:
+            return details
+
+        if self.detail_provider is not None and name not in self._loading_details:
+            generation = self._details_generation
+            self._loading_details[name] = generation
+            provider = self.detail_provider
+            self._details_runner.submit(f"Reading {name}", lambda job: provider(name),
+                                        on_done=lambda loaded: self._details_loaded(name, loaded, generation),
+                                        on_error=lambda error: self._details_loaded(name, {}, generation))
+        return {}
+
+    def _details_loaded(self, name: str, details: typing.Dict[str, typing.Any], generation: int) -> None:
+        if self._loading_details.get(name) == generation:
+            del self._loading_details[name]
+            self._details[name] = details
+        if self.items:
+            # Only the visible rows are repainted, so there is no need to look up which row this is
+            self.dataChanged.emit(self.index(0, 1), self.index(len(self.items) - 1, len(self.columns) - 1))
+
+    def cancel_details(self) -> None:
+        """
+        Cancels the details still being computed and waits for the running ones to stop, used when closing
+        :return: None
+        """
+        self._details_runner.cancel_all()
+        self._details_runner.wait()
+        self._loading_details.clear()
+
+    def invalidate_details(self, names: typing.Optional[typing.Iterable[str]] = None) -> None:
+        """
+        Drops cached details so they are computed again the next time they are shown
+        :param names: The rows to be invalidated, defaults to all of them
+        :return: None
+        """
+        self._details_generation += 1
+        if names is None:
+            self._details.clear()
+            self._loading_details.clear()
+        else:
+            for name in names:
+                self._details.pop(name, None)
+                self._loading_details.pop(name, None)
+        if self.items:
+            self.dataChanged.emit(self.index(0, 1), self.index(len(self.items) - 1, len(self.columns) - 1))
+
+    def set_items(self, items: typing.List[str]) -> None:
+        """
+        Replaces every row
+        :param items: The new rows, in display order
+        :return: None
+        """
+        self.beginResetModel()
+        self.all_items = list(items)
+        self.items = self._filtered(self.all_items)
+        self.endResetModel()
+
+    def _filtered(self, items: typing.List[str]) -> typing.List[str]:
+        if self.filter_names is None:
+            return list(items)
+        return [item for item in items if item in self.filter_names]
+
+    def set_filter(self, names: typing.Optional[typing.Set[str]]) -> None:
+        """
+        Only shows the given items
+        Resetting the model is cheaper than inserting/removing each row when thousands change on a keystroke,
+        the view only lays out the visible rows anyway.
+        :param names: The items to be shown, None shows every item
+        :return: None
+        """
+        if names is None and self.filter_names is None:
+            return
+        self.beginResetModel()
+        self.filter_names = None if names is None else set(names)
+        self.items = self._filtered(self.all_items)
+        self.endResetModel()
+
+    def apply_diff(self, result: ReconcileResult) -> None:
+        """
+        Removes and inserts only the rows that changed
+        Falls back to replacing every row if the model was not showing the order the diff was made against
+        :param result: The reconciled list of mods folders/options files
+        :return: None
+        """
+
+        if self.filter_names is not None:
+            for name in result.removed:
+                self._details.pop(name, None)
+            self.set_items(result.resolved)
+            return
+
+        removed = set(result.removed)
+        for row in reversed(range(len(self.items))):
+            if self.items[row] in removed:
+                self.beginRemoveRows(QtCore.QModelIndex(), row, row)
+                del self.items[row]
+                self.endRemoveRows()
+        for name in removed:
+            self._details.pop(name, None)
+
+        # Added items always go to the top of the resolved list, in order
+        if result.added:
+            self.beginInsertRows(QtCore.QModelIndex(), 0, len(result.added) - 1)
+            self.items[0:0] = result.added
+            self.endInsertRows()
+
+        if self.items != result.resolved:
+            tracing.warning("model out of sync, rebuilding", is_mods=self.is_mods)
+            self.set_items(result.resolved)
+        self.all_items = list(self.items)
+
+    def move_row(self, src_row: int, dst_row: int) -> bool:
+        """
+        Moves a row in place
+        :param src_row: The row to be moved
+        :param dst_row: The row to insert it before, len(items) to move it to the end
+        :return: Whether or not the row moved
+        """
+        if dst_row in (src_row, src_row + 1) or not 0 <= src_row < len(self.items):
+            return False
+
+        if self.filter_names is not None:
+            # The other items' places in between the shown ones are unknown to the user
+            return False
+
+        self.beginMoveRows(QtCore.QModelIndex(), src_row, src_row, QtCore.QModelIndex(), dst_row)
+        item = self.items.pop(src_row)
+        self.items.insert(dst_row - 1 if dst_row > src_row else dst_row, item)
+        self.endMoveRows()
+        self.all_items = list(self.items)
+        return True
+
+    def flags(self, index: QtCore.QModelIndex) -> Qt.ItemFlags:
+        if not index.isValid():
+            return Qt.ItemIsDropEnabled
+        return Qt.ItemIsSelectable | Qt.ItemIsEnabled | Qt.ItemIsDragEnabled | Qt.ItemIsDropEnabled
+
+    def supportedDropActions(self) -> Qt.DropActions:
+        return Qt.MoveAction
+
+    def mimeTypes(self) -> typing.List[str]:
+        return [ROW_MIME_TYPE]
+
+    def mimeData(self, indexes: typing.List[QtCore.QModelIndex]) -> QtCore.QMimeData:
+        mime_data = QtCore.QMimeData()
+        # Tagged with the model so rows can't be dropped into the other list
+        mime_data.setData(ROW_MIME_TYPE, f"{id(self)}:{indexes[0].row()}".encode())
+        return mime_data
+
+    def dropMimeData(self, data: QtCore.QMimeData, action: Qt.DropAction, row: int, column: int, parent: QtCore.QModelIndex) -> bool:
+        if action != Qt.MoveAction or not data.hasFormat(ROW_MIME_TYPE):
+            return False
+        model_id, src_row = bytes(data.data(ROW_MIME_TYPE)).decode().split(":")
+        if int(model_id) != id(self):
+            return False
+
+        if row == -1:
+            row = parent.row() if parent.isValid() else len(self.items)
+        if self.move_row(int(src_row), row):
+            self.order_changed.emit()
+
+        # The row was already moved, returning True would make the view remove the dragged row afterwards
+        return False
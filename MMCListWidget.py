@@ -1,44 +1,107 @@
 import PyQt5
 from PyQt5 import QtWidgets
 from PyQt5.QtCore import Qt
-from PyQt5.QtWidgets import QAbstractItemView
+from PyQt5.QtWidgets import QAbstractItemView, QHeaderView
 import minecraft_mod_controller as mmc
-from print_debug import print_debug
+from background_jobs import get_job_runner
+from MMCListModel import MMCListModel
+import tracing
+from reconcile import ReconcileResult
 import typing
 
 
-class MMCListWidget(PyQt5.QtWidgets.QListWidget):
+class MMCListWidget(PyQt5.QtWidgets.QTableView):
     def __init__(self, label):
         super(MMCListWidget, self).__init__()
 
+        self.label = label
+        self.list_model = MMCListModel(is_mods=(self.label == "mods_widget"))
+        self.list_model.order_changed.connect(self.order_changed_handler)
+        self.setModel(self.list_model)
+
         self.setEditTriggers(QAbstractItemView.NoEditTriggers)
         self.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.setDragEnabled(True)
         self.setAcceptDrops(True)
-        self.setDragDropMode(QAbstractItemView.DragDrop)
+        self.setDropIndicatorShown(True)
+        self.setDragDropOverwriteMode(False)
+        self.setDragDropMode(QAbstractItemView.InternalMove)
+        self.setShowGrid(False)
+        self.setWordWrap(False)
 
-        self.label = label
+        # Fixed row heights and no resize-to-contents, so the view never measures rows that aren't visible
+        self.verticalHeader().hide()
+        self.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.verticalHeader().setDefaultSectionSize(self.fontMetrics().height() + 6)
+        self.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.horizontalHeader().setHighlightSections(False)
 
         self.drop_event_func = None
 
-    def dropEvent(self, e):
-        mod_controller = mmc.ModController()
-        print_debug("drop event")
-        e.ignore()
-        super(MMCListWidget, self).dropEvent(e)
-        self.takeItem(self.currentRow())
-        items_text_list = [str(self.item(i).text()) for i in range(self.count())]
-        mod_controller.set_mods_or_options_order(items_text_list, is_mods=(self.label == "mods_widget"))
-        print_debug(items_text_list)
+    def order_changed_handler(self) -> None:
+        """
+        Stores the new order in a background job after a row was dragged to another position
+        :return: None
+        """
+        tracing.debug("drop event", widget=self.objectName())
+        items = list(self.list_model.all_items)
+        is_mods = self.list_model.is_mods
+        get_job_runner().submit("Saving order", lambda job: mmc.get_mod_controller().set_mods_or_options_order(items, is_mods=is_mods),
+                                supersede_key=f"save order {is_mods}")
         if self.drop_event_func is not None:
             self.drop_event_func()
 
-    def dragMoveEvent(self, e):
-        super(MMCListWidget, self).dragMoveEvent(e)
-        print_debug("drag move event")
-
-    def dragLeaveEvent(self, e):
-        super(MMCListWidget, self).dragLeaveEvent(e)
-        print_debug("drag leave event")
-
     def set_drop_event_func(self, func: typing.Callable):
         self.drop_event_func = func
+
+    def set_detail_provider(self, func: typing.Callable[[str], typing.Dict[str, typing.Any]]) -> None:
+        """
+        Sets what computes the details columns of a row, called in a background job once a row is visible
+        :param func: Called with the name of the row, returns its details keyed by column
+        :return: None
+        """
+        self.list_model.detail_provider = func
+        self.list_model.invalidate_details()
+
+    def selected_name(self) -> typing.Optional[str]:
+        """
+        :return: The name of the selected mods folder/options file, or None if nothing is selected
+        """
+        rows = self.selectionModel().selectedRows()
+        if len(rows) == 0:
+            return None
+        return self.list_model.items[rows[0].row()]
+
+    def set_items(self, items: typing.List[str]) -> None:
+        """
+        Replaces every item in the list, keeping the selection if the selected item is still there
+        :param items: The new items, in display order
+        :return: None
+        """
+        selected_name = self.selected_name()
+        self.list_model.set_items(items)
+        if selected_name is not None and selected_name in self.list_model.items:
+            self.selectRow(self.list_model.items.index(selected_name))
+
+    def set_filter(self, names: typing.Optional[typing.Set[str]]) -> None:
+        """
+        Only shows the rows of the given names, e.g. the results of a search, keeping the selection if it still matches
+        Rows can only be dragged to another position while every row is shown
+        :param names: The names to be shown, None shows every row
+        :return: None
+        """
+        selected_name = self.selected_name()
+        self.list_model.set_filter(names)
+        self.setDragEnabled(names is None)
+        if selected_name is not None and selected_name in self.list_model.items:
+            self.selectRow(self.list_model.items.index(selected_name))
+
+    def apply_diff(self, result: ReconcileResult) -> None:
+        """
+        Removes and inserts only the items that changed, keeping the selection and scroll position
+        :param result: The reconciled list of mods folders/options files
+        :return: None
+        """
+        self.list_model.apply_diff(result)
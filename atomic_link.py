@@ -0,0 +1,183 @@
+import contextlib
+import errno
+import os
+import typing
+import tracing
+
+# Windows' ERROR_PRIVILEGE_NOT_HELD, symlinks need developer mode or admin rights there
+ERROR_PRIVILEGE_NOT_HELD = 1314
+
+
+class SymlinkPrivilegeError(OSError):
+    """
+    Raised when creating a symlink fails because the user isn't allowed to create symlinks at all
+    """
+    pass
+
+
+def read_link_target(path: str) -> typing.Optional[str]:
+    """
+    Reads where a symlink points to
+    :param path: The path of the symlink
+    :return: The target of the symlink, or None if the path is not a symlink
+    """
+    try:
+        return os.readlink(path)
+    except (OSError, ValueError):
+        return None
+
+
+def _temp_path(dst: str, suffix: str) -> str:
+    return f"{dst}.mmc-{os.getpid()}-{suffix}"
+
+
+@contextlib.contextmanager
+def atomic_write(path: str, mode: str = "w", *, encoding: typing.Optional[str] = None, durable: bool = True
+                 ) -> typing.Iterator[typing.IO]:
+    """
+    Writes a file so it holds either all of its old contents or all of its new ones, even if the process dies partway
+    The contents are written next to the file and swapped in with os.replace, a failed write leaves no temporary file.
+    Use as a context manager: the file is replaced when the block exits normally.
+    :param path: The file to be written
+    :param mode: "w" for text, "wb" for bytes
+    :param encoding: The text encoding, the platform's default if None
+    :param durable: Flush the contents to disk before swapping them in, caches that are rebuilt if lost can skip it
+    :return: The open temporary file to write to
+    """
+    temp_file = _temp_path(path, "write")
+    try:
+        with open(temp_file, mode, encoding=encoding) as f:
+            yield f
+            if durable:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(temp_file, path)
+    except BaseException:
+        try:
+            os.unlink(temp_file)
+        except OSError:
+            pass
+        raise
+
+
+def _remove(path: str) -> None:
+    if os.path.islink(path) or os.path.isfile(path):
+        os.unlink(path)
+    elif os.path.isdir(path):
+        os.rmdir(path)
+
+
+def swap_symlink(src: str, dst: str, *, target_is_directory: bool) -> None:
+    """
+    Points the symlink dst at src without a moment where dst doesn't exist
+    The new link is staged next to dst and swapped in with os.replace. dst must be a symlink or not exist.
+    :param src: The file/folder to be linked to
+    :param dst: The symlink to be created or replaced
+    :param target_is_directory: Whether src is a folder, needed on Windows
+    :return: None
+    :raises SymlinkPrivilegeError: If the user isn't allowed to create symlinks
+    """
+    staged = _temp_path(dst, "link")
+    if os.path.lexists(staged):
+        os.unlink(staged)
+    try:
+        os.symlink(src, staged, target_is_directory=target_is_directory)
+    except OSError as e:
+        if getattr(e, "winerror", None) == ERROR_PRIVILEGE_NOT_HELD or e.errno == errno.EPERM:
+            raise SymlinkPrivilegeError(e.errno, e.strerror, staged) from e
+        raise
+
+    try:
+        os.replace(staged, dst)
+    except OSError:
+        if not os.path.islink(dst):
+            os.unlink(staged)
+            raise
+        # Windows can't replace a directory symlink in place, so move the old one aside for the shortest possible window
+        old = _temp_path(dst, "old")
+        os.replace(dst, old)
+        try:
+            os.replace(staged, dst)
+        except OSError:
+            os.replace(old, dst)
+            os.unlink(staged)
+            raise
+        os.unlink(old)
+
+
+class LinkTransaction:
+    """
+    Points several symlinks at new targets, and puts every one of them back if any step fails
+    Use as a context manager: changes are committed when the block exits normally and rolled back on an exception.
+    """
+
+    def __init__(self) -> None:
+        # (dst, previous link target, backup of the real file/folder at dst, is a folder), in the order they were made
+        self._undo: typing.List[typing.Tuple[str, typing.Optional[str], typing.Optional[str], bool]] = []
+
+    def link(self, src: str, dst: str, *, target_is_directory: bool) -> bool:
+        """
+        Points dst at src, skipping the swap when it already does
+        A real file at dst is kept as a backup until commit, a real folder at dst must be empty.
+        :param src: The file/folder to be linked to
+        :param dst: The location of the link
+        :param target_is_directory: Whether src is a folder
+        :return: Whether or not dst had to be changed
+        """
+
+        previous_target = read_link_target(dst)
+        if previous_target == src:
+            return False
+
+        backup = None
+        if previous_target is None and os.path.lexists(dst):
+            if os.path.isdir(dst) and os.listdir(dst):
+                raise OSError(errno.ENOTEMPTY, f"{dst} is a folder with files in it, move them into a mods folder first", dst)
+            backup = _temp_path(dst, "backup")
+            os.replace(dst, backup)
+
+        try:
+            swap_symlink(src, dst, target_is_directory=target_is_directory)
+        except OSError:
+            if backup is not None:
+                os.replace(backup, dst)
+            raise
+
+        self._undo.append((dst, previous_target, backup, target_is_directory))
+        tracing.debug("linked", dst=dst, src=src)
+        return True
+
+    def commit(self) -> None:
+        """
+        Keeps the new links and deletes the backups of anything they replaced
+        :return: None
+        """
+        for _dst, _previous_target, backup, _is_dir in self._undo:
+            if backup is not None:
+                _remove(backup)
+        self._undo.clear()
+
+    def rollback(self) -> None:
+        """
+        Restores every link/file/folder changed so far, most recent first
+        :return: None
+        """
+        for dst, previous_target, backup, is_dir in reversed(self._undo):
+            tracing.info("rolling back", dst=dst)
+            if previous_target is not None:
+                swap_symlink(previous_target, dst, target_is_directory=is_dir)
+            elif backup is not None:
+                os.unlink(dst)
+                os.replace(backup, dst)
+            else:
+                os.unlink(dst)
+        self._undo.clear()
+
+    def __enter__(self) -> "LinkTransaction":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
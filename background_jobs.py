@@ -0,0 +1,222 @@
+import threading
+import typing
+from PyQt5 import QtCore
+import tracing
+
+
+class JobCancelled(Exception):
+    """
+    Raised inside a job by Job.check_cancelled once the job was cancelled
+    """
+    pass
+
+
+class Job:
+    """
+    A piece of work run on a JobRunner's thread pool
+    The work is a function called with the job, so it can report progress and stop early when cancelled.
+    """
+
+    def __init__(self, name: str, func: typing.Callable[["Job"], typing.Any], runner: "JobRunner",
+                 on_done: typing.Optional[typing.Callable[[typing.Any], None]] = None,
+                 on_error: typing.Optional[typing.Callable[[Exception], None]] = None,
+                 supersede_key: typing.Optional[str] = None, cancellable: bool = False) -> None:
+        self.name = name
+        self.func = func
+        self.runner = runner
+        self.on_done = on_done
+        self.on_error = on_error
+        self.supersede_key = supersede_key
+        self.cancellable = cancellable
+        self._cancelled = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def cancel(self) -> None:
+        """
+        Asks the job to stop, its result is dropped even if it finishes anyway
+        :return: None
+        """
+        self._cancelled.set()
+
+    def check_cancelled(self) -> None:
+        """
+        Stops the job here if it was cancelled, call between steps of the work
+        :return: None
+        """
+        if self.cancelled:
+            raise JobCancelled(self.name)
+
+    def report_progress(self, done: int, total: int) -> None:
+        """
+        Reports progress to the GUI thread, and stops the job here if it was cancelled
+        :param done: Steps finished so far
+        :param total: Steps in total
+        :return: None
+        """
+        self.check_cancelled()
+        self.runner.progress.emit(self.name, done, total)
+
+
+class _JobRunnable(QtCore.QRunnable):
+    def __init__(self, job: Job) -> None:
+        super(_JobRunnable, self).__init__()
+        self.job = job
+
+    def run(self) -> None:
+        # Cancelled jobs still report back, so the runner stops counting them, and their result is dropped there
+        job = self.job
+        if job.cancelled:
+            job.runner._finished.emit(job, None)
+            return
+        try:
+            with tracing.span("job", job=job.name):
+                result = job.func(job)
+        except JobCancelled:
+            tracing.debug("job cancelled", job=job.name)
+            job.runner._finished.emit(job, None)
+            return
+        except Exception as e:
+            job.runner._failed.emit(job, e)
+            return
+        job.runner._finished.emit(job, result)
+
+
+class JobRunner(QtCore.QObject):
+    """
+    Runs jobs off the GUI thread and hands their results back to it through Qt signals
+    Jobs submitted with the same supersede_key replace each other: the older one is cancelled and its result dropped.
+    """
+
+    # (job name, steps done, steps total), emitted on the GUI thread
+    progress = QtCore.pyqtSignal(str, int, int)
+    # Emitted on the GUI thread when the number of running jobs changes
+    running_changed = QtCore.pyqtSignal(int)
+
+    _finished = QtCore.pyqtSignal(object, object)
+    _failed = QtCore.pyqtSignal(object, object)
+
+    def __init__(self, max_threads: int = 1) -> None:
+        """
+        :param max_threads: Jobs run at once, 1 runs them one at a time in the order submitted
+        """
+        super(JobRunner, self).__init__()
+        self.thread_pool = QtCore.QThreadPool()
+        self.thread_pool.setMaxThreadCount(max_threads)
+
+        self.running: typing.List[Job] = []
+        self._latest: typing.Dict[str, Job] = {}
+
+        self._finished.connect(self._finished_handler)
+        self._failed.connect(self._failed_handler)
+
+    def submit(self, name: str, func: typing.Callable[[Job], typing.Any],
+               on_done: typing.Optional[typing.Callable[[typing.Any], None]] = None,
+               on_error: typing.Optional[typing.Callable[[Exception], None]] = None,
+               supersede_key: typing.Optional[str] = None, cancellable: bool = False) -> Job:
+        """
+        Queues a job
+        :param name: Shown while the job reports progress
+        :param func: The work, called on a worker thread with the job
+        :param on_done: Called on the GUI thread with the result, unless the job was cancelled or superseded
+        :param on_error: Called on the GUI thread with the exception if the work raised
+        :param supersede_key: Cancels the unfinished job submitted with the same key
+        :param cancellable: Whether cancel_cancellable stops it, for long running work that can be redone later,
+                            like indexing. Jobs that store the user's changes are left to finish
+        :return: The job
+        """
+        job = Job(name, func, self, on_done, on_error, supersede_key, cancellable)
+        if supersede_key is not None:
+            previous = self._latest.get(supersede_key)
+            if previous is not None:
+                previous.cancel()
+            self._latest[supersede_key] = job
+
+        self.running.append(job)
+        self.running_changed.emit(len(self.running))
+        self.thread_pool.start(_JobRunnable(job))
+        return job
+
+    def cancel_all(self) -> None:
+        """
+        Cancels every queued or running job
+        :return: None
+        """
+        for job in self.running:
+            job.cancel()
+
+    def cancel_cancellable(self) -> None:
+        """
+        Cancels every queued or running job submitted as cancellable
+        :return: None
+        """
+        for job in self.running:
+            if job.cancellable:
+                job.cancel()
+
+    def has_cancellable(self) -> bool:
+        """
+        :return: Whether any job submitted as cancellable is queued or running
+        """
+        return any(job.cancellable for job in self.running)
+
+    def _job_ended(self, job: Job) -> bool:
+        """
+        Forgets a job that ended
+        :param job: The job
+        :return: Whether or not its result should be delivered
+        """
+        if job in self.running:
+            self.running.remove(job)
+        self.running_changed.emit(len(self.running))
+        if job.supersede_key is not None and self._latest.get(job.supersede_key) is job:
+            del self._latest[job.supersede_key]
+        return not job.cancelled
+
+    def _finished_handler(self, job: Job, result: typing.Any) -> None:
+        if self._job_ended(job) and job.on_done is not None:
+            job.on_done(result)
+
+    def _failed_handler(self, job: Job, error: Exception) -> None:
+        tracing.error("job failed", job=job.name, error=f"{type(error).__name__}: {error}")
+        if self._job_ended(job) and job.on_error is not None:
+            job.on_error(error)
+
+    def wait(self) -> None:
+        """
+        Blocks until every job finished, used when closing
+        :return: None
+        """
+        self.thread_pool.waitForDone()
+
+
+_shared_job_runner = None
+_details_job_runner = None
+
+
+def get_job_runner() -> JobRunner:
+    """
+    Retrieves the JobRunner that runs ModController work one job at a time, creating it on first use
+    Read-only lookups, like the details of the list items, run on get_details_job_runner alongside it.
+    :return: The shared JobRunner
+    """
+
+    global _shared_job_runner
+    if _shared_job_runner is None:
+        _shared_job_runner = JobRunner()
+    return _shared_job_runner
+
+
+def get_details_job_runner() -> JobRunner:
+    """
+    Retrieves the JobRunner that computes the details of the list items, shared by both lists, creating it on first use
+    It runs next to the shared JobRunner, not behind it, so scrolling never waits for a refresh or an apply.
+    :return: The details JobRunner
+    """
+
+    global _details_job_runner
+    if _details_job_runner is None:
+        _details_job_runner = JobRunner(max_threads=2)
+    return _details_job_runner
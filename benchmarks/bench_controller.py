@@ -0,0 +1,279 @@
+"""
+Benchmarks every ModController operation against synthetic .minecraft folders
+
+Run from the repository root: python benchmarks/bench_controller.py [--output results.json] [--baseline old.json]
+Each scenario builds a .minecraft folder in a temporary directory with the given number of mods folders, options files
+and jars per mods folder, and a saved order that has drifted from what's on disk by the given fraction.
+Results are written as json, and compared against a baseline file if one is given; a regression fails the run.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import typing
+import zipfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+import minecraft_mod_controller as mmc  # noqa: E402
+
+
+class Scenario(typing.NamedTuple):
+    name: str
+    mods_folders: int
+    options_files: int
+    jars_per_folder: int
+    drift: float
+
+
+SCENARIOS = [
+    Scenario("small", mods_folders=20, options_files=20, jars_per_folder=10, drift=0.1),
+    Scenario("many profiles", mods_folders=5_000, options_files=5_000, jars_per_folder=1, drift=0.1),
+    Scenario("many jars", mods_folders=50, options_files=50, jars_per_folder=200, drift=0.1),
+    Scenario("high drift", mods_folders=2_000, options_files=2_000, jars_per_folder=1, drift=0.5),
+]
+
+QUICK_SCENARIOS = [
+    Scenario("small", mods_folders=20, options_files=20, jars_per_folder=10, drift=0.1),
+    Scenario("many profiles", mods_folders=1_000, options_files=1_000, jars_per_folder=1, drift=0.1),
+]
+
+# Kept alive for the whole run, Qt only allows one QApplication per process
+_app = None
+
+# A result regresses when it is this many times slower than the baseline...
+REGRESSION_RATIO = 1.25
+# ...and slower by at least this many seconds, so noise in sub-millisecond operations doesn't fail the run
+REGRESSION_MIN_SECONDS = 0.001
+
+
+def make_jar(path: str, mod_id: str) -> None:
+    with zipfile.ZipFile(path, "w") as jar:
+        jar.writestr("fabric.mod.json", json.dumps({"id": mod_id, "version": "1.0.0", "depends": {"minecraft": "1.16.x"}}))
+        jar.writestr(f"{mod_id}/Main.class", os.urandom(2048))
+
+
+def build_tree(root: str, scenario: Scenario, seed: int = 0) -> str:
+    """
+    Creates the data folder and .minecraft folder of a scenario
+    :param root: Temporary directory the scenario is built in
+    :param scenario: The sizes to be generated
+    :param seed: Random seed, so runs are comparable
+    :return: The folder to run the controller from, containing the data folder
+    """
+    rng = random.Random(seed)
+    minecraft_dir = os.path.join(root, ".minecraft")
+    data_dir = os.path.join(root, "data")
+    mods_folders_dir = os.path.join(minecraft_dir, "mods_folders")
+    options_folder_dir = os.path.join(minecraft_dir, "options_folder")
+    for folder in (data_dir, mods_folders_dir, options_folder_dir):
+        os.makedirs(folder)
+
+    with open(os.path.join(data_dir, "dot_minecraft_location.txt"), "w") as f:
+        f.write(f"# generated by bench_controller.py\n{minecraft_dir}\n")
+
+    mods_folders = [f"profile {i:05d}" for i in range(scenario.mods_folders)]
+    for mods_folder in mods_folders:
+        folder = os.path.join(mods_folders_dir, mods_folder)
+        os.mkdir(folder)
+        for j in range(scenario.jars_per_folder):
+            make_jar(os.path.join(folder, f"mod{j:04d}.jar"), f"mod{j:04d}")
+
+    options_files = [f"options {i:05d}" for i in range(scenario.options_files)]
+    for options_file in options_files:
+        with open(os.path.join(options_folder_dir, options_file), "w") as f:
+            f.write("".join(f"key_{k}:{rng.randint(0, 100)}\n" for k in range(100)))
+
+    # The saved order misses some of the folders/files on disk and still lists some that were deleted
+    orders = {}
+    for key, names in (("mods_list.json", mods_folders), ("options_list.json", options_files)):
+        order = names[:]
+        rng.shuffle(order)
+        drifted = int(len(order) * scenario.drift)
+        orders[key] = order[drifted:] + [f"deleted {i}" for i in range(drifted)]
+        with open(os.path.join(data_dir, key), "w") as f:
+            json.dump(orders[key], f)
+
+    return root
+
+
+def best_of(func: typing.Callable[[], typing.Any], repeat: int, setup: typing.Optional[typing.Callable[[], typing.Any]] = None) -> float:
+    """
+    Times a function
+    :param func: The function to be timed
+    :param repeat: How many times to run it
+    :param setup: Run before each timing, not timed
+    :return: The fastest run, in seconds
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_populate(repeat: int) -> typing.Optional[float]:
+    """
+    Times populate_mods_and_options_lists in an offscreen window, until both lists are shown
+    The window uses the controller shared by the session, created from the current folder
+    :param repeat: How many times to run it
+    :return: The fastest run in seconds, or None if PyQt5 isn't installed
+    """
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    try:
+        from PyQt5.QtWidgets import QApplication
+        import minecraft_mod_controller_gui
+    except ImportError:
+        return None
+
+    global _app
+    _app = app = QApplication.instance() or QApplication([])
+    window = minecraft_mod_controller_gui.ModControllerGUI()
+    job_runner = window.job_runner
+
+    def populate():
+        window.populate_mods_and_options_lists()
+        while job_runner.running:
+            app.processEvents()
+
+    populate()
+    result = best_of(populate, repeat)
+    window.close()
+    return result
+
+
+def run_scenario(scenario: Scenario, repeat: int) -> typing.Dict[str, float]:
+    """
+    Builds a scenario and times every operation on it
+    :param scenario: The scenario to be run
+    :param repeat: How many times to run each operation
+    :return: Operation -> fastest run in seconds
+    """
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="mmc-bench-") as root:
+        os.chdir(build_tree(root, scenario))
+        try:
+            results = {}
+            start = time.perf_counter()
+            mod_controller = mmc.ModController()
+            results["init (first run, migrates state)"] = time.perf_counter() - start
+
+            results["init"] = best_of(mmc.ModController, repeat)
+            results["refresh"] = best_of(mod_controller.refresh, repeat)
+
+            def invalidate():
+                mod_controller.invalidate_snapshot(is_mods=True)
+                mod_controller.invalidate_snapshot(is_mods=False)
+
+            results["get_mods_or_options (cold)"] = best_of(lambda: (mod_controller.get_mods_or_options(is_mods=True),
+                                                                     mod_controller.get_mods_or_options(is_mods=False)), repeat, invalidate)
+            results["get_mods_or_options (cached)"] = best_of(lambda: (mod_controller.get_mods_or_options(is_mods=True),
+                                                                       mod_controller.get_mods_or_options(is_mods=False)), repeat)
+
+            # The first resolve merges the drifted order, later ones find it unchanged
+            start = time.perf_counter()
+            mod_controller.resolve_mods_or_options_list(is_mods=True)
+            mod_controller.resolve_mods_or_options_list(is_mods=False)
+            results["resolve_mods_or_options_list (drifted)"] = time.perf_counter() - start
+            results["resolve_mods_or_options_list"] = best_of(lambda: (mod_controller.resolve_mods_or_options_list(is_mods=True),
+                                                                       mod_controller.resolve_mods_or_options_list(is_mods=False)), repeat)
+
+            order = mod_controller.get_mods_or_options_order(is_mods=True)
+            results["set_mods_or_options_order"] = best_of(lambda: mod_controller.set_mods_or_options_order(order[::-1], is_mods=True), repeat)
+            results["set_mods_or_options_order + flush"] = best_of(
+                lambda: (mod_controller.set_mods_or_options_order(order, is_mods=True), mod_controller.state_store.flush()), repeat)
+
+            mods_folders = mod_controller.get_mods_or_options(is_mods=True)
+            switch = iter(range(10 ** 9))
+            results["transfer_mods_or_options (switch)"] = best_of(
+                lambda: mod_controller.transfer_mods_or_options(mods_folders[next(switch) % 2], is_mods=True), repeat)
+            mod_controller.transfer_mods_or_options(mods_folders[0], is_mods=True)
+            results["transfer_mods_or_options (unchanged)"] = best_of(
+                lambda: mod_controller.transfer_mods_or_options(mods_folders[0], is_mods=True), repeat)
+
+            start = time.perf_counter()
+            mod_controller.build_search_index(is_mods=True)
+            mod_controller.build_search_index(is_mods=False)
+            results["build_search_index (first)"] = time.perf_counter() - start
+            results["build_search_index"] = best_of(lambda: (mod_controller.build_search_index(is_mods=True),
+                                                             mod_controller.build_search_index(is_mods=False)), repeat)
+
+            # Every keystroke of typing a profile's name into the search box, a different profile each run
+            searched = iter(range(10 ** 9))
+
+            def type_search():
+                query = f"profile {next(searched) * 7 % max(1, scenario.mods_folders):05d}"
+                for end in range(1, len(query) + 1):
+                    mod_controller.search_mods_or_options(query[:end], is_mods=True)
+            results["search_mods_or_options (typing)"] = best_of(type_search, repeat)
+
+            populate = bench_populate(repeat)
+            if populate is not None:
+                results["populate_mods_and_options_lists (offscreen)"] = populate
+
+            mod_controller.state_store.close()
+            return results
+        finally:
+            os.chdir(cwd)
+
+
+def compare(results: dict, baseline: dict) -> typing.List[str]:
+    """
+    Finds the operations that got slower than in the baseline
+    :param results: This run's results
+    :param baseline: A previous run's results
+    :return: A description of each regression
+    """
+    regressions = []
+    for scenario, scenario_results in results["scenarios"].items():
+        baseline_operations = baseline.get("scenarios", {}).get(scenario, {}).get("operations", {})
+        for operation, seconds in scenario_results["operations"].items():
+            before = baseline_operations.get(operation)
+            if before is None:
+                continue
+            if seconds > before * REGRESSION_RATIO and seconds - before > REGRESSION_MIN_SECONDS:
+                regressions.append(f"{scenario} / {operation}: {before * 1000:.2f} ms -> {seconds * 1000:.2f} ms")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--output", help="json file to write the results to")
+    parser.add_argument("--baseline", help="json results of a previous run to compare against")
+    parser.add_argument("--repeat", type=int, default=5, help="runs of each operation, the fastest is kept")
+    parser.add_argument("--quick", action="store_true", help="only run the smaller scenarios")
+    args = parser.parse_args()
+
+    results = {"python": sys.version.split()[0], "platform": sys.platform, "scenarios": {}}
+    for scenario in QUICK_SCENARIOS if args.quick else SCENARIOS:
+        print(f"{scenario.name}: {scenario.mods_folders} mods folders, {scenario.options_files} options files, "
+              f"{scenario.jars_per_folder} jars each, {scenario.drift:.0%} drift")
+        # Every scenario gets its own controller, rather than the one shared by the session
+        mmc._shared_mod_controller = None
+        operations = run_scenario(scenario, args.repeat)
+        results["scenarios"][scenario.name] = {"parameters": scenario._asdict(), "operations": operations}
+        for operation, seconds in operations.items():
+            print(f"  {operation:<48} {seconds * 1000:>10.2f} ms")
+
+    if args.output:
+        with open(args.output, "w") as outfile:
+            json.dump(results, outfile, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f))
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,70 @@
+"""
+Scaling benchmark for reconcile.reconcile_mods_or_options
+
+Run from the repository root: python benchmarks/bench_reconcile.py
+Times the reconciliation for 10 to 100k entries, with ~10% of the entries added and ~10% removed since the saved order,
+and checks that the measured scaling exponent stays close to 1 (linear behavior). A quadratic merge measures ~2.
+"""
+import math
+import os
+import random
+import sys
+import timeit
+import typing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from reconcile import reconcile_mods_or_options  # noqa: E402
+
+SIZES = [10, 100, 1_000, 10_000, 100_000]
+
+# Largest accepted exponent k in time ~ entries^k between 1k entries and the largest size, leaving room for cache effects
+MAX_SCALING_EXPONENT = 1.5
+
+
+def make_lists(size: int, seed: int = 0) -> typing.Tuple[typing.List[str], typing.List[str]]:
+    """
+    Builds a shuffled file list and a saved order that has drifted from it
+    :param size: Number of entries on disk
+    :param seed: Random seed, so runs are comparable
+    :return: The file list and the saved order
+    """
+    rng = random.Random(seed)
+    names = [f"profile {i:06d}" for i in range(size)]
+    order_list = names[:]
+    rng.shuffle(order_list)
+    drift = max(1, size // 10)
+    order_list = order_list[drift:] + [f"deleted {i:06d}" for i in range(drift)]
+    file_list = names[:] + [f"new {i:06d}" for i in range(drift)]
+    rng.shuffle(file_list)
+    return file_list, order_list
+
+
+def bench(size: int) -> float:
+    """
+    Times one reconciliation of the given size
+    :param size: Number of entries on disk
+    :return: Best time per reconciliation in seconds
+    """
+    file_list, order_list = make_lists(size)
+    runs = max(1, 200_000 // size)
+    return min(timeit.repeat(lambda: reconcile_mods_or_options(file_list, order_list), number=runs, repeat=5)) / runs
+
+
+def main() -> int:
+    timings = {}
+    print(f"{'entries':>10} {'seconds':>12} {'ns/entry':>10}")
+    for size in SIZES:
+        timings[size] = bench(size)
+        print(f"{size:>10} {timings[size]:>12.6f} {timings[size] / size * 1e9:>10.1f}")
+
+    exponent = math.log(timings[SIZES[-1]] / timings[1_000]) / math.log(SIZES[-1] / 1_000)
+    print(f"scaling exponent from 1k to {SIZES[-1]} entries: {exponent:.2f}")
+    if exponent > MAX_SCALING_EXPONENT:
+        print("FAIL: reconciliation is not scaling linearly")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
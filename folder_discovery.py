@@ -0,0 +1,214 @@
+import fnmatch
+import os
+import re
+import typing
+
+# mods_folders/<pack>/<version>/ is two levels deep, one more leaves room for grouping packs
+DEFAULT_MAX_DEPTH = 3
+DEFAULT_IGNORE_PATTERNS = [".*", "__MACOSX", "*.tmp"]
+
+
+class DirectoryListing(typing.NamedTuple):
+    mtime: int
+    subdirs: typing.List[str]
+    files: typing.List[str]
+    has_jars: bool
+
+
+class FolderDiscovery:
+    """
+    Finds the mods folders and options files nested in the mods_folders/options_folder folders
+    Each directory's listing is cached and reused while its mtime is unchanged, so a rediscovery costs a stat per
+    directory, and the type of every entry comes from os.scandir instead of a stat of its own.
+    While a folder watcher reports the changes, see set_watched, a listing checked once is reused without a stat until
+    the watcher reports its folder changed.
+    """
+
+    def __init__(self, max_depth: int = DEFAULT_MAX_DEPTH, ignore_patterns: typing.Optional[typing.List[str]] = None) -> None:
+        """
+        :param max_depth: How many folders deep to look, 1 only looks at the top level
+        :param ignore_patterns: Names of files/folders to skip, as shell wildcards
+        """
+        self.max_depth = max_depth
+        self.ignore_patterns = list(DEFAULT_IGNORE_PATTERNS if ignore_patterns is None else ignore_patterns)
+        self._ignored = self._compile_ignore_patterns(self.ignore_patterns)
+        self._listings: typing.Dict[str, DirectoryListing] = {}
+        self.watched = False
+        # The folders whose listings were found unchanged since the watcher started, replaced rather than modified so
+        # set_watched can be called from another thread
+        self._verified: typing.Set[str] = set()
+
+    @staticmethod
+    def _compile_ignore_patterns(ignore_patterns: typing.List[str]) -> typing.Callable[[str], bool]:
+        # A single regex instead of an fnmatch call per pattern for every entry
+        if not ignore_patterns:
+            return lambda name: False
+        return re.compile("|".join(fnmatch.translate(pattern) for pattern in ignore_patterns)).match
+
+    def configure(self, max_depth: int, ignore_patterns: typing.List[str]) -> None:
+        """
+        Changes the depth and ignore patterns, dropping the cached listings if they changed
+        :param max_depth: How many folders deep to look, 1 only looks at the top level
+        :param ignore_patterns: Names of files/folders to skip, as shell wildcards
+        :return: None
+        """
+        if max_depth < 1:
+            raise ValueError(f"max_depth must be at least 1, not {max_depth}")
+        if max_depth != self.max_depth or list(ignore_patterns) != self.ignore_patterns:
+            self.max_depth = max_depth
+            self.ignore_patterns = list(ignore_patterns)
+            self._ignored = self._compile_ignore_patterns(self.ignore_patterns)
+            self._listings.clear()
+
+    def set_watched(self, watched: bool) -> None:
+        """
+        Tells whether a folder watcher reports every change to the folders listed, i.e. calls invalidate_folders for
+        them, so the listings don't need a stat each to be reused
+        :param watched: Whether or not the folders are watched
+        :return: None
+        """
+        # Listings made before the watcher started are checked once more, they may have missed a change
+        self._verified = set()
+        self.watched = watched
+
+    def invalidate_folders(self, folders: typing.Iterable[str]) -> None:
+        """
+        Drops the cached listings of folders that changed, the listings of the folders in them are kept
+        :param folders: The folders
+        :return: None
+        """
+        for folder in folders:
+            self._listings.pop(folder, None)
+            self._verified.discard(folder)
+
+    def invalidate(self, root: typing.Optional[str] = None) -> None:
+        """
+        Drops the cached listings of a folder and everything in it
+        :param root: The folder, or None to drop every listing
+        :return: None
+        """
+        if root is None:
+            self._listings.clear()
+            self._verified = set()
+            return
+        prefix = os.path.join(root, "")
+        for path in [path for path in self._listings if path == root or path.startswith(prefix)]:
+            self._listings.pop(path, None)
+            self._verified.discard(path)
+
+    def list_directory(self, path: str) -> DirectoryListing:
+        """
+        Lists a folder, reusing the cached listing as long as nothing was added, removed or renamed in it
+        :param path: The folder to be listed
+        :return: Its folders and files, not to be modified
+        """
+        listing = self._listings.get(path)
+        watched = self.watched
+        if listing is not None and watched and path in self._verified:
+            return listing
+        mtime = os.stat(path).st_mtime_ns
+        if listing is not None and listing.mtime == mtime:
+            if watched:
+                self._verified.add(path)
+            return listing
+
+        subdirs, files, has_jars = [], [], False
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if self._ignored(entry.name):
+                    continue
+                try:
+                    if entry.is_dir():
+                        subdirs.append(entry.name)
+                    elif entry.is_file():
+                        files.append(entry.name)
+                        if entry.name.lower().endswith(".jar"):
+                            has_jars = True
+                except OSError:
+                    continue
+
+        if listing is not None:
+            # The listings of folders that are gone would never be used again
+            for name in set(listing.subdirs).difference(subdirs):
+                self.invalidate(os.path.join(path, name))
+
+        listing = DirectoryListing(mtime, subdirs, files, has_jars)
+        self._listings[path] = listing
+        return listing
+
+    def find_mods_folders(self, root: str, known: typing.Collection[str] = ()) -> typing.List[str]:
+        """
+        Finds the mods folders in root: folders directly holding jars, or top level folders with no mods folders in them
+        Mods folders aren't looked into, so their version subfolders aren't taken for mods folders of their own
+        :param root: The mods_folders folder
+        :param known: Mods folders already known, e.g. from the saved order, the top level ones among them stay mods
+        folders even once their jars are only in subfolders, so the name saved orders and profiles use doesn't change
+        :return: The mods folders' paths relative to root, separated with /
+        """
+
+        def find(path: str, relative: str, depth: int) -> typing.List[str]:
+            found = []
+            for name in self.list_directory(path).subdirs:
+                sub_relative = f"{relative}/{name}" if relative else name
+                if depth == 1 and (depth >= self.max_depth or name in known):
+                    # A mods folder, no need to look into it
+                    found.append(sub_relative)
+                    continue
+                sub_path = os.path.join(path, name)
+                try:
+                    listing = self.list_directory(sub_path)
+                except OSError:
+                    continue
+                if listing.has_jars or depth >= self.max_depth:
+                    nested = []
+                else:
+                    nested = find(sub_path, sub_relative, depth + 1)
+                if nested:
+                    found += nested
+                elif listing.has_jars or depth == 1:
+                    # Empty top level folders are still mods folders, waiting for jars to be put in them
+                    found.append(sub_relative)
+            return found
+
+        return find(root, "", 1)
+
+    def find_options_files(self, root: str) -> typing.List[str]:
+        """
+        Finds the options files in root and the folders in it
+        :param root: The options_folder folder
+        :return: The options files' paths relative to root, separated with /
+        """
+
+        def find(path: str, relative: str, depth: int) -> typing.List[str]:
+            listing = self.list_directory(path)
+            found = [f"{relative}/{name}" if relative else name for name in listing.files]
+            if depth < self.max_depth:
+                for name in listing.subdirs:
+                    try:
+                        found += find(os.path.join(path, name), f"{relative}/{name}" if relative else name, depth + 1)
+                    except OSError:
+                        continue
+            return found
+
+        return find(root, "", 1)
+
+    def find_folders(self, root: str) -> typing.List[str]:
+        """
+        Finds the folders in root as deep as mods folders/options files are looked for, e.g. to watch them for changes
+        :param root: The mods_folders/options_folder folder
+        :return: The folders' paths, root not included
+        """
+
+        def find(path: str, depth: int) -> typing.List[str]:
+            found = []
+            for name in self.list_directory(path).subdirs:
+                sub_path = os.path.join(path, name)
+                found.append(sub_path)
+                if depth < self.max_depth:
+                    try:
+                        found += find(sub_path, depth + 1)
+                    except OSError:
+                        continue
+            return found
+
+        return find(root, 1)
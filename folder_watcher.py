@@ -0,0 +1,332 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+import typing
+import tracing
+
+# inotify event masks, see inotify(7)
+IN_ATTRIB = 0x00000004
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_IGNORED = 0x00008000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE_SELF | IN_MOVE_SELF | IN_ATTRIB
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class _InotifyBackend:
+    """
+    Waits for changes using inotify, only available on Linux
+    """
+
+    def __init__(self, folders: typing.Dict[typing.Hashable, str]) -> None:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._inotify_add_watch = libc.inotify_add_watch
+        self._inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._inotify_rm_watch = libc.inotify_rm_watch
+        self._inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+        # Written to by close() so a blocked wait() returns immediately
+        self._wake_read, self._wake_write = os.pipe()
+
+        self.folders = dict(folders)
+        self.watches: typing.Dict[int, typing.Hashable] = {}
+        # Guards folders and watches, which set_folders changes from other threads
+        self._lock = threading.Lock()
+        for key in self.folders:
+            self._add_watch(key)
+
+    def _add_watch(self, key: typing.Hashable) -> bool:
+        """
+        Starts watching a folder
+        :param key: The key of the folder to be watched
+        :return: Whether or not the watch was added
+        """
+        wd = self._inotify_add_watch(self.fd, os.fsencode(self.folders[key]), WATCH_MASK)
+        if wd < 0:
+            tracing.warning("could not watch folder", folder=self.folders[key], error=os.strerror(ctypes.get_errno()))
+            return False
+        self.watches[wd] = key
+        return True
+
+    def set_folders(self, folders: typing.Dict[typing.Hashable, str]) -> None:
+        """
+        Changes the folders watched, only adding and removing the watches that differ
+        :param folders: The folders to be watched, by key
+        :return: None
+        """
+        with self._lock:
+            for wd, key in list(self.watches.items()):
+                if folders.get(key) != self.folders.get(key):
+                    self._inotify_rm_watch(self.fd, wd)
+                    del self.watches[wd]
+            self.folders = dict(folders)
+            watched = set(self.watches.values())
+            for key in self.folders:
+                if key not in watched:
+                    self._add_watch(key)
+
+    def wait(self, timeout: float) -> typing.Set[typing.Hashable]:
+        """
+        Waits until any watched folder changes
+        :param timeout: Maximum time to wait, in seconds
+        :return: Keys of the folders that changed
+        """
+
+        # Folders that were deleted and recreated have to be watched again
+        changed = set()
+        with self._lock:
+            for key in set(self.folders) - set(self.watches.values()):
+                if os.path.isdir(self.folders[key]) and self._add_watch(key):
+                    changed.add(key)
+
+        readable, _, _ = select.select([self.fd, self._wake_read], [], [], timeout)
+        if self.fd not in readable:
+            return changed
+
+        try:
+            buffer = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return changed
+
+        offset = 0
+        with self._lock:
+            while offset < len(buffer):
+                wd, mask, _cookie, name_len = EVENT_HEADER.unpack_from(buffer, offset)
+                offset += EVENT_HEADER.size + name_len
+                key = self.watches.get(wd)
+                if key is None:
+                    continue
+                changed.add(key)
+                if mask & IN_IGNORED:
+                    del self.watches[wd]
+        return changed
+
+    def wake(self) -> None:
+        os.write(self._wake_write, b"\0")
+
+    def close(self) -> None:
+        for fd in (self.fd, self._wake_read, self._wake_write):
+            os.close(fd)
+
+
+class _PollingBackend:
+    """
+    Waits for changes by polling the folders, works on every platform
+    Only the top level folders, and the folders that were added or changed lately, are checked every poll, the nested
+    ones are checked every full_poll_interval, so polling thousands of nested folders doesn't stat each every second.
+    """
+
+    def __init__(self, folders: typing.Dict[typing.Hashable, str], poll_interval: float, full_poll_interval: float) -> None:
+        self.folders = dict(folders)
+        self.poll_interval = poll_interval
+        self.full_poll_interval = full_poll_interval
+        self._stopped = threading.Event()
+        self.signatures = {key: self._signature(folder) for key, folder in self.folders.items()}
+        self.top_level = self._top_level(self.folders)
+        # Key -> when the folder was added or last changed, checked every poll until full_poll_interval passed
+        self.recently_changed: typing.Dict[typing.Hashable, float] = {}
+        self._last_full_poll = time.monotonic()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _top_level(folders: typing.Dict[typing.Hashable, str]) -> typing.Set[typing.Hashable]:
+        # The folders that aren't in another watched folder, a folder added to one of them changes it
+        paths = {os.path.normpath(folder) for folder in folders.values()}
+        return {key for key, folder in folders.items() if os.path.dirname(os.path.normpath(folder)) not in paths}
+
+    @staticmethod
+    def _mtime(folder: str) -> typing.Optional[int]:
+        try:
+            return os.stat(folder).st_mtime_ns
+        except OSError:
+            return None
+
+    def _signature(self, folder: str) -> typing.Tuple[typing.Optional[int], typing.FrozenSet[typing.Tuple[str, bool]]]:
+        """
+        Describes the contents of a folder
+        :param folder: The folder to be described
+        :return: The folder's mtime, and the name and type of each entry in it
+        """
+        mtime = self._mtime(folder)
+        if mtime is None:
+            return None, frozenset()
+        try:
+            with os.scandir(folder) as entries:
+                return mtime, frozenset((entry.name, entry.is_dir()) for entry in entries)
+        except OSError:
+            # Removed since it was stat'ed
+            return None, frozenset()
+
+    def set_folders(self, folders: typing.Dict[typing.Hashable, str]) -> None:
+        """
+        Changes the folders watched, only describing the folders that weren't watched yet
+        :param folders: The folders to be watched, by key
+        :return: None
+        """
+        signatures = {key: self.signatures[key] for key, folder in folders.items()
+                      if key in self.signatures and self.folders.get(key) == folder}
+        added = [key for key in folders if key not in signatures]
+        signatures.update((key, self._signature(folders[key])) for key in added)
+        top_level = self._top_level(folders)
+        now = time.monotonic()
+        with self._lock:
+            self.folders = dict(folders)
+            self.signatures = signatures
+            self.top_level = top_level
+            # New folders are likely still being filled, e.g. with jars
+            self.recently_changed.update((key, now) for key in added)
+
+    def wait(self, timeout: float) -> typing.Set[typing.Hashable]:
+        """
+        Waits until any watched folder changes
+        :param timeout: Maximum time to wait, in seconds
+        :return: Keys of the folders that changed
+        """
+        if self._stopped.wait(min(timeout, self.poll_interval)):
+            return set()
+
+        now = time.monotonic()
+        with self._lock:
+            signatures = dict(self.signatures)
+            if now - self._last_full_poll >= self.full_poll_interval:
+                self._last_full_poll = now
+                folders = dict(self.folders)
+            else:
+                polled = self.top_level.union(key for key, changed_at in self.recently_changed.items()
+                                              if now - changed_at < self.full_poll_interval)
+                folders = {key: folder for key, folder in self.folders.items() if key in polled}
+            self.recently_changed = {key: changed_at for key, changed_at in self.recently_changed.items()
+                                     if now - changed_at < self.full_poll_interval}
+        changed = set()
+        for key, folder in folders.items():
+            old_mtime, old_entries = signatures[key]
+            # Only list the folder again when its mtime moved, and only report it when its entries actually differ
+            if self._mtime(folder) == old_mtime:
+                continue
+            signature = self._signature(folder)
+            with self._lock:
+                if key not in self.signatures:
+                    continue
+                self.signatures[key] = signature
+            if signature[1] != old_entries or signature[0] is None:
+                changed.add(key)
+        with self._lock:
+            self.recently_changed.update((key, now) for key in changed)
+        return changed
+
+    def wake(self) -> None:
+        self._stopped.set()
+
+    def close(self) -> None:
+        pass
+
+
+class FolderWatcher:
+    """
+    Watches folders in a background thread and reports bursts of changes as a single callback
+    """
+
+    def __init__(self, folders: typing.Dict[typing.Hashable, str], callback: typing.Callable[[typing.Set[typing.Hashable]], None],
+                 *, debounce: float = 0.25, max_delay: float = 2.0, poll_interval: float = 1.0,
+                 full_poll_interval: float = 10.0) -> None:
+        """
+        :param folders: The folders to be watched, by key
+        :param callback: Called from the watcher thread with the keys of the folders that changed
+        :param debounce: How long the folders must be quiet before the changes are reported, in seconds
+        :param max_delay: Longest a change may wait to be reported during a continuous burst, in seconds
+        :param poll_interval: How often to check the folders when inotify isn't available, in seconds
+        :param full_poll_interval: How often to check the nested folders that haven't changed lately when inotify isn't
+        available, in seconds
+        """
+        self.folders = dict(folders)
+        self.callback = callback
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.full_poll_interval = full_poll_interval
+
+        self._backend = None
+        self._thread = None
+        self._running = False
+
+    def start(self) -> None:
+        """
+        Starts watching the folders
+        :return: None
+        """
+        if self._running:
+            return
+
+        self._backend = None
+        if sys.platform.startswith("linux"):
+            try:
+                self._backend = _InotifyBackend(self.folders)
+            except (OSError, AttributeError) as e:
+                tracing.info("inotify unavailable, polling instead", error=e)
+        if self._backend is None:
+            self._backend = _PollingBackend(self.folders, self.poll_interval, self.full_poll_interval)
+
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="FolderWatcher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Stops watching the folders and waits for the watcher thread to exit
+        :return: None
+        """
+        if not self._running:
+            return
+        self._running = False
+        self._backend.wake()
+        self._thread.join()
+        self._backend.close()
+
+    def set_folders(self, folders: typing.Dict[typing.Hashable, str]) -> None:
+        """
+        Changes the folders watched, e.g. once new nested folders were found
+        :param folders: The folders to be watched, by key
+        :return: None
+        """
+        self.folders = dict(folders)
+        if self._running:
+            self._backend.set_folders(self.folders)
+
+    def _run(self) -> None:
+        while self._running:
+            changed = self._backend.wait(self.poll_interval)
+            if not changed or not self._running:
+                continue
+
+            # Coalesce the burst until the folders are quiet for the debounce period, or max_delay passes
+            deadline = time.monotonic() + self.max_delay
+            while self._running:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                more = self._backend.wait(min(self.debounce, remaining))
+                if not more:
+                    break
+                changed |= more
+
+            if self._running:
+                try:
+                    self.callback(changed)
+                except Exception as e:
+                    tracing.error("folder watcher callback failed", error=f"{type(e).__name__}: {e}")
@@ -0,0 +1,189 @@
+import concurrent.futures
+import functools
+import hashlib
+import os
+import shutil
+import typing
+from mod_metadata import find_jars
+from stat_keyed_index import StatKeyedIndex, compute_in_pool
+import tracing
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class DeduplicateResult(typing.NamedTuple):
+    """
+    What deduplicating mods folders did
+    linked: Number of jars replaced with a hardlink to the stored copy
+    bytes_saved: Disk space freed by those hardlinks
+    skipped: Jars that could not be linked, e.g. because the store is on another drive
+    collected: Stored jars deleted because no mods folder links to them anymore
+    """
+    linked: int
+    bytes_saved: int
+    skipped: int
+    collected: int = 0
+
+
+def hash_file(path: str) -> str:
+    """
+    Hashes a file with streaming, chunked reads so memory use doesn't depend on the file's size
+    :param path: The file to be hashed
+    :return: The sha256 of the file, in hex
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class JarHashIndex(StatKeyedIndex):
+    """
+    The sha256 of jars, see StatKeyedIndex
+    """
+
+    def record(self, path: str, digest: str) -> None:
+        """
+        Stores the hash of a jar that was just changed without changing its contents, e.g. replaced by a hardlink
+        :param path: The path of the jar
+        :param digest: The sha256 of the jar
+        :return: None
+        """
+        self.store(path, os.stat(path), digest)
+
+    def known_hashes(self) -> typing.Dict[str, str]:
+        """
+        Finds a jar for every hash in the index, skipping jars that changed or were removed since they were hashed
+        :return: sha256 -> path of a jar with that hash
+        """
+        result = {}
+        for path, digest in self.items():
+            if digest in result:
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if self.lookup(path, stat)[0]:
+                result[digest] = path
+        return result
+
+    @tracing.traced("jar_store.hash_jars")
+    def hash_jars(self, paths: typing.Iterable[str], progress: typing.Optional[typing.Callable[[int, int], None]] = None
+                  ) -> typing.Dict[str, str]:
+        """
+        Hashes jars in parallel, reusing the cached hash of every jar whose size and mtime are unchanged
+        :param paths: The jars to be hashed
+        :param progress: Called with (jars hashed, jars to hash) while hashing changed jars
+        :return: Jar path -> sha256
+        """
+        # hashlib releases the GIL while hashing, so threads are enough to use every core
+        hash_files = functools.partial(compute_in_pool, hash_file, executor_class=concurrent.futures.ThreadPoolExecutor)
+        return self.update([(path, os.stat(path)) for path in paths], hash_files, progress)
+
+
+class JarStore:
+    """
+    Content-addressed store of jars, each unique jar is kept once and mods folders hardlink to it
+    Mods folders stay ordinary folders, so linking one in as the mods folder works the same as before.
+    """
+
+    def __init__(self, store_dir: str, hash_index: JarHashIndex) -> None:
+        """
+        :param store_dir: The folder the unique jars are kept in, must be on the same drive as the mods folders
+        :param hash_index: The cache of jar hashes
+        """
+        self.store_dir = store_dir
+        self.hash_index = hash_index
+
+    def stored_path(self, digest: str) -> str:
+        """
+        :param digest: The sha256 of a jar
+        :return: Where the jar with that hash is kept in the store
+        """
+        return os.path.join(self.store_dir, digest[:2], f"{digest}.jar")
+
+    def deduplicate_folders(self, folders: typing.Iterable[str], progress: typing.Optional[typing.Callable[[int, int], None]] = None
+                            ) -> DeduplicateResult:
+        """
+        Replaces every jar in the mods folders that is already in the store with a hardlink to the stored copy,
+        and adds the jars that aren't yet
+        :param folders: The paths of the mods folders
+        :param progress: Called with (jars hashed, jars to hash) while hashing changed jars
+        :return: How many jars were linked and how much space that saved
+        """
+
+        jars = [jar.path for folder in folders for jar in find_jars(folder)]
+        hashes = self.hash_index.hash_jars(jars, progress)
+
+        linked = 0
+        bytes_saved = 0
+        skipped = 0
+        for jar, digest in hashes.items():
+            stored = self.stored_path(digest)
+            try:
+                if not os.path.exists(stored):
+                    os.makedirs(os.path.dirname(stored), exist_ok=True)
+                    os.link(jar, stored)
+                    continue
+                if os.path.samefile(jar, stored):
+                    continue
+
+                size = os.path.getsize(jar)
+                temp_link = f"{jar}.mmc-link"
+                if os.path.lexists(temp_link):
+                    os.unlink(temp_link)
+                os.link(stored, temp_link)
+                os.replace(temp_link, jar)
+            except OSError as e:
+                tracing.warning("could not link jar", jar=jar, error=e)
+                skipped += 1
+                continue
+
+            # The jar now shares the stored copy's mtime, so record it under that to keep the cache valid
+            self.hash_index.record(jar, digest)
+            linked += 1
+            bytes_saved += size
+
+        self.hash_index.save()
+        tracing.info("deduplicated jars", linked=linked, bytes_saved=bytes_saved, skipped=skipped)
+        return DeduplicateResult(linked=linked, bytes_saved=bytes_saved, skipped=skipped)
+
+    def clone_folder(self, src: str, dst: str) -> None:
+        """
+        Creates a new mods folder from an existing one by hardlinking its jars instead of copying them
+        Other files, like configs, are copied so editing them in one folder doesn't change the other.
+        :param src: The path of the mods folder to be cloned
+        :param dst: The path of the new mods folder, must not exist
+        :return: None
+        """
+
+        if not os.path.isdir(src):
+            raise NotADirectoryError(f"{src} is not a directory")
+        if os.path.lexists(dst):
+            raise FileExistsError(f"{dst} already exists")
+
+        def link_or_copy(src_file: str, dst_file: str) -> str:
+            if not src_file.lower().endswith(".jar"):
+                return shutil.copy2(src_file, dst_file)
+            try:
+                os.link(src_file, dst_file)
+            except OSError:
+                shutil.copy2(src_file, dst_file)
+            return dst_file
+
+        shutil.copytree(src, dst, symlinks=True, copy_function=link_or_copy)
+
+    def collect_garbage(self) -> int:
+        """
+        Deletes stored jars that no mods folder links to anymore
+        :return: Number of jars deleted
+        """
+
+        removed = 0
+        for entry in find_jars(self.store_dir):
+            if entry.stat().st_nlink <= 1:
+                os.unlink(entry.path)
+                removed += 1
+        return removed
@@ -0,0 +1,80 @@
+import functools
+import os
+import typing
+import zipfile
+import zlib
+from mod_metadata import find_jars
+from stat_keyed_index import StatKeyedIndex, compute_in_pool
+import tracing
+
+# Checking is CPU bound (every entry is decompressed to check its CRC), so big batches go to a process pool
+MIN_JARS_FOR_POOL = 4
+
+
+class JarVerdict(typing.NamedTuple):
+    """
+    The outcome of checking a jar
+    jar: The path of the jar
+    error: Why the jar is broken, None if it is fine
+    """
+    jar: str
+    error: typing.Optional[str]
+
+
+def verify_jar(jar_path: str) -> typing.Optional[str]:
+    """
+    Checks a jar's zip structure and the CRC of every file in it
+    :param jar_path: The jar to be checked
+    :return: Why the jar is broken, None if it is fine
+    """
+    try:
+        with zipfile.ZipFile(jar_path) as jar:
+            bad_entry = jar.testzip()
+    except zipfile.BadZipFile as e:
+        return f"not a valid jar: {e}"
+    except zlib.error as e:
+        return f"has corrupt compressed data: {e}"
+    except (OSError, EOFError, RuntimeError, NotImplementedError, ValueError) as e:
+        return f"could not be read: {type(e).__name__}: {e}"
+    if bad_entry is not None:
+        return f"{bad_entry} is corrupt"
+    return None
+
+
+def size_mtime_and_inode(stat: os.stat_result) -> list:
+    # A jar replaced by a hardlink to an identical one can keep its size and mtime, its inode still changes
+    return [stat.st_size, stat.st_mtime_ns, stat.st_ino]
+
+
+class JarVerificationIndex(StatKeyedIndex):
+    """
+    The verdict of checking every jar of the mods folders, see StatKeyedIndex
+    """
+
+    def __init__(self, index_dir: str) -> None:
+        """
+        :param index_dir: The folder the verdicts are stored in
+        """
+        super(JarVerificationIndex, self).__init__(index_dir, stat_key=size_mtime_and_inode)
+
+    @tracing.traced("jar_verification.verify_folders")
+    def verify_folders(self, folders: typing.Dict[str, str], progress: typing.Optional[typing.Callable[[int, int], None]] = None
+                       ) -> typing.Dict[str, typing.List[JarVerdict]]:
+        """
+        Checks every jar in the given mods folders, only opening the jars that changed since they were last checked
+        :param folders: Mods folder name -> path
+        :param progress: Called with (jars checked, jars to check) while checking changed jars
+        :return: Mods folder name -> the verdict of every jar in that folder
+        """
+
+        verify_jars = functools.partial(compute_in_pool, verify_jar, min_for_pool=MIN_JARS_FOR_POOL, chunks_per_worker=8)
+        return {name: [JarVerdict(path, error) for path, error in jars]
+                for name, jars in self.update_folders(folders, find_jars, verify_jars, progress).items()}
+
+    def verify_folder(self, folder: str) -> typing.List[JarVerdict]:
+        """
+        Checks every jar in one mods folder
+        :param folder: The path of the mods folder
+        :return: The verdict of every jar in that folder
+        """
+        return self.verify_folders({folder: folder})[folder]
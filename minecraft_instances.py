@@ -0,0 +1,149 @@
+import concurrent.futures
+import threading
+import typing
+import minecraft_mod_controller as mmc
+import tracing
+
+# Upper bound on the threads used to fan an operation out, the work is mostly waiting on the disk
+MAX_WORKERS = 32
+
+T = typing.TypeVar("T")
+
+
+class InstanceResult(typing.NamedTuple):
+    """
+    The outcome of an operation on one .minecraft folder
+    ok: Whether or not the operation finished without raising
+    result: What the operation returned, None if it raised
+    error: Why the operation failed, None if it didn't
+    """
+    minecraft_dir: str
+    ok: bool
+    result: typing.Any
+    error: typing.Optional[str]
+
+
+class InstanceRegistry:
+    """
+    Manages several .minecraft folders at once, one ModController each
+    The controllers share the state store, jar metadata index and jar hash index, so each jar is only read once
+    no matter how many .minecraft folders use it.
+    """
+
+    def __init__(self, minecraft_dirs: typing.Optional[typing.Iterable[str]] = None) -> None:
+        """
+        :param minecraft_dirs: The .minecraft folders to be managed, defaults to every one in dot_minecraft_location.txt
+        """
+        default_controller = mmc.get_mod_controller()
+        if minecraft_dirs is None:
+            minecraft_dirs = default_controller.get_minecraft_dirs()
+
+        self.minecraft_dirs: typing.List[str] = list(dict.fromkeys(minecraft_dirs))
+        self._controllers: typing.Dict[str, mmc.ModController] = {default_controller.MINECRAFT_DIR: default_controller}
+        self._controllers_lock = threading.Lock()
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=min(MAX_WORKERS, max(1, len(self.minecraft_dirs))))
+
+    def get_controller(self, minecraft_dir: str) -> mmc.ModController:
+        """
+        Retrieves the ModController of a .minecraft folder, creating it on first use
+        :param minecraft_dir: The .minecraft folder
+        :return: Its ModController
+        """
+        with self._controllers_lock:
+            mod_controller = self._controllers.get(minecraft_dir)
+        if mod_controller is None:
+            # Created outside the lock so the .minecraft folders are set up in parallel
+            mod_controller = mmc.ModController(minecraft_dir)
+            with self._controllers_lock:
+                mod_controller = self._controllers.setdefault(minecraft_dir, mod_controller)
+        return mod_controller
+
+    def add_instance(self, minecraft_dir: str) -> None:
+        """
+        Starts managing another .minecraft folder
+        :param minecraft_dir: The .minecraft folder
+        :return: None
+        """
+        if minecraft_dir not in self.minecraft_dirs:
+            self.minecraft_dirs.append(minecraft_dir)
+
+    def fan_out(self, operation: typing.Callable[[mmc.ModController], T],
+                minecraft_dirs: typing.Optional[typing.Iterable[str]] = None) -> typing.Dict[str, InstanceResult]:
+        """
+        Runs an operation on every .minecraft folder in parallel, a failure in one doesn't stop the others
+        :param operation: Called with the ModController of each .minecraft folder
+        :param minecraft_dirs: The .minecraft folders to run it on, defaults to all of them
+        :return: .minecraft folder -> the outcome of the operation there
+        """
+
+        def run(minecraft_dir: str) -> InstanceResult:
+            try:
+                return InstanceResult(minecraft_dir, True, operation(self.get_controller(minecraft_dir)), None)
+            except Exception as e:
+                tracing.warning("instance operation failed", minecraft_dir=minecraft_dir, error=f"{type(e).__name__}: {e}")
+                return InstanceResult(minecraft_dir, False, None, f"{type(e).__name__}: {e}")
+
+        minecraft_dirs = list(minecraft_dirs) if minecraft_dirs is not None else self.minecraft_dirs
+        return {result.minecraft_dir: result for result in self._executor.map(run, minecraft_dirs)}
+
+    def refresh_all(self) -> typing.Dict[str, InstanceResult]:
+        """
+        Rescans every .minecraft folder
+        :return: .minecraft folder -> the outcome of the refresh there
+        """
+        return self.fan_out(lambda mod_controller: mod_controller.refresh())
+
+    def resolve_all(self, *, is_mods: bool) -> typing.Dict[str, InstanceResult]:
+        """
+        Resolves the mods folders/options files of every .minecraft folder
+        :param is_mods: True: resolves the lists of mods folders, False: resolves the lists of options files
+        :return: .minecraft folder -> the outcome, with the resolved list as its result
+        """
+        return self.fan_out(lambda mod_controller: mod_controller.resolve_mods_or_options_list(is_mods=is_mods))
+
+    def apply_everywhere(self, *, profile: typing.Optional[str] = None, mods: typing.Optional[str] = None,
+                         options: typing.Optional[str] = None) -> typing.Dict[str, InstanceResult]:
+        """
+        Applies a named profile, or a mods folder and/or options file, in every .minecraft folder
+        :param profile: The named profile to be applied
+        :param mods: The mods folder to be applied, if no profile is given
+        :param options: The options file to be applied, if no profile is given
+        :return: .minecraft folder -> the outcome, with whether the links could be made as its result
+        """
+
+        def apply(mod_controller: mmc.ModController) -> bool:
+            if profile is not None:
+                return mod_controller.apply_profile(profile)
+            if mods is not None and options is not None:
+                return mod_controller.apply_mods_and_options(mods, options)
+            if mods is not None:
+                return mod_controller.transfer_mods_or_options(mods, is_mods=True)
+            if options is not None:
+                return mod_controller.transfer_mods_or_options(options, is_mods=False)
+            raise ValueError("apply_everywhere needs a profile, mods and/or options")
+
+        return self.fan_out(apply)
+
+    def shutdown(self) -> None:
+        """
+        Stops the worker threads
+        :return: None
+        """
+        self._executor.shutdown()
+
+
+_shared_instance_registry = None
+_shared_instance_registry_lock = threading.Lock()
+
+
+def get_instance_registry() -> InstanceRegistry:
+    """
+    Retrieves the InstanceRegistry shared by the whole session, creating it on first use
+    :return: The shared InstanceRegistry
+    """
+
+    global _shared_instance_registry
+    with _shared_instance_registry_lock:
+        if _shared_instance_registry is None:
+            _shared_instance_registry = InstanceRegistry()
+        return _shared_instance_registry
@@ -1,16 +1,77 @@
-import json
 import os
 import typing
-from print_debug import print_debug
-import shutil
+import tracing
+from atomic_link import LinkTransaction, SymlinkPrivilegeError, atomic_write, read_link_target
+from folder_discovery import DEFAULT_IGNORE_PATTERNS, DEFAULT_MAX_DEPTH, FolderDiscovery
+from jar_store import DeduplicateResult, JarHashIndex, JarStore
+from jar_verification import JarVerdict, JarVerificationIndex
+from mod_metadata import ModMetadata, ModMetadataIndex, find_jars
+from mod_validation import ModFolderValidator, ModIssue
+from mods_sync import SyncResult, clear_synced_file, clear_synced_folder, is_synced_folder, sync_file, sync_folder
+from options_profiles import DELTA_SUFFIX, OptionsProfiles, format_options, merge_options, parse_options, read_options
+from profile_archive import ImportResult, export_archive, import_archive
+from reconcile import ReconcileResult, reconcile_mods_or_options
+from search_index import SearchIndex, mod_terms
+from state_store import StateStore
 import sys
+import threading
+import time
+
+
+# Keys of the state kept in the state store
+MODS_ORDER_KEY = "mods_order"
+OPTIONS_ORDER_KEY = "options_order"
+PROFILES_KEY = "profiles"
+LAST_APPLIED_KEY = "last_applied"
+DISCOVERY_KEY = "discovery"
+APPLY_MODE_KEY = "apply_mode"
+TOP_LEVEL_MODS_FOLDERS_KEY = "top_level_mods_folders"
+
+# auto links, and copies/hardlinks instead if symlinks can't be made, symlink only links, copy only copies/hardlinks
+APPLY_MODES = ("auto", "symlink", "copy")
+
+_shared_mod_controller = None
+_shared_mod_controller_lock = threading.Lock()
+
+# Caches backed by a file in the data folder, shared by every ModController using that file
+_shared_caches: typing.Dict[str, typing.Any] = {}
+_shared_caches_lock = threading.Lock()
+
+
+def _get_shared_cache(file: str, factory: typing.Callable[[str], typing.Any]) -> typing.Any:
+    """
+    Retrieves the cache backed by a file or folder, creating it on first use
+    :param file: The file or folder backing the cache
+    :param factory: Creates the cache from the file or folder
+    :return: The shared cache
+    """
+
+    with _shared_caches_lock:
+        if file not in _shared_caches:
+            _shared_caches[file] = factory(file)
+        return _shared_caches[file]
+
+
+def get_mod_controller() -> "ModController":
+    """
+    Retrieves the ModController shared by the whole session, creating it on first use
+    :return: The shared ModController
+    """
+
+    global _shared_mod_controller
+    with _shared_mod_controller_lock:
+        if _shared_mod_controller is None:
+            _shared_mod_controller = ModController()
+        return _shared_mod_controller
 
 
 class ModController:
-    def __init__(self) -> None:
+    def __init__(self, minecraft_dir: typing.Optional[str] = None) -> None:
+        """
+        :param minecraft_dir: The .minecraft folder to be managed, defaults to the first one in dot_minecraft_location.txt
+        """
 
         # Set constants
-        # TODO Get .minecraft folder dynamically
 
         #self.CURRENT_DIR = os.path.dirname(os.path.realpath(__file__)) + os.sep
         if getattr(sys, 'frozen', False):
@@ -20,49 +81,153 @@ class ModController:
         self.DATA_DIR = os.path.join(self.CURRENT_DIR, "data")
 
         self.MINECRAFT_DIR_INFO_FILE = os.path.join(self.DATA_DIR, "dot_minecraft_location.txt")
-        self.MINECRAFT_DIR = self.get_minecraft_dir()
+        minecraft_dirs = self.get_minecraft_dirs()
+        self.MINECRAFT_DIR = minecraft_dir or minecraft_dirs[0]
+
+        # The list orders of the first .minecraft folder are stored under the plain keys, the others' under keys prefixed with their path
+        # Profiles only name a mods folder and options file, so they are shared by every .minecraft folder
+        self.STATE_KEY_PREFIX = "" if self.MINECRAFT_DIR == minecraft_dirs[0] else f"{self.MINECRAFT_DIR}|"
 
         self.MODS_FOLDERS_DIR = os.path.join(self.MINECRAFT_DIR, r"mods_folders")
         self.MODS_DIR = os.path.join(self.MINECRAFT_DIR, r"mods")
 
+        # Kept outside of mods_folders so it isn't listed as a mods folder, but on the same drive so jars can be hardlinked
+        self.JAR_STORE_DIR = os.path.join(self.MINECRAFT_DIR, r"jar_store")
+
         self.OPTIONS_FOLDER_DIR = os.path.join(self.MINECRAFT_DIR, r"options_folder")
         self.OPTIONS_FILE = os.path.join(self.MINECRAFT_DIR, r"options.txt")
+        # Options files stored as their differences from a shared base, listed along with the whole options files
+        self.OPTIONS_DELTAS_DIR = os.path.join(self.MINECRAFT_DIR, r"options_deltas")
 
+        self.STATE_DB_FILE = os.path.join(self.DATA_DIR, "state.sqlite3")
+
+        # Where the state was kept before the state store, imported into it on startup
         self.MODS_ORDER_JSON_FILE = os.path.join(self.DATA_DIR, "mods_list.json")
         self.OPTIONS_ORDER_JSON_FILE = os.path.join(self.DATA_DIR, "options_list.json")
+        self.PROFILES_JSON_FILE = os.path.join(self.DATA_DIR, "profiles.json")
+        self.MOD_METADATA_INDEX_DIR = os.path.join(self.DATA_DIR, "mod_metadata_index")
+
+        self.JAR_HASH_INDEX_DIR = os.path.join(self.DATA_DIR, "jar_hash_index")
+        self.JAR_VERIFICATION_INDEX_DIR = os.path.join(self.DATA_DIR, "jar_verification_index")
+
+        self.state_store = _get_shared_cache(self.STATE_DB_FILE, StateStore)
+        if not self.STATE_KEY_PREFIX:
+            self.state_store.migrate_json_file(MODS_ORDER_KEY, self.MODS_ORDER_JSON_FILE)
+            self.state_store.migrate_json_file(OPTIONS_ORDER_KEY, self.OPTIONS_ORDER_JSON_FILE)
+            self.state_store.migrate_json_file(PROFILES_KEY, self.PROFILES_JSON_FILE)
+
+        # The indexes were single json files before they were stored per folder, their entries are computed again
+        for index_dir in (self.MOD_METADATA_INDEX_DIR, self.JAR_HASH_INDEX_DIR, self.JAR_VERIFICATION_INDEX_DIR):
+            if os.path.isfile(f"{index_dir}.json"):
+                os.remove(f"{index_dir}.json")
+                tracing.info("removed old index file", file=f"{index_dir}.json")
+
+        self.mod_metadata_index = _get_shared_cache(self.MOD_METADATA_INDEX_DIR, ModMetadataIndex)
+        self.jar_store = JarStore(self.JAR_STORE_DIR, _get_shared_cache(self.JAR_HASH_INDEX_DIR, JarHashIndex))
+        self.jar_verification_index = _get_shared_cache(self.JAR_VERIFICATION_INDEX_DIR, JarVerificationIndex)
+        self.mod_validators: typing.Dict[str, ModFolderValidator] = {}
+        self.options_profiles = OptionsProfiles(self.OPTIONS_DELTAS_DIR)
+
+        # Listings of the folders in mods_folders/options_folder, each only reused while its mtime is unchanged
+        # Configured with the stored settings by refresh
+        self.folder_discovery = FolderDiscovery()
+
+        # Filled in by build_search_index, then kept up to date by update_search_index and whenever a mods folder is read
+        self.search_indexes: typing.Dict[bool, SearchIndex] = {True: SearchIndex(), False: SearchIndex()}
 
         self.refresh()
 
+    @tracing.traced("controller.refresh")
     def refresh(self) -> None:
         """
-        Ensure the proper folders exist
+        Ensure the proper folders exist, and drop the cached listings of the mods/options folders
         :return: None
         """
 
+        discovery_settings = self.get_discovery_settings()
+        self.folder_discovery.configure(discovery_settings["max_depth"], discovery_settings["ignore"])
+        self.folder_discovery.invalidate()
+
         if not os.path.isdir(self.MINECRAFT_DIR):
             raise NotADirectoryError(".minecraft is not a directory")
 
         self.verify_folder(self.MODS_FOLDERS_DIR, "mods_folders")
         self.verify_folder(self.MODS_DIR, "mods")
         self.verify_folder(self.OPTIONS_FOLDER_DIR, "options_folder")
+        self.verify_folder(self.OPTIONS_DELTAS_DIR, "options_deltas")
 
         # Check if any options files exist, and create 2 default ones if none exist
-        options_1_16 = os.path.join(self.OPTIONS_FOLDER_DIR, "1.16 options")
-        options_1_8 = os.path.join(self.OPTIONS_FOLDER_DIR, "1.8 options")
-
-        if len(os.listdir(self.OPTIONS_FOLDER_DIR)) == 0 and not os.path.islink(self.OPTIONS_FILE) and os.path.exists(self.OPTIONS_FILE):
-            shutil.copyfile(self.OPTIONS_FILE, options_1_16, follow_symlinks=True)
-            shutil.copyfile(self.OPTIONS_FILE, options_1_8, follow_symlinks=True)
-        elif len(os.listdir(self.OPTIONS_FOLDER_DIR)) == 0:
-            if not os.path.isfile(options_1_16):
-                open(options_1_16, "w").close()
-            if not os.path.isfile(options_1_8):
-                open(options_1_8, "w").close()
+        # They start out as the current options.txt, which becomes their base so they take no space until they differ
+        if len(os.listdir(self.OPTIONS_FOLDER_DIR)) == 0 and len(self.options_profiles.names()) == 0:
+            if not os.path.islink(self.OPTIONS_FILE) and os.path.isfile(self.OPTIONS_FILE):
+                self.options_profiles.set_base(read_options(self.OPTIONS_FILE))
+            for name in ("1.16 options", "1.8 options"):
+                self.options_profiles.save(name, self.options_profiles.get_base())
 
         # Check if any mods folders are available, and if possible create one with the preinstalled mods
         if len(os.listdir(self.MODS_FOLDERS_DIR)) == 0:
             os.mkdir(os.path.join(self.MODS_FOLDERS_DIR, "example mods folder"))
 
+    def invalidate_snapshot(self, *, is_mods: bool) -> None:
+        """
+        Drops the cached listing of the mods folders/options files folder, so the next read lists it again
+        :param is_mods: True: drops the mods folders listing, False: drops the options files listing
+        :return: None
+        """
+
+        if is_mods:
+            self.folder_discovery.invalidate(self.MODS_FOLDERS_DIR)
+        else:
+            self.folder_discovery.invalidate(self.OPTIONS_FOLDER_DIR)
+            self.folder_discovery.invalidate(self.OPTIONS_DELTAS_DIR)
+
+    def set_folders_watched(self, watched: bool) -> None:
+        """
+        Tells whether a folder watcher watches the folders from get_watched_folders and hands every change to
+        apply_folder_changes, so listing the mods folders/options files can reuse what was listed without checking it
+        :param watched: Whether or not the folders are watched
+        :return: None
+        """
+
+        self.folder_discovery.set_watched(watched)
+
+    def get_watched_folders(self) -> typing.Dict[str, bool]:
+        """
+        Retrieves the folders to watch for mods folders/options files being added, removed or changed, nested ones
+        included, as deep as they are discovered
+        :return: Folder path -> True if it holds mods folders or jars, False if it holds options files
+        """
+
+        folders = {self.MODS_FOLDERS_DIR: True, self.OPTIONS_FOLDER_DIR: False, self.OPTIONS_DELTAS_DIR: False}
+        for root, is_mods in list(folders.items()):
+            try:
+                subfolders = self.folder_discovery.find_folders(root)
+            except OSError:
+                continue
+            folders.update((folder, is_mods) for folder in subfolders)
+        # The game writes to materialized options files, which only change their contents
+        materialized_dir = os.path.normpath(self.options_profiles.materialized_dir)
+        return {folder: is_mods for folder, is_mods in folders.items()
+                if not (os.path.normpath(folder) + os.sep).startswith(os.path.join(materialized_dir, ""))}
+
+    def mods_folders_containing(self, paths: typing.Iterable[str]) -> typing.List[str]:
+        """
+        Finds the mods folders that files/folders are in, e.g. to update the search index when jars are added to them
+        :param paths: Paths in mods_folders
+        :return: The mods folders the paths are in or are, relative to mods_folders
+        """
+
+        mods_folders = set(self.get_mods_or_options(is_mods=True))
+        found = set()
+        for path in paths:
+            relative = os.path.relpath(path, self.MODS_FOLDERS_DIR).replace(os.sep, "/")
+            parts = relative.split("/")
+            for i in range(1, len(parts) + 1):
+                if "/".join(parts[:i]) in mods_folders:
+                    found.add("/".join(parts[:i]))
+                    break
+        return sorted(found)
+
     def verify_folder(self, folder: str, folder_name: str) -> None:
         """
         Check if each folder exists, and create it if it doesn't
@@ -70,83 +235,196 @@ class ModController:
         :param folder_name: Display name of the folder
         :return: None
         """
-        print(f"{folder_name} exists: {os.path.exists(folder)}")
         if not os.path.exists(folder):
-            print_debug(f"{folder_name}: {folder} does not exist")
+            tracing.info("creating missing folder", folder_name=folder_name, folder=folder)
             if os.path.islink(folder):
                 os.rmdir(folder)
             os.mkdir(folder)
 
     def set_mods_or_options_order(self, mods_list: typing.List[str], *, is_mods: bool) -> None:
         """
-        Stores the ordered list of mods/options in a json file
+        Stores the ordered list of mods/options in the state store
         :param mods_list: The list of mods/options to be stored
         :param is_mods: True: stored as a list of mods, False: stored as a list of options
         :return: None
         """
 
-        file = self.MODS_ORDER_JSON_FILE if is_mods else self.OPTIONS_ORDER_JSON_FILE
-
-        self.verify_folder(self.DATA_DIR, "Data")
-
-        if not os.path.isfile(file):
-            open(file, "w").close()
-
-        with open(file, "w") as outfile:
-            json.dump(mods_list, outfile)
+        self.state_store.set(self.STATE_KEY_PREFIX + (MODS_ORDER_KEY if is_mods else OPTIONS_ORDER_KEY), list(mods_list))
 
     def get_mods_or_options_order(self, *, is_mods: bool) -> typing.List[str]:
         """
         Retrieves the ordered list of mods/options
         :param is_mods: True: retrieves the ordered list of mods, False: retrieves the ordered list of options
-        :return: The ordered list of options or mods
+        :return: The ordered list of options or mods, or None if none is stored
         """
 
-        file = self.MODS_ORDER_JSON_FILE if is_mods else self.OPTIONS_ORDER_JSON_FILE
+        return self.state_store.get(self.STATE_KEY_PREFIX + (MODS_ORDER_KEY if is_mods else OPTIONS_ORDER_KEY))
 
-        self.verify_folder(self.DATA_DIR, "Data")
+    @tracing.traced("controller.get_mods_or_options")
+    def get_mods_or_options(self, *, is_mods: bool) -> typing.List[str]:
+        """
+        Retrieves the available mods folders/options files, including the ones nested in folders, e.g. "pack/1.20.1"
+        :param is_mods: True: retrieves the available mods folders, False: retrieves the available options files
+        :return: The list of mods folders/options files, relative to the mods_folders/options_folder folder
+        """
 
-        if not os.path.isfile(file):
-            open(file, "w").close()
+        if is_mods:
+            return self._find_mods_folders()
+
+        # Whole options files hide stored options profiles of the same name
+        result_list = self.folder_discovery.find_options_files(self.OPTIONS_FOLDER_DIR)
+        if os.path.isdir(self.OPTIONS_DELTAS_DIR):
+            options_files = set(result_list)
+            # Profiles can be nested like options files, e.g. "pack/pvp", materialized copies have no delta suffix
+            result_list += [item[:-len(DELTA_SUFFIX)] for item in self.folder_discovery.find_options_files(self.OPTIONS_DELTAS_DIR)
+                            if item.endswith(DELTA_SUFFIX) and item[:-len(DELTA_SUFFIX)] not in options_files]
+        return result_list
 
-        with open(file, "r") as f:
-            try:
-                result_list = json.load(f)
-            except json.decoder.JSONDecodeError:
-                f.close()
-                os.remove(file)
-                return None
+    def _find_mods_folders(self) -> typing.List[str]:
+        """
+        Finds the mods folders, a top level folder that has held jars stays a mods folder once its jars were moved into
+        subfolders, e.g. Forge's version subfolders, instead of being renamed after them, which saved orders and profiles
+        would lose track of
+        :return: The mods folders, relative to the mods_folders folder
+        """
 
-        return result_list
+        state_key = self.STATE_KEY_PREFIX + TOP_LEVEL_MODS_FOLDERS_KEY
+        known = self.state_store.get(state_key, [])
+        mods_folders = self.folder_discovery.find_mods_folders(self.MODS_FOLDERS_DIR, set(known))
+
+        holding_jars = set()
+        for name in mods_folders:
+            if "/" not in name and name not in known:
+                try:
+                    if self.folder_discovery.list_directory(os.path.join(self.MODS_FOLDERS_DIR, name)).has_jars:
+                        holding_jars.add(name)
+                except OSError:
+                    continue
+        top_level = {name for name in mods_folders if "/" not in name}
+        if holding_jars or not top_level.issuperset(known):
+            self.state_store.set(state_key, sorted(top_level.intersection(known) | holding_jars))
+        return mods_folders
+
+    def get_discovery_settings(self) -> typing.Dict[str, typing.Any]:
+        """
+        Retrieves how mods folders/options files are looked for, shared by every .minecraft folder
+        :return: Dict with "max_depth", how many folders deep to look, and "ignore", the names to skip as shell wildcards
+        """
 
-    def get_mods_or_options(self, *, is_mods: bool) -> typing.List[str]:
+        return {"max_depth": DEFAULT_MAX_DEPTH, "ignore": list(DEFAULT_IGNORE_PATTERNS), **self.state_store.get(DISCOVERY_KEY, {})}
+
+    def set_discovery_settings(self, max_depth: int, ignore_patterns: typing.List[str]) -> None:
         """
-        Retrieves the available mods folders/options files
-        :param is_mods: True: retrieves the available mods folders, False: retrieves the available options files
-        :return: The list of mods folders/options files
+        Changes how mods folders/options files are looked for
+        :param max_depth: How many folders deep to look, 1 only looks at the top level
+        :param ignore_patterns: Names of files/folders to skip, as shell wildcards
+        :return: None
         """
 
-        # TODO if you wanted to be fancy you could get the folders in subdirectories, I don't want to be fancy though
+        self.folder_discovery.configure(max_depth, ignore_patterns)
+        self.state_store.set(DISCOVERY_KEY, {"max_depth": max_depth, "ignore": list(ignore_patterns)})
 
-        target_dir = self.MODS_FOLDERS_DIR if is_mods else self.OPTIONS_FOLDER_DIR
+    def get_apply_mode(self) -> str:
+        """
+        Retrieves how mods folders/options files are put in place for the game, one of APPLY_MODES
+        :return: "auto", "symlink" or "copy"
+        """
 
-        # ignore files if looking for mods folders, and ignore folders if looking for options files
-        if is_mods:
-            result_list = [item for item in os.listdir(target_dir) if os.path.isdir(os.path.join(target_dir, item))]
-        else:
-            result_list = [item for item in os.listdir(target_dir) if os.path.isfile(os.path.join(target_dir, item))]
+        return self.state_store.get(self.STATE_KEY_PREFIX + APPLY_MODE_KEY, "auto")
 
-        return result_list
+    def set_apply_mode(self, apply_mode: str) -> None:
+        """
+        Changes how mods folders/options files are put in place for the game
+        Once mods has been synced in auto mode it keeps being synced, switch to symlink mode to go back to links
+        :param apply_mode: "auto", "symlink" or "copy"
+        :return: None
+        """
 
-    def transfer_mods_or_options(self, src_location: str, *, is_mods: bool) -> bool:
+        if apply_mode not in APPLY_MODES:
+            raise ValueError(f"unknown apply mode {apply_mode!r}, expected one of {list(APPLY_MODES)}")
+        self.state_store.set(self.STATE_KEY_PREFIX + APPLY_MODE_KEY, apply_mode)
+
+    @tracing.traced("controller.transfer_mods_or_options")
+    def transfer_mods_or_options(self, src_location: str, *, is_mods: bool, verify: bool = False) -> bool:
         """
         Makes a link to the mods/options folder/file to be used by Forge/Minecraft
+        The link is swapped in atomically, and left alone if it already points at the folder/file
         :param src_location: Mods/Options folder/file to be linked to
         :param is_mods: True: linked as mods folder, False: linked as options file
+        :param verify: Check the mods folder's jars first, and raise ValueError instead of linking it if any is corrupt
+        :return: Whether or not the function succeeded
+        """
+
+        tracing.debug("transfer_mods_or_options", src=src_location, is_mods=is_mods)
+
+        if verify and is_mods:
+            self._raise_for_corrupt_jars(src_location)
+
+        if not self._apply_items([(src_location, is_mods)]):
+            return False
+
+        self._record_applied(src_location, is_mods=is_mods)
+        return True
+
+    @tracing.traced("controller.apply_mods_and_options")
+    def apply_mods_and_options(self, mods_folder: str, options_file: str, *, verify: bool = False) -> bool:
+        """
+        Links a mods folder and an options file together, if either fails neither is changed
+        :param mods_folder: Mods folder to be linked to
+        :param options_file: Options file to be linked to
+        :param verify: Check the mods folder's jars first, and raise ValueError instead of linking anything if any is corrupt
         :return: Whether or not the function succeeded
         """
 
-        print_debug(f"transfer_mods_options called, src: {src_location}, is_mods: {is_mods}")
+        tracing.debug("apply_mods_and_options", mods=mods_folder, options=options_file)
+
+        if verify:
+            self._raise_for_corrupt_jars(mods_folder)
+
+        if not self._apply_items([(mods_folder, True), (options_file, False)]):
+            return False
+
+        self._record_applied(mods_folder, is_mods=True)
+        self._record_applied(options_file, is_mods=False)
+        return True
+
+    def _apply_items(self, items: typing.List[typing.Tuple[str, bool]]) -> bool:
+        """
+        Puts mods folders/options files in place as the apply mode says, linking them or else copying them
+        :param items: (mods folder/options file, is_mods) to be applied
+        :return: False if symlinks couldn't be made in symlink mode, True otherwise
+        """
+
+        apply_mode = self.get_apply_mode()
+        # A synced mods folder can't be replaced with a link without removing its files first, so auto keeps syncing it
+        keeps_syncing = apply_mode == "auto" and any(is_mods for _, is_mods in items) and is_synced_folder(self.MODS_DIR)
+        if apply_mode == "copy" or keeps_syncing:
+            self._copy_mods_or_options(items)
+            return True
+
+        try:
+            with LinkTransaction() as transaction:
+                for src_location, is_mods in items:
+                    self._link_mods_or_options(transaction, src_location, is_mods=is_mods)
+            if not all(is_mods for _, is_mods in items):
+                # options.txt is a link now, not the copy the record was about
+                clear_synced_file(self.OPTIONS_FILE)
+        except SymlinkPrivilegeError as e:
+            # Any other error, e.g. a mods folder with the user's files in it, isn't solved by copying and is raised
+            if apply_mode == "symlink":
+                tracing.warning("you need to enable symlinks", error=e)
+                return False
+            tracing.warning("symlinks are unavailable, copying instead", error=e)
+            self._copy_mods_or_options(items)
+        return True
+
+    def _source_path(self, src_location: str, *, is_mods: bool) -> str:
+        """
+        Checks the mods/options folder/file exists, materializing options stored as a delta
+        :param src_location: The mods folder/options file
+        :param is_mods: True: a mods folder, False: an options file
+        :return: The path of the folder/file to be put in place
+        """
 
         partial_src_dir = self.MODS_FOLDERS_DIR if is_mods else self.OPTIONS_FOLDER_DIR
         src_file_or_dir = os.path.join(partial_src_dir, src_location)
@@ -154,26 +432,138 @@ class ModController:
         if (not os.path.isdir(src_file_or_dir)) and is_mods:
             raise NotADirectoryError(f"{src_file_or_dir} is not a directory")
 
+        if (not is_mods) and (not os.path.isfile(src_file_or_dir)) and self.options_profiles.exists(src_location):
+            # Only rewritten if its options changed, otherwise the link is left alone too
+            src_file_or_dir = self.options_profiles.materialize(src_location)
+
         if (not os.path.isfile(src_file_or_dir)) and (not is_mods):
             raise FileNotFoundError(f"{src_file_or_dir} is not a file")
 
+        return src_file_or_dir
+
+    @tracing.traced("controller.link")
+    def _link_mods_or_options(self, transaction: LinkTransaction, src_location: str, *, is_mods: bool) -> bool:
+        """
+        Checks the mods/options folder/file exists and links to it as part of a transaction
+        :param transaction: The transaction the link is made in
+        :param src_location: Mods/Options folder/file to be linked to
+        :param is_mods: True: linked as mods folder, False: linked as options file
+        :return: Whether or not the link had to be changed
+        """
+
+        src_file_or_dir = self._source_path(src_location, is_mods=is_mods)
+
         # TODO Perhaps implement a check to verify if the folder/file is backed up in the other folder doesnt get deleted without saving
 
+        if is_mods and is_synced_folder(self.MODS_DIR):
+            # Not undone by a rollback, the files are copies of a mods folder and are synced again on the next copy
+            clear_synced_folder(self.MODS_DIR)
+
         dst_dir = self.MODS_DIR if is_mods else self.OPTIONS_FILE
-        if os.path.isfile(dst_dir):
-            os.remove(dst_dir)
-        elif os.path.isdir(dst_dir):
-            os.rmdir(dst_dir)
-        elif os.path.islink(dst_dir):
-            os.unlink(dst_dir)
+        return transaction.link(src_file_or_dir, dst_dir, target_is_directory=is_mods)
 
-        try:
-            os.symlink(src_file_or_dir, dst_dir)
-        except OSError:
-            print_debug("you need to enable symlinks")
-            return False
+    @tracing.traced("controller.copy")
+    def _copy_mods_or_options(self, items: typing.List[typing.Tuple[str, bool]]) -> typing.Optional[SyncResult]:
+        """
+        Copies/hardlinks mods folders/options files in place, for when symlinks can't be made
+        The mods folder is synced incrementally, only the jars that differ from the last synced mods folder are placed.
+        Every source is checked before anything changes, but unlike links a failure partway isn't rolled back,
+        the sync's manifest keeps track of what was placed so applying again finishes it.
+        :param items: (mods folder/options file, is_mods) to be applied
+        :return: What syncing the mods folder did, None if no mods folder was applied
+        """
 
-        return True
+        sources = [(self._source_path(src_location, is_mods=is_mods), is_mods) for src_location, is_mods in items]
+
+        sync_result = None
+        for src_file_or_dir, is_mods in sources:
+            if not is_mods:
+                # A hardlink to a materialized options file still lets the game's changes be kept, see OptionsProfiles
+                sync_file(src_file_or_dir, self.OPTIONS_FILE)
+                continue
+
+            if os.path.islink(self.MODS_DIR):
+                os.unlink(self.MODS_DIR)
+            os.makedirs(self.MODS_DIR, exist_ok=True)
+            sync_result = sync_folder(src_file_or_dir, self.MODS_DIR)
+        return sync_result
+
+    def _record_applied(self, name: str, *, is_mods: bool) -> None:
+        """
+        Remembers when a mods folder/options file was last applied
+        :param name: The mods folder/options file that was applied
+        :param is_mods: True: a mods folder was applied, False: an options file was applied
+        :return: None
+        """
+
+        last_applied = self.state_store.get(self.STATE_KEY_PREFIX + LAST_APPLIED_KEY, {})
+        kind = "mods" if is_mods else "options"
+        last_applied = {**last_applied, kind: {**last_applied.get(kind, {}), name: time.time()}}
+        self.state_store.set(self.STATE_KEY_PREFIX + LAST_APPLIED_KEY, last_applied)
+
+    @tracing.traced("controller.get_mods_or_options_details")
+    def get_mods_or_options_details(self, name: str, *, is_mods: bool) -> typing.Dict[str, typing.Any]:
+        """
+        Retrieves the details shown next to a mods folder/options file
+        Only reads what is already indexed, so it is cheap enough for every row scrolled into view, the loaders of a
+        mods folder with jars that weren't indexed yet are None until get_all_mods_metadata indexed them
+        :param name: The mods folder/options file
+        :param is_mods: True: details of a mods folder, False: details of an options file
+        :return: Dict with "size", "last_applied" and, for mods folders, "jars" and "loader"
+        """
+
+        last_applied = self.state_store.get(self.STATE_KEY_PREFIX + LAST_APPLIED_KEY, {}).get("mods" if is_mods else "options", {})
+        details = {"last_applied": last_applied.get(name)}
+
+        if not is_mods:
+            options_file = os.path.join(self.OPTIONS_FOLDER_DIR, name)
+            if not os.path.isfile(options_file) and self.options_profiles.exists(name):
+                details["size"] = self.options_profiles.delta_size(name)
+                return details
+            details["size"] = os.path.getsize(options_file)
+            return details
+
+        mods_folder = os.path.join(self.MODS_FOLDERS_DIR, name)
+        jars = [jar.stat().st_size for jar in find_jars(mods_folder)]
+        mods, complete = self.mod_metadata_index.lookup_folder(mods_folder)
+        details.update(jars=len(jars), size=sum(jars), loader=", ".join(sorted({mod.loader for mod in mods})) if complete else None)
+        return details
+
+    def save_profile(self, name: str, mods_folder: str, options_file: str) -> None:
+        """
+        Stores a named profile, a mods folder and an options file applied together, shared by every .minecraft folder
+        :param name: The name of the profile
+        :param mods_folder: The mods folder of the profile
+        :param options_file: The options file of the profile
+        :return: None
+        """
+
+        profiles = dict(self.get_profiles())
+        profiles[name] = {"mods": mods_folder, "options": options_file}
+        self.state_store.set(PROFILES_KEY, profiles)
+
+    def get_profiles(self) -> typing.Dict[str, typing.Dict[str, str]]:
+        """
+        Retrieves the named profiles
+        :return: Dict of profile name -> {"mods": mods folder, "options": options file}
+        """
+
+        return self.state_store.get(PROFILES_KEY, {})
+
+    @tracing.traced("controller.apply_profile")
+    def apply_profile(self, name: str, *, verify: bool = False) -> bool:
+        """
+        Links the mods folder and options file of a named profile together
+        :param name: The name of the profile
+        :param verify: Check the mods folder's jars first, and raise ValueError instead of linking anything if any is corrupt
+        :return: Whether or not the function succeeded
+        """
+
+        profile = self.get_profiles().get(name)
+        if profile is None:
+            raise KeyError(f"There is no profile named {name}")
+
+        return self.apply_mods_and_options(profile["mods"], profile["options"], verify=verify)
 
     def rename_mods_or_options(self, src_name: str, dst_name: str, *, is_mods: bool) -> None:
         """
@@ -186,7 +576,7 @@ class ModController:
         partial_src = self.MODS_FOLDERS_DIR if is_mods else self.OPTIONS_FOLDER_DIR
         src_path = os.path.join(partial_src, src_name)
         dst_path = os.path.join(partial_src, dst_name)
-        print_debug(f"renamed {src_path} to {dst_path}")
+        tracing.info("renamed", src=src_path, dst=dst_path)
         # os.rename(src_path, dst_path)
 
     def resolve_mods_or_options_list(self, *, is_mods: bool) -> typing.List[str]:
@@ -196,62 +586,383 @@ class ModController:
         :return: The resolved list of mods folders/options files
         """
 
+        return self.reconcile_mods_or_options_list(is_mods=is_mods).resolved
+
+    @tracing.traced("controller.reconcile_mods_or_options_list")
+    def reconcile_mods_or_options_list(self, *, is_mods: bool) -> ReconcileResult:
+        """
+        Resolves the list of files/folders against the ordered list, and stores the new order if it changed
+        :param is_mods: True: resolves the list of mods folders, False: resolves the list of options files
+        :return: The resolved list along with the items added, removed and kept since the stored order
+        """
+
         file_list = self.get_mods_or_options(is_mods=is_mods)
         order_list = self.get_mods_or_options_order(is_mods=is_mods)
 
         if order_list is None:
             self.set_mods_or_options_order(file_list, is_mods=is_mods)
-            return file_list
-
-        reversed_result_list = order_list
-        reversed_result_list.reverse()  # List is reversed so append() works at the beginning
-
-        # Find each item that is in the list of files, but not in the ordered list, and adds it to the beginning of the ordered list
-        for file_item in file_list:
-            same = False
-            for order_item in order_list:
-                if file_item == order_item:
-                    same = True
-            if not same:
-                reversed_result_list.append(file_item)
-
-        # Find each item that is in the ordered list but not in the files list, and removes it from the ordered list
-        for order_item in order_list:
-            same = False
-            for file_item in file_list:
-                if file_item == order_item:
-                    same = True
-            if not same:
-                reversed_result_list.remove(order_item)
-
-        reversed_result_list.reverse()
-        print_debug(f"list: {reversed_result_list}")
-        self.set_mods_or_options_order(reversed_result_list, is_mods=is_mods)
-        return reversed_result_list
-
-    def get_minecraft_dir(self):
+            return ReconcileResult(resolved=file_list, added=list(file_list), removed=[], kept=[])
+
+        result = reconcile_mods_or_options(file_list, order_list)
+        tracing.debug("reconciled", is_mods=is_mods, added=len(result.added), removed=len(result.removed))
+
+        if result.resolved != order_list:
+            self.set_mods_or_options_order(result.resolved, is_mods=is_mods)
+        return result
+
+    @tracing.traced("controller.apply_folder_changes")
+    def apply_folder_changes(self, folders: typing.Iterable[str], *, is_mods: bool) -> typing.Tuple[ReconcileResult, typing.List[str]]:
+        """
+        Brings the list and the search index up to date with folders the folder watcher saw change
+        :param folders: The folders that changed, nested ones and the mods folders themselves included
+        :param is_mods: True: folders in mods_folders changed, False: options folders changed
+        :return: What reconciling the list found, and the mods folders already listed whose jars were read again
+        """
+
+        folders = list(folders)
+        # Only the listings of the folders that changed are dropped, the others are still current
+        self.folder_discovery.invalidate_folders(folders)
+        result = self.reconcile_mods_or_options_list(is_mods=is_mods)
+        self.update_search_index(result, is_mods=is_mods)
+        changed_mods_folders = []
+        if is_mods:
+            # Jars were added to or removed from these, reading their mods again updates what they are searched by
+            changed_mods_folders = [mods_folder for mods_folder in self.mods_folders_containing(folders) if mods_folder not in result.added]
+            for mods_folder in changed_mods_folders:
+                self.get_mods_metadata(mods_folder)
+        return result, changed_mods_folders
+
+    @tracing.traced("controller.get_mods_metadata")
+    def get_mods_metadata(self, mods_folder: str) -> typing.List[ModMetadata]:
+        """
+        Retrieves the mod id, version, loader and Minecraft version of every mod in a mods folder
+        Only jars that changed since they were last indexed are read
+        :param mods_folder: The mods folder to be read
+        :return: The mods in the mods folder
+        """
+
+        mods = self.mod_metadata_index.scan_folder(os.path.join(self.MODS_FOLDERS_DIR, mods_folder))
+        if mods_folder in self.search_indexes[True]:
+            self.search_indexes[True].set_document(mods_folder, mod_terms(mods))
+        return mods
+
+    @tracing.traced("controller.get_all_mods_metadata")
+    def get_all_mods_metadata(self, progress: typing.Optional[typing.Callable[[int, int], None]] = None
+                              ) -> typing.Dict[str, typing.List[ModMetadata]]:
+        """
+        Retrieves the mods in every mods folder, reading new or changed jars in parallel
+        :param progress: Called with (jars read, jars to read) while reading changed jars
+        :return: Mods folder -> the mods in that mods folder
+        """
+
+        mods_folders = {mods_folder: os.path.join(self.MODS_FOLDERS_DIR, mods_folder) for mods_folder in self.get_mods_or_options(is_mods=True)}
+        all_mods = self.mod_metadata_index.scan_folders(mods_folders, progress)
+        for mods_folder, mods in all_mods.items():
+            if mods_folder in self.search_indexes[True]:
+                self.search_indexes[True].set_document(mods_folder, mod_terms(mods))
+        return all_mods
+
+    @tracing.traced("controller.build_search_index")
+    def build_search_index(self, *, is_mods: bool, progress: typing.Optional[typing.Callable[[int, int], None]] = None) -> None:
+        """
+        Indexes every mods folder/options file for searching, mods folders along with the mods in them
+        Names are indexed first so they can be searched right away, and only what changed since the last build is reindexed
+        :param is_mods: True: indexes the mods folders, False: indexes the options files
+        :param progress: Called with (jars read, jars to read) while reading changed jars
+        :return: None
+        """
+
+        search_index = self.search_indexes[is_mods]
+        names = self.get_mods_or_options(is_mods=is_mods)
+        for name in set(search_index.names()).difference(names):
+            search_index.remove_document(name)
+        for name in names:
+            if name not in search_index:
+                search_index.set_document(name)
+
+        if is_mods:
+            self.get_all_mods_metadata(progress)
+
+    @tracing.traced("controller.update_search_index")
+    def update_search_index(self, result: ReconcileResult, *, is_mods: bool) -> None:
+        """
+        Applies the mods folders/options files added or removed since the last reconcile to the search index
+        :param result: What reconciling the mods folders/options files found
+        :param is_mods: True: the mods folders were reconciled, False: the options files were reconciled
+        :return: None
+        """
+
+        search_index = self.search_indexes[is_mods]
+        for name in result.removed:
+            search_index.remove_document(name)
+        for name in result.added:
+            search_index.set_document(name)
+            if is_mods:
+                self.get_mods_metadata(name)
+
+    def search_mods_or_options(self, query: str, *, is_mods: bool) -> typing.Optional[typing.Set[str]]:
+        """
+        Finds the mods folders/options files whose name, or a mod in them, matches a query
+        Every token of the query has to match the start of a token, or a whole token with one typo.
+        "mod_id@version" finds the mods folders holding that mod at that version, e.g. "jei@11.x".
+        :param query: What was typed
+        :param is_mods: True: searches the mods folders, False: searches the options files
+        :return: The matching names, or None if the query is empty so everything matches
+        """
+
+        return self.search_indexes[is_mods].search(query)
+
+    @tracing.traced("controller.validate_mods_folder")
+    def validate_mods_folder(self, mods_folder: str) -> typing.List[ModIssue]:
+        """
+        Checks the mods in a mods folder against each other for duplicates, missing dependencies and version mismatches
+        Uses the indexed jar metadata, and only re-evaluates the mods that changed since the folder was last checked
+        :param mods_folder: The mods folder to be checked
+        :return: The problems found, empty if there are none
+        """
+
+        mods = self.get_mods_metadata(mods_folder)
+        validator = self.mod_validators.setdefault(mods_folder, ModFolderValidator())
+        issues = self.verify_mods_folder(mods_folder) + validator.check(mods)
+        tracing.debug("validated", mods_folder=mods_folder, issues=len(issues))
+        return issues
+
+    def _jar_issues(self, mods_folder: str, verdicts: typing.List[JarVerdict]) -> typing.List[ModIssue]:
+        folder = os.path.join(self.MODS_FOLDERS_DIR, mods_folder)
+        issues = []
+        for verdict in verdicts:
+            if verdict.error is not None:
+                jar = os.path.relpath(verdict.jar, folder).replace(os.sep, "/")
+                issues.append(ModIssue("corrupt_jar", jar, f"{jar} is corrupt or incomplete, {verdict.error}"))
+        return issues
+
+    @tracing.traced("controller.verify_mods_folder")
+    def verify_mods_folder(self, mods_folder: str) -> typing.List[ModIssue]:
+        """
+        Checks the zip structure and CRCs of every jar in a mods folder, to catch corrupt or partially downloaded jars
+        Only jars that changed since they were last checked are opened
+        :param mods_folder: The mods folder to be checked
+        :return: A "corrupt_jar" issue for every broken jar, empty if there are none
+        """
+
+        return self._jar_issues(mods_folder, self.jar_verification_index.verify_folder(os.path.join(self.MODS_FOLDERS_DIR, mods_folder)))
+
+    @tracing.traced("controller.verify_all_mods_folders")
+    def verify_all_mods_folders(self, progress: typing.Optional[typing.Callable[[int, int], None]] = None
+                                ) -> typing.Dict[str, typing.List[ModIssue]]:
+        """
+        Checks the jars of every mods folder, the changed jars of all of them in one parallel batch
+        :param progress: Called with (jars checked, jars to check) while checking changed jars
+        :return: Mods folder -> a "corrupt_jar" issue for every broken jar in it
+        """
+
+        mods_folders = {mods_folder: os.path.join(self.MODS_FOLDERS_DIR, mods_folder) for mods_folder in self.get_mods_or_options(is_mods=True)}
+        verdicts = self.jar_verification_index.verify_folders(mods_folders, progress)
+        return {mods_folder: self._jar_issues(mods_folder, folder_verdicts) for mods_folder, folder_verdicts in verdicts.items()}
+
+    def _raise_for_corrupt_jars(self, mods_folder: str) -> None:
+        issues = self.verify_mods_folder(mods_folder)
+        if issues:
+            raise ValueError(f"{mods_folder} has {len(issues)} corrupt jars: {', '.join(issue.mod_id for issue in issues)}")
+
+    @tracing.traced("controller.deduplicate_mods_folders")
+    def deduplicate_mods_folders(self, progress: typing.Optional[typing.Callable[[int, int], None]] = None) -> DeduplicateResult:
+        """
+        Replaces jars shared between mods folders with hardlinks to a single stored copy, and deletes the stored jars
+        that only jars of removed mods folders linked to
+        :param progress: Called with (jars hashed, jars to hash) while hashing changed jars
+        :return: How many jars were linked and collected, and how much space linking saved
+        """
+
+        mods_folders = [os.path.join(self.MODS_FOLDERS_DIR, mods_folder) for mods_folder in self.get_mods_or_options(is_mods=True)]
+        result = self.jar_store.deduplicate_folders(mods_folders, progress)
+        # Every mods folder links to the store now, so a stored jar nothing links to isn't in any of them
+        return result._replace(collected=self.jar_store.collect_garbage())
+
+    @tracing.traced("controller.copy_mods_folder")
+    def copy_mods_folder(self, src_name: str, dst_name: str) -> None:
+        """
+        Creates a new mods folder from an existing one, hardlinking its jars so it takes no extra space
+        :param src_name: The mods folder to be copied
+        :param dst_name: The name of the new mods folder
+        :return: None
+        """
+
+        self.jar_store.clone_folder(os.path.join(self.MODS_FOLDERS_DIR, src_name), os.path.join(self.MODS_FOLDERS_DIR, dst_name))
+
+    def get_options(self, options_file: str) -> typing.Dict[str, str]:
+        """
+        Reads the options of an options file, whether it is a whole file or stored as a delta
+        :param options_file: The options file to be read
+        :return: Dict of option -> value
+        """
+
+        path = os.path.join(self.OPTIONS_FOLDER_DIR, options_file)
+        if os.path.isfile(path):
+            return read_options(path)
+        if self.options_profiles.exists(options_file):
+            return self.options_profiles.load(options_file)
+        raise FileNotFoundError(f"{path} is not a file")
+
+    @tracing.traced("controller.merge_options_files")
+    def merge_options_files(self, name: str, parts: typing.List[typing.Tuple[str, typing.Optional[typing.List[str]]]]) -> None:
+        """
+        Stores a new options file taking some categories of options from each of several options files
+        e.g. [("pvp", ["keybinds"]), ("low end pc", ["video"])], the other options come from the base
+        :param name: The name of the new options file
+        :param parts: (options file, categories of options_profiles.OPTION_CATEGORIES to take from it, or None for all of them)
+        :return: None
+        """
+
+        merged = merge_options(self.options_profiles.get_base(), [(self.get_options(options_file), categories)
+                                                                  for options_file, categories in parts])
+        self.options_profiles.save(name, merged)
+
+    @tracing.traced("controller.compact_options_files")
+    def compact_options_files(self) -> int:
+        """
+        Stores every whole options file as its differences from a shared base, and removes the whole file
+        options.txt is relinked to the stored copy if it was linked to one of the removed files
+        :return: The bytes saved
+        """
+
+        options_files = {item: os.path.join(self.OPTIONS_FOLDER_DIR, item) for item in os.listdir(self.OPTIONS_FOLDER_DIR)
+                         if os.path.isfile(os.path.join(self.OPTIONS_FOLDER_DIR, item))}
+        linked = read_link_target(self.OPTIONS_FILE)
+
+        bytes_saved = self.options_profiles.compact(options_files)
+        self.invalidate_snapshot(is_mods=False)
+
+        for name, options_file in options_files.items():
+            if linked is not None and os.path.normpath(linked) == os.path.normpath(options_file):
+                self.transfer_mods_or_options(name, is_mods=False)
+        return bytes_saved
+
+    @tracing.traced("controller.export_profile")
+    def export_profile(self, archive_file: str, *, profile: typing.Optional[str] = None, mods_folder: typing.Optional[str] = None,
+                       options_file: typing.Optional[str] = None) -> dict:
+        """
+        Writes a mods folder, an options file and their places in the stored orders to a single archive
+        :param archive_file: The archive to be written
+        :param profile: A named profile to export, instead of mods_folder and options_file
+        :param mods_folder: The mods folder to be exported
+        :param options_file: The options file to be exported
+        :return: The archive's manifest
+        """
+
+        if profile is not None:
+            profile_info = self.get_profiles().get(profile)
+            if profile_info is None:
+                raise KeyError(f"There is no profile named {profile}")
+            mods_folder, options_file = profile_info["mods"], profile_info["options"]
+        if mods_folder is None or options_file is None:
+            raise ValueError("export needs a profile, or a mods folder and an options file")
+
+        mods_folder_path = os.path.join(self.MODS_FOLDERS_DIR, mods_folder)
+        if not os.path.isdir(mods_folder_path):
+            raise NotADirectoryError(f"{mods_folder_path} is not a directory")
+
+        def order_index(name: str, is_mods: bool) -> typing.Optional[int]:
+            order = self.get_mods_or_options_order(is_mods=is_mods) or []
+            return order.index(name) if name in order else None
+
+        info = {
+            "profile": profile,
+            "mods_folder": mods_folder,
+            "options_file": options_file,
+            "order": {"mods": order_index(mods_folder, True), "options": order_index(options_file, False)},
+        }
+        with atomic_write(archive_file, "wb") as archive:
+            manifest = export_archive(archive, mods_folder_path, format_options(self.get_options(options_file)).encode(),
+                                      info, self.jar_store.hash_index)
+        return manifest
+
+    @tracing.traced("controller.import_profile")
+    def import_profile(self, archive_file: str, *, profile: typing.Optional[str] = None, mods_folder: typing.Optional[str] = None,
+                       options_file: typing.Optional[str] = None) -> ImportResult:
+        """
+        Creates the mods folder and options file of an exported archive, reusing the jars that are already here
+        They are put back at their places in the stored orders, and saved as a profile if the archive was one
+        :param archive_file: The archive to be read
+        :param profile: The name to save the profile under, defaults to the archive's
+        :param mods_folder: The name of the new mods folder, defaults to the archive's
+        :param options_file: The name of the new options file, defaults to the archive's
+        :return: The archive's manifest and how many jars were reused
+        """
+
+        names = {}
+
+        def destination(manifest: dict) -> str:
+            names["mods"] = mods_folder or manifest["mods_folder"]
+            return os.path.join(self.MODS_FOLDERS_DIR, names["mods"])
+
+        with open(archive_file, "rb") as archive:
+            result = import_archive(archive, destination, self.jar_store, [self.MODS_FOLDERS_DIR])
+        self.jar_store.hash_index.save()
+
+        # An options file of the same name is reused if it has the same options, the imported one is renamed otherwise
+        options = parse_options(result.options_contents.decode("utf-8", errors="replace"))
+        base_name = options_file or result.manifest["options_file"]
+        names["options"] = base_name
+        copy_number = 1
+        while names["options"] in self.get_mods_or_options(is_mods=False) and self.get_options(names["options"]) != options:
+            copy_number += 1
+            names["options"] = f"{base_name} ({copy_number})"
+        options_path = os.path.join(self.OPTIONS_FOLDER_DIR, names["options"])
+        if not os.path.exists(options_path) and not self.options_profiles.exists(names["options"]):
+            os.makedirs(os.path.dirname(options_path), exist_ok=True)
+            with open(options_path, "wb") as f:
+                f.write(result.options_contents)
+
+        for is_mods, kind in ((True, "mods"), (False, "options")):
+            self.invalidate_snapshot(is_mods=is_mods)
+            order = [name for name in self.resolve_mods_or_options_list(is_mods=is_mods) if name != names[kind]]
+            index = result.manifest.get("order", {}).get(kind)
+            order.insert(len(order) if index is None else min(index, len(order)), names[kind])
+            self.set_mods_or_options_order(order, is_mods=is_mods)
+
+        profile = profile or result.manifest.get("profile")
+        if profile:
+            self.save_profile(profile, names["mods"], names["options"])
+        return result
+
+    def get_minecraft_dir(self) -> str:
+        """
+        Reads the .minecraft location from the info file, creating the file with instructions if it doesn't exist
+        :return: The path to the .minecraft folder
+        """
+
+        return self.get_minecraft_dirs()[0]
+
+    def get_minecraft_dirs(self) -> typing.List[str]:
+        """
+        Reads every .minecraft location from the info file, one per line, creating the file with instructions if it doesn't exist
+        :return: The paths to the .minecraft folders, the first one is the default
+        """
+
         self.verify_folder(self.DATA_DIR, "Data")
 
         minecraft_dir_info_file_default = "# Replace the line below with the path to your .minecraft folder\nInsert .minecraft path here\n# Note that entering a wrong or incomplete .minecraft path could have unintended affects, and the program will not run if the line is unchanged."
 
-        print_debug(f"reading from: {self.MINECRAFT_DIR_INFO_FILE}")
+        tracing.debug("reading .minecraft locations", info_file=self.MINECRAFT_DIR_INFO_FILE)
 
         if not os.path.isfile(self.MINECRAFT_DIR_INFO_FILE):
             with open(self.MINECRAFT_DIR_INFO_FILE, "w") as f:
                 f.write(minecraft_dir_info_file_default)
 
         with open(self.MINECRAFT_DIR_INFO_FILE) as f:
-            if f.read() == minecraft_dir_info_file_default:
-                raise IOError(f"Please change the .minecraft location info, in the file: {self.MINECRAFT_DIR_INFO_FILE}")
+            info_file_contents = f.read()
 
-        with open(self.MINECRAFT_DIR_INFO_FILE) as f:
-            minecraft_dir = [line.strip() for line in f.readlines() if not line[0] == "#"][0]
+        if info_file_contents == minecraft_dir_info_file_default:
+            raise IOError(f"Please change the .minecraft location info, in the file: {self.MINECRAFT_DIR_INFO_FILE}")
+
+        minecraft_dirs = [line.strip() for line in info_file_contents.splitlines() if line.strip() and not line[0] == "#"]
 
-        print(minecraft_dir)
-        return minecraft_dir
+        tracing.debug(".minecraft locations", minecraft_dirs=minecraft_dirs)
+        return minecraft_dirs
 
 
 if __name__ == "__main__":
-    mod_controller = ModController()
-    print_debug(mod_controller.get_mods_or_options(is_mods=True))
-    print_debug(mod_controller.get_mods_or_options(is_mods=False))
+    mod_controller = get_mod_controller()
+    print(mod_controller.get_mods_or_options(is_mods=True))
+    print(mod_controller.get_mods_or_options(is_mods=False))
@@ -1,14 +1,24 @@
+import multiprocessing
+import sqlite3
 import sys
+import typing
 import PyQt5
 from PyQt5 import QtCore
 from PyQt5.QtWidgets import *
 import minecraft_mod_controller as mmc
 import MMCListWidget
-from print_debug import print_debug
+from background_jobs import get_job_runner
+from folder_watcher import FolderWatcher
+from mod_validation import ModIssue
+import tracing
+from reconcile import ReconcileResult
 
 
 class ModControllerGUI(QMainWindow):
 
+    # Emitted from the folder watcher thread with is_mods and the folders that changed, handled on the GUI thread
+    folder_changed = QtCore.pyqtSignal(bool, object)
+
     def __init__(self) -> None:
         super(ModControllerGUI, self).__init__()
 
@@ -20,6 +30,17 @@ class ModControllerGUI(QMainWindow):
 
         self.mods_folders_list_widget = None
         self.options_files_list_widget = None
+        self.search_box = None
+        self.folder_watcher = None
+        # Folder -> whether it holds mods folders, the folders watched for changes
+        self.watched_folders: typing.Dict[str, bool] = {}
+        # is_mods -> folders that changed and weren't reconciled yet, kept if a newer change supersedes the job
+        self.changed_folders: typing.Dict[bool, typing.Set[str]] = {True: set(), False: set()}
+        self.cancel_jobs_btn = None
+
+        self.job_runner = get_job_runner()
+        self.job_runner.progress.connect(self.job_progress_handler)
+        self.job_runner.running_changed.connect(self.jobs_running_changed_handler)
 
         self.initUI()
         self.show()
@@ -33,9 +54,15 @@ class ModControllerGUI(QMainWindow):
         self.setWindowTitle(self.title)
         self.setGeometry(self.left, self.top, self.width, self.height)
 
+        # Narrows both lists on every keystroke, searching the in-memory index of names and mods
+        self.search_box = QLineEdit()
+        self.search_box.setPlaceholderText("Search mods folders, options files and the mods in them, e.g. jei@11.x")
+        self.search_box.setClearButtonEnabled(True)
+        self.search_box.textChanged.connect(self.search_text_changed)
+
         # Create mods area
         self.mods_folders_list_widget = MMCListWidget.MMCListWidget("mods_widget")
-        self.mods_folders_list_widget.set_drop_event_func(self.populate_mods_and_options_lists)
+        self.mods_folders_list_widget.set_detail_provider(lambda name: mmc.get_mod_controller().get_mods_or_options_details(name, is_mods=True))
         # Uncomment the line below to add the right click menu to the mods list widget
         # self.mods_folders_list_widget.customContextMenuRequested.connect(self.mods_folders_list_context_menu)
 
@@ -48,7 +75,7 @@ class ModControllerGUI(QMainWindow):
 
         # Create options area
         self.options_files_list_widget = MMCListWidget.MMCListWidget("options_widget")
-        self.options_files_list_widget.set_drop_event_func(self.populate_mods_and_options_lists)
+        self.options_files_list_widget.set_detail_provider(lambda name: mmc.get_mod_controller().get_mods_or_options_details(name, is_mods=False))
         # Uncomment the line below to add the right click menu to the options list widget
         # self.options_files_list_widget.customContextMenuRequested.connect(self.options_files_list_context_menu)
 
@@ -63,9 +90,12 @@ class ModControllerGUI(QMainWindow):
 
         # Create populate_mods_and_options_lists button
         refresh_button = QPushButton("Refresh")
-        refresh_button.pressed.connect(self.populate_mods_and_options_lists)
+        refresh_button.pressed.connect(self.refresh_btn_pressed)
         # TODO make populate_mods_and_options_lists button look nicer
 
+        verify_jars_button = QPushButton("Verify Jars")
+        verify_jars_button.pressed.connect(self.verify_jars_btn_pressed)
+
         # Create selection area
         selection_layout = QHBoxLayout()
         selection_layout.addLayout(mods_layout)
@@ -74,40 +104,125 @@ class ModControllerGUI(QMainWindow):
         # Assemble the layouts together
         central_widget = QWidget()
         central_layout = QVBoxLayout()
+        central_layout.addWidget(self.search_box)
         central_layout.addLayout(selection_layout)
         central_layout.addWidget(refresh_button)
+        central_layout.addWidget(verify_jars_button)
         central_widget.setLayout(central_layout)
         self.setCentralWidget(central_widget)
         self.statusBar().showMessage("", 1)
 
+        # Shown while background jobs are running
+        self.cancel_jobs_btn = QPushButton("Cancel")
+        self.cancel_jobs_btn.pressed.connect(self.job_runner.cancel_cancellable)
+        self.cancel_jobs_btn.hide()
+        self.statusBar().addPermanentWidget(self.cancel_jobs_btn)
+
+    @tracing.traced("gui.mods_apply_btn_pressed")
     def mods_apply_btn_pressed(self) -> None:
         """
         Called when the apply button is pressed and attempts to apply the changes to the mods folders
+        The mods folder is checked and linked in background jobs
         :return: None
         """
 
-        if len(self.mods_folders_list_widget.selectedItems()) == 0:
+        selected_mods_folder = self.mods_folders_list_widget.selected_name()
+        if selected_mods_folder is None:
             self.statusBar().showMessage(f"Please select a mods folder first", 5_000)
             return
 
-        selected_mods_folder = self.mods_folders_list_widget.currentItem().text()
-        mod_controller = mmc.ModController()
+        tracing.debug("mods apply button pressed", mods_folder=selected_mods_folder)
 
-        print_debug(f"Mods apply button pressed: {selected_mods_folder}")
+        self.job_runner.submit(f"Checking {selected_mods_folder}",
+                               lambda job: mmc.get_mod_controller().validate_mods_folder(selected_mods_folder),
+                               on_done=lambda issues: self.mods_folder_checked(selected_mods_folder, issues),
+                               on_error=self.job_failed, supersede_key="apply mods", cancellable=True)
 
-        try:
-            if mod_controller.transfer_mods_or_options(selected_mods_folder, is_mods=True):
-                self.statusBar().showMessage(f"Loaded mods: {selected_mods_folder}", 5_000)
-                print_debug(f"Loaded mods: {selected_mods_folder}")
-            else:
-                self.statusBar().showMessage(f"You must enable user creation of symbolic links", 5_000)
-                print_debug("You must enable user creation of symbolic links")
-        except NotADirectoryError:
-            print_debug(f"{selected_mods_folder} no longer exists")
-            self.statusBar().showMessage(f"{selected_mods_folder} no longer exists", 5_000)
-            self.populate_mods_and_options_lists()
+    def mods_folder_checked(self, mods_folder: str, issues: typing.List[ModIssue]) -> None:
+        """
+        Called once a mods folder was checked, links it unless the user backs out because of its problems
+        :param mods_folder: The mods folder to be applied
+        :param issues: The problems found in the mods folder
+        :return: None
+        """
+
+        if not self.confirm_mods_folder_issues(mods_folder, issues):
             return
 
+        self.apply_mods_or_options(mods_folder, is_mods=True)
+
+    @tracing.traced("gui.apply_mods_or_options")
+    def apply_mods_or_options(self, name: str, *, is_mods: bool) -> None:
+        """
+        Links a mods folder/options file in a background job
+        :param name: The mods folder/options file to be applied
+        :param is_mods: True: applies a mods folder, False: applies an options file
+        :return: None
+        """
+
+        def apply(job):
+            job.check_cancelled()
+            return mmc.get_mod_controller().transfer_mods_or_options(name, is_mods=is_mods)
+
+        self.job_runner.submit(f"Applying {name}", apply,
+                               on_done=lambda succeeded: self.mods_or_options_applied(name, succeeded, is_mods=is_mods),
+                               on_error=lambda error: self.apply_failed(name, error),
+                               supersede_key="apply mods" if is_mods else "apply options")
+
+    @tracing.traced("gui.mods_or_options_applied")
+    def mods_or_options_applied(self, name: str, succeeded: bool, *, is_mods: bool) -> None:
+        """
+        Called once a mods folder/options file was linked
+        :param name: The mods folder/options file that was applied
+        :param succeeded: Whether or not it could be linked
+        :param is_mods: True: a mods folder was applied, False: an options file was applied
+        :return: None
+        """
+
+        if not succeeded:
+            self.statusBar().showMessage(f"You must enable user creation of symbolic links, or set the apply mode to auto", 5_000)
+            return
+
+        kind = "mods" if is_mods else "options"
+        self.statusBar().showMessage(f"Loaded {kind}: {name}", 5_000)
+        tracing.info("applied", kind=kind, name=name)
+        list_widget = self.mods_folders_list_widget if is_mods else self.options_files_list_widget
+        list_widget.list_model.invalidate_details([name])
+
+    def apply_failed(self, name: str, error: Exception) -> None:
+        """
+        Called if linking a mods folder/options file raised
+        :param name: The mods folder/options file that was being applied
+        :param error: What was raised
+        :return: None
+        """
+
+        if isinstance(error, (NotADirectoryError, FileNotFoundError)):
+            tracing.info("no longer exists", name=name)
+            self.statusBar().showMessage(f"{name} no longer exists", 5_000)
+            self.populate_mods_and_options_lists()
+        else:
+            self.job_failed(error)
+
+    def confirm_mods_folder_issues(self, mods_folder: str, issues: typing.List[ModIssue]) -> bool:
+        """
+        Asks whether to apply a mods folder anyway if it has problems
+        :param mods_folder: The mods folder to be applied
+        :param issues: The problems found in the mods folder
+        :return: Whether or not the mods folder should be applied
+        """
+
+        if len(issues) == 0:
+            return True
+
+        shown_issues = "\n".join(issue.message for issue in issues[:10])
+        if len(issues) > 10:
+            shown_issues += f"\n...and {len(issues) - 10} more"
+        answer = QMessageBox.question(self, "Mods folder problems",
+                                      f"{mods_folder} has {len(issues)} problems that may crash the game:\n\n{shown_issues}\n\nApply anyway?",
+                                      QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+        return answer == QMessageBox.Yes
+
     def mods_folders_list_context_menu(self, position: PyQt5.QtCore.QPoint) -> None:
         """
         Create context menu for the mods folders list
@@ -131,41 +246,30 @@ class ModControllerGUI(QMainWindow):
 
         # TODO Rename Mods folder here
 
-        selected_mods_folder = self.mods_folders_list_widget.currentItem().text()
-        mod_controller = mmc.ModController()
+        selected_mods_folder = self.mods_folders_list_widget.selected_name()
+        mod_controller = mmc.get_mod_controller()
         mod_controller.rename_mods_or_options(selected_mods_folder, "test", is_mods=True)
-        print_debug(selected_mods_folder)
+        tracing.debug("renamed mods folder", mods_folder=selected_mods_folder)
 
     def mods_folders_list_clicked(self):
-        print_debug("mods list clicked")
+        tracing.debug("mods list clicked")
 
+    @tracing.traced("gui.options_apply_btn_pressed")
     def options_apply_btn_pressed(self) -> None:
         """
         Called when the options apply button is pressed and attempts to apply the changes to the options file
+        The options file is linked in a background job
         :return: None
         """
 
-        if len(self.options_files_list_widget.selectedItems()) == 0:
+        selected_options_file = self.options_files_list_widget.selected_name()
+        if selected_options_file is None:
             self.statusBar().showMessage(f"Please select an options file first", 5_000)
             return
 
-        selected_options_file = self.options_files_list_widget.currentItem().text()
-        mod_controller = mmc.ModController()
+        tracing.debug("options apply button pressed", options_file=selected_options_file)
 
-        print_debug(f"Options apply button pressed: {selected_options_file}")
-
-        try:
-            if mod_controller.transfer_mods_or_options(selected_options_file, is_mods=False):
-                self.statusBar().showMessage(f"Loaded options: {selected_options_file}", 5_000)
-                print_debug(f"Loaded options: {selected_options_file}")
-            else:
-                self.statusBar().showMessage(f"You must enable user creation of symbolic links", 5_000)
-                print_debug("You must enable user creation of symbolic links")
-        except FileNotFoundError:
-            print_debug(f"{selected_options_file} no longer exists")
-            self.statusBar().showMessage(f"{selected_options_file} no longer exists", 5_000)
-            self.populate_mods_and_options_lists()
-            return
+        self.apply_mods_or_options(selected_options_file, is_mods=False)
 
     def options_files_list_context_menu(self, position: PyQt5.QtCore.QPoint) -> None:
         """
@@ -190,25 +294,242 @@ class ModControllerGUI(QMainWindow):
 
         # TODO Rename Options file here
 
-        selected_options_file = self.options_files_list_widget.currentItem().text()
-        mod_controller = mmc.ModController()
+        selected_options_file = self.options_files_list_widget.selected_name()
+        mod_controller = mmc.get_mod_controller()
         mod_controller.rename_mods_or_options(selected_options_file, "test", is_mods=False)
-        print_debug(selected_options_file)
+        tracing.debug("renamed options file", options_file=selected_options_file)
+
+    @tracing.traced("gui.refresh_btn_pressed")
+    def refresh_btn_pressed(self) -> None:
+        """
+        Called when the refresh button is pressed, rescans the mods/options folders and repopulates the lists
+        :return: None
+        """
+
+        self.populate_mods_and_options_lists(refresh=True)
+
+    @tracing.traced("gui.verify_jars_btn_pressed")
+    def verify_jars_btn_pressed(self) -> None:
+        """
+        Called when the verify jars button is pressed, checks the jars of every mods folder in a background job
+        :return: None
+        """
+
+        self.job_runner.submit("Verifying jars", lambda job: mmc.get_mod_controller().verify_all_mods_folders(progress=job.report_progress),
+                               on_done=self.jars_verified, on_error=self.job_failed, supersede_key="verify jars", cancellable=True)
+
+    @tracing.traced("gui.jars_verified")
+    def jars_verified(self, issues: typing.Dict[str, typing.List[ModIssue]]) -> None:
+        """
+        Shows the corrupt jars found in the mods folders
+        :param issues: Mods folder -> its corrupt jars
+        :return: None
+        """
+
+        broken = {mods_folder: folder_issues for mods_folder, folder_issues in issues.items() if folder_issues}
+        if not broken:
+            self.statusBar().showMessage(f"All jars in {len(issues)} mods folders are fine", 5_000)
+            return
 
-    def populate_mods_and_options_lists(self):
-        mod_controller = mmc.ModController()
+        lines = [f"{mods_folder}: {issue.mod_id}" for mods_folder, folder_issues in broken.items() for issue in folder_issues]
+        shown_lines = "\n".join(lines[:20])
+        if len(lines) > 20:
+            shown_lines += f"\n...and {len(lines) - 20} more"
+        QMessageBox.warning(self, "Corrupt jars",
+                            f"{len(lines)} jars in {len(broken)} mods folders are corrupt or incomplete, re-download them:\n\n{shown_lines}")
 
-        self.mods_folders_list_widget.clear()
-        resolved_mods_list = mod_controller.resolve_mods_or_options_list(is_mods=True)
-        self.mods_folders_list_widget.addItems(resolved_mods_list)
+    @tracing.traced("gui.populate_mods_and_options_lists")
+    def populate_mods_and_options_lists(self, refresh: bool = False) -> None:
+        """
+        Resolves both lists in a background job and shows them once done, a newer call drops the result of an older one
+        :param refresh: Whether to rescan the mods/options folders first
+        :return: None
+        """
+
+        def resolve(job):
+            mod_controller = mmc.get_mod_controller()
+            if refresh:
+                mod_controller.refresh()
+            job.report_progress(0, 2)
+            resolved_mods_list = mod_controller.resolve_mods_or_options_list(is_mods=True)
+            job.report_progress(1, 2)
+            resolved_options_list = mod_controller.resolve_mods_or_options_list(is_mods=False)
+            job.report_progress(2, 2)
+            return resolved_mods_list, resolved_options_list, mod_controller.get_watched_folders()
+
+        self.job_runner.submit("Updating lists", resolve, on_done=lambda resolved_lists: self.lists_resolved(resolved_lists, refreshed=refresh),
+                               on_error=self.job_failed, supersede_key="populate lists")
+
+    @tracing.traced("gui.lists_resolved")
+    def lists_resolved(self, resolved_lists: typing.Tuple[typing.List[str], typing.List[str], typing.Dict[str, bool]],
+                       refreshed: bool = False) -> None:
+        """
+        Shows the resolved lists
+        :param resolved_lists: The resolved mods folders and options files, and the folders to watch for changes
+        :param refreshed: Whether the mods/options folders were rescanned, so the search index is brought up to date
+        :return: None
+        """
 
-        self.options_files_list_widget.clear()
-        resolved_options_list = mod_controller.resolve_mods_or_options_list(is_mods=False)
-        self.options_files_list_widget.addItems(resolved_options_list)
+        resolved_mods_list, resolved_options_list, watched_folders = resolved_lists
+        self.mods_folders_list_widget.set_items(resolved_mods_list)
+        self.options_files_list_widget.set_items(resolved_options_list)
         self.statusBar().showMessage("Updated lists", 5_000)
 
+        # Afterwards the folder watcher keeps the search index up to date
+        if refreshed or self.folder_watcher is None:
+            self.build_search_index()
+        else:
+            self.search_text_changed(self.search_box.text())
+
+        self.watch_folders(watched_folders)
+
+    def build_search_index(self) -> None:
+        """
+        Indexes the mods folders, options files and the mods in the mods folders in a background job
+        Only what changed since the last build is indexed again
+        :return: None
+        """
+
+        def build(job):
+            mod_controller = mmc.get_mod_controller()
+            mod_controller.build_search_index(is_mods=False)
+            mod_controller.build_search_index(is_mods=True, progress=job.report_progress)
+
+        def built(result):
+            # The details only show the loaders of jars that were indexed, which now includes every jar
+            self.mods_folders_list_widget.list_model.invalidate_details()
+            self.search_text_changed(self.search_box.text())
+
+        self.job_runner.submit("Indexing mods", build, on_done=built, on_error=self.job_failed, supersede_key="search index",
+                               cancellable=True)
+
+    @tracing.traced("gui.search_text_changed")
+    def search_text_changed(self, text: str) -> None:
+        """
+        Shows only the mods folders/options files matching the search
+        :param text: The search, every row is shown if it is empty
+        :return: None
+        """
+
+        mod_controller = mmc.get_mod_controller()
+        mods_matches = mod_controller.search_mods_or_options(text, is_mods=True)
+        options_matches = mod_controller.search_mods_or_options(text, is_mods=False)
+        self.mods_folders_list_widget.set_filter(mods_matches)
+        self.options_files_list_widget.set_filter(options_matches)
+        if mods_matches is not None:
+            self.statusBar().showMessage(f"{len(mods_matches)} mods folders and {len(options_matches)} options files match", 5_000)
+
+    def watch_folders(self, watched_folders: typing.Dict[str, bool]) -> None:
+        """
+        Watches the mods folders/options files folders, and the folders nested in them, and updates the lists when they
+        change. Called again whenever the folders were listed, so nested folders that were added are watched too
+        :param watched_folders: Folder -> whether it holds mods folders, see ModController.get_watched_folders
+        :return: None
+        """
+
+        self.watched_folders = watched_folders
+        folders = {folder: folder for folder in watched_folders}
+        if self.folder_watcher is not None:
+            self.folder_watcher.set_folders(folders)
+            return
+
+        self.folder_changed.connect(self.folder_changed_handler)
+        self.folder_watcher = FolderWatcher(folders, self.folders_changed)
+        self.folder_watcher.start()
+        mmc.get_mod_controller().set_folders_watched(True)
+
+    def folders_changed(self, changed: typing.Set[str]) -> None:
+        """
+        Called from the folder watcher thread with the folders that changed
+        :param changed: The folders
+        :return: None
+        """
+
+        watched_folders = self.watched_folders
+        for is_mods in (True, False):
+            folders = [folder for folder in changed if watched_folders.get(folder) == is_mods]
+            if folders:
+                self.folder_changed.emit(is_mods, folders)
+
+    @tracing.traced("gui.folder_changed_handler")
+    def folder_changed_handler(self, is_mods: bool, folders: typing.List[str]) -> None:
+        """
+        Applies the items added to or removed from the mods folders/options files folder to its list
+        :param is_mods: True: the mods folders folder changed, False: the options files folder changed
+        :param folders: The folders that changed, nested ones and the mods folders themselves included
+        :return: None
+        """
+
+        self.changed_folders[is_mods].update(folders)
+        folders = set(self.changed_folders[is_mods])
+
+        def reconcile(job):
+            mod_controller = mmc.get_mod_controller()
+            result, changed_mods_folders = mod_controller.apply_folder_changes(folders, is_mods=is_mods)
+            return result, changed_mods_folders, mod_controller.get_watched_folders()
+
+        def reconciled(reconciled_folders):
+            result, changed_mods_folders, watched_folders = reconciled_folders
+            self.changed_folders[is_mods] -= folders
+            self.watch_folders(watched_folders)
+            if changed_mods_folders:
+                self.mods_folders_list_widget.list_model.invalidate_details(changed_mods_folders)
+            self.folder_reconciled(result, is_mods=is_mods)
+
+        self.job_runner.submit("Updating list", reconcile, on_done=reconciled, on_error=self.job_failed,
+                               supersede_key=f"reconcile {is_mods}")
+
+    @tracing.traced("gui.folder_reconciled")
+    def folder_reconciled(self, result: ReconcileResult, *, is_mods: bool) -> None:
+        """
+        Applies a reconciled folder's changes to its list
+        :param result: The reconciled mods folders/options files
+        :param is_mods: True: the mods folders were reconciled, False: the options files were reconciled
+        :return: None
+        """
+
+        if result.changed:
+            list_widget = self.mods_folders_list_widget if is_mods else self.options_files_list_widget
+            list_widget.apply_diff(result)
+            self.statusBar().showMessage(f"{len(result.added)} added, {len(result.removed)} removed", 5_000)
+            if self.search_box.text():
+                # The new items are only shown if they match the search
+                list_widget.set_filter(mmc.get_mod_controller().search_mods_or_options(self.search_box.text(), is_mods=is_mods))
+
+    def job_progress_handler(self, name: str, done: int, total: int) -> None:
+        self.statusBar().showMessage(f"{name}: {done}/{total}", 5_000)
+
+    def jobs_running_changed_handler(self, running: int) -> None:
+        if self.cancel_jobs_btn is not None:
+            self.cancel_jobs_btn.setVisible(self.job_runner.has_cancellable())
+
+    def job_failed(self, error: Exception) -> None:
+        """
+        Shows why a background job failed
+        :param error: What the job raised
+        :return: None
+        """
+
+        self.statusBar().showMessage(f"{type(error).__name__}: {error}", 10_000)
+
+    def closeEvent(self, e) -> None:
+        if self.folder_watcher is not None:
+            self.folder_watcher.stop()
+            mmc.get_mod_controller().set_folders_watched(False)
+        # Long running jobs like indexing are stopped, queued ones like storing a new order finish before the state is flushed
+        self.job_runner.cancel_cancellable()
+        self.job_runner.wait()
+        self.mods_folders_list_widget.list_model.cancel_details()
+        self.options_files_list_widget.list_model.cancel_details()
+        try:
+            mmc.get_mod_controller().state_store.flush()
+        except (OSError, sqlite3.Error) as error:
+            tracing.warning("could not flush state", error=error)
+        super(ModControllerGUI, self).closeEvent(e)
 
 if __name__ == '__main__':
+    # Needed by the process pools when running as a frozen executable
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
     ex = ModControllerGUI()
     sys.exit(app.exec_())
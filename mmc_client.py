@@ -0,0 +1,136 @@
+import argparse
+import json
+import os
+import socket
+import sys
+import typing
+
+
+def default_socket_path() -> str:
+    """
+    The socket the daemon listens on by default, in the data folder next to the other state
+    :return: The path of the socket
+    """
+    return os.environ.get("MMC_SOCKET", os.path.join(os.getcwd(), "data", "mmc.sock"))
+
+
+def send_request(request: typing.Dict[str, typing.Any], socket_path: typing.Optional[str] = None) -> typing.Any:
+    """
+    Sends one request to the daemon and waits for its reply
+    :param request: The request, {"command": ..., plus the command's arguments}
+    :param socket_path: The socket the daemon listens on, defaults to default_socket_path()
+    :return: The result of the command
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(socket_path or default_socket_path())
+        client.sendall(json.dumps(request).encode() + b"\n")
+        with client.makefile("rb") as reply_file:
+            line = reply_file.readline()
+
+    if not line:
+        raise RuntimeError("the daemon closed the connection without replying, see its log")
+    try:
+        reply = json.loads(line)
+    except json.decoder.JSONDecodeError as e:
+        raise RuntimeError(f"the daemon sent an invalid reply: {e}") from e
+    if not reply["ok"]:
+        raise RuntimeError(reply["error"])
+    return reply["result"]
+
+
+def build_request(args: argparse.Namespace) -> typing.Dict[str, typing.Any]:
+    request = {"command": args.command}
+    if args.command == "list":
+        request["is_mods"] = not args.options
+    elif args.command == "resolve":
+        request.update(is_mods=not args.options, everywhere=args.everywhere)
+    elif args.command == "reorder":
+        request["is_mods"] = not args.options
+        request["order"] = args.order
+    elif args.command == "apply":
+        if args.profile is None and args.mods is None and args.options_file is None:
+            raise SystemExit("apply needs --profile, --mods and/or --options")
+        request.update(profile=args.profile, mods=args.mods, options=args.options_file, everywhere=args.everywhere,
+                       verify=args.verify)
+    elif args.command == "search":
+        request.update(query=" ".join(args.query), is_mods=not args.options)
+    elif args.command in ("validate", "verify"):
+        request["mods"] = args.mods_folder
+    elif args.command in ("export", "import"):
+        # The daemon may run in another folder
+        request.update(archive=os.path.abspath(args.archive), profile=args.profile, mods=args.mods, options=args.options_file)
+    elif args.command == "apply-mode":
+        request["mode"] = args.mode
+    elif args.command == "discovery":
+        request.update(max_depth=args.max_depth, ignore=args.ignore)
+    elif args.command == "merge-options":
+        # "name:keybinds,video" takes those categories from name, a plain "name" takes all of its options
+        request["name"] = args.name
+        request["parts"] = [(take.rpartition(":")[0], take.rpartition(":")[2].split(",")) if ":" in take else (take, None)
+                            for take in args.take]
+    return request
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Talks to a running mmc_daemon")
+    parser.add_argument("--socket", help="socket the daemon listens on")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("status", help="show what the mods folder and options file link to")
+    commands.add_parser("refresh", help="rescan the mods/options folders")
+    commands.add_parser("instances", help="list the .minecraft folders the daemon manages")
+    commands.add_parser("metrics", help="show the daemon's latency histograms, slowest total time first")
+    for command in ("list", "resolve"):
+        command_parser = commands.add_parser(command, help=f"{command} the mods folders (or options files with --options)")
+        command_parser.add_argument("--options", action="store_true", help="options files instead of mods folders")
+        if command == "resolve":
+            command_parser.add_argument("--everywhere", action="store_true", help="in every .minecraft folder")
+    reorder_parser = commands.add_parser("reorder", help="store a new order for the mods folders/options files")
+    reorder_parser.add_argument("--options", action="store_true", help="options files instead of mods folders")
+    reorder_parser.add_argument("order", nargs="*")
+    apply_parser = commands.add_parser("apply", help="link a mods folder, options file, or both")
+    apply_parser.add_argument("--profile", help="named profile to apply")
+    apply_parser.add_argument("--mods", help="mods folder to apply")
+    apply_parser.add_argument("--options", dest="options_file", help="options file to apply")
+    apply_parser.add_argument("--everywhere", action="store_true", help="in every .minecraft folder, in parallel")
+    apply_parser.add_argument("--verify", action="store_true", help="refuse to link a mods folder with corrupt jars")
+    validate_parser = commands.add_parser("validate", help="check a mods folder for conflicts and missing dependencies")
+    validate_parser.add_argument("mods_folder")
+    search_parser = commands.add_parser("search", help="find mods folders (or options files with --options) by name or by the mods in them")
+    search_parser.add_argument("--options", action="store_true", help="options files instead of mods folders")
+    search_parser.add_argument("query", nargs="+", help="e.g. skyblock, or jei@11.x for the mods folders with JEI 11")
+    verify_parser = commands.add_parser("verify", help="check the jars of a mods folder, or of every mods folder, for corruption")
+    verify_parser.add_argument("mods_folder", nargs="?")
+    merge_parser = commands.add_parser("merge-options", help="store a new options file made from parts of others")
+    merge_parser.add_argument("name", help="name of the new options file")
+    merge_parser.add_argument("--take", action="append", required=True, metavar="OPTIONS_FILE[:CATEGORY,...]",
+                              help="options to take, e.g. --take pvp:keybinds --take \"low end:video\", later ones win")
+    commands.add_parser("compact-options", help="store the options files as their differences from a shared base")
+    for command, help_text in (("export", "write a profile, or a mods folder and options file, to an archive"),
+                               ("import", "create the mods folder and options file of an archive, reusing jars already here")):
+        archive_parser = commands.add_parser(command, help=help_text)
+        archive_parser.add_argument("archive")
+        archive_parser.add_argument("--profile", help="profile to export" if command == "export" else "name to save the profile under")
+        archive_parser.add_argument("--mods", help="mods folder to export" if command == "export" else "name of the new mods folder")
+        archive_parser.add_argument("--options", dest="options_file",
+                                    help="options file to export" if command == "export" else "name of the new options file")
+    apply_mode_parser = commands.add_parser("apply-mode", help="show or change whether mods/options are linked or copied")
+    apply_mode_parser.add_argument("mode", nargs="?", choices=("auto", "symlink", "copy"),
+                                   help="auto links and copies if symlinks can't be made, symlink only links, copy only copies")
+    discovery_parser = commands.add_parser("discovery", help="show or change how deep mods folders/options files are looked for")
+    discovery_parser.add_argument("--max-depth", type=int, help="folders deep to look, 1 only looks at the top level")
+    discovery_parser.add_argument("--ignore", nargs="*", metavar="PATTERN", help="names to skip, as shell wildcards")
+
+    args = parser.parse_args()
+    try:
+        result = send_request(build_request(args), args.socket)
+    except (OSError, RuntimeError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
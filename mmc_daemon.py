@@ -0,0 +1,291 @@
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import os
+import signal
+import socket
+import typing
+import minecraft_mod_controller as mmc
+from minecraft_instances import InstanceRegistry, get_instance_registry
+from atomic_link import read_link_target
+from folder_watcher import FolderWatcher
+from mods_sync import synced_source
+from mmc_client import default_socket_path
+import tracing
+
+
+class ModControllerDaemon:
+    """
+    Serves a warm ModController over a local Unix socket
+    Every request is a line of json, {"command": ..., plus the command's arguments}, answered with a line of json,
+    {"ok": true, "result": ...} or {"ok": false, "error": ...}. Requests are run one at a time, in the order received.
+    """
+
+    def __init__(self, mod_controller: mmc.ModController, socket_path: str, instance_registry: InstanceRegistry) -> None:
+        self.mod_controller = mod_controller
+        self.instance_registry = instance_registry
+        self.socket_path = socket_path
+        # A single worker serializes every request while keeping the event loop free to accept connections
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        # Folder -> whether it holds mods folders, the folders watched to keep the search indexes up to date
+        self.watched_folders: typing.Dict[str, bool] = {}
+        self.folder_watcher: typing.Optional[FolderWatcher] = None
+
+        self.commands: typing.Dict[str, typing.Callable[[dict], typing.Any]] = {
+            "list": lambda request: self.mod_controller.get_mods_or_options(is_mods=request.get("is_mods", True)),
+            "resolve": self.resolve,
+            "reorder": self.reorder,
+            "apply": self.apply,
+            "validate": lambda request: [issue._asdict() for issue in self.mod_controller.validate_mods_folder(request["mods"])],
+            "verify": self.verify,
+            "search": self.search,
+            "refresh": lambda request: self.mod_controller.refresh(),
+            "status": self.status,
+            "instances": lambda request: self.instance_registry.minecraft_dirs,
+            "metrics": lambda request: tracing.latency_summary(),
+            "merge-options": lambda request: self.mod_controller.merge_options_files(request["name"], [tuple(part) for part in request["parts"]]),
+            "compact-options": lambda request: self.mod_controller.compact_options_files(),
+            "discovery": self.discovery,
+            "apply-mode": self.apply_mode,
+            "export": lambda request: self.mod_controller.export_profile(request["archive"], profile=request.get("profile"),
+                                                                         mods_folder=request.get("mods"),
+                                                                         options_file=request.get("options")),
+            "import": self.import_profile,
+        }
+
+    def resolve(self, request: dict) -> typing.Any:
+        if request.get("everywhere"):
+            return {minecraft_dir: result._asdict() for minecraft_dir, result in
+                    self.instance_registry.resolve_all(is_mods=request.get("is_mods", True)).items()}
+        return self.mod_controller.resolve_mods_or_options_list(is_mods=request.get("is_mods", True))
+
+    def reorder(self, request: dict) -> None:
+        self.mod_controller.set_mods_or_options_order(request["order"], is_mods=request.get("is_mods", True))
+
+    def apply(self, request: dict) -> typing.Any:
+        if request.get("everywhere"):
+            results = self.instance_registry.apply_everywhere(profile=request.get("profile"), mods=request.get("mods"),
+                                                              options=request.get("options"))
+            return {minecraft_dir: result._asdict() for minecraft_dir, result in results.items()}
+        verify = bool(request.get("verify"))
+        if request.get("profile"):
+            return self.mod_controller.apply_profile(request["profile"], verify=verify)
+        if request.get("mods") and request.get("options"):
+            return self.mod_controller.apply_mods_and_options(request["mods"], request["options"], verify=verify)
+        if request.get("mods"):
+            return self.mod_controller.transfer_mods_or_options(request["mods"], is_mods=True, verify=verify)
+        if request.get("options"):
+            return self.mod_controller.transfer_mods_or_options(request["options"], is_mods=False)
+        raise ValueError("apply needs a profile, mods and/or options")
+
+    def search(self, request: dict) -> typing.List[str]:
+        is_mods = request.get("is_mods", True)
+        # Built on startup and kept up to date by the folder watcher, see start_watching
+        matches = self.mod_controller.search_mods_or_options(request["query"], is_mods=is_mods)
+        resolved = self.mod_controller.resolve_mods_or_options_list(is_mods=is_mods)
+        return resolved if matches is None else [name for name in resolved if name in matches]
+
+    def verify(self, request: dict) -> typing.Any:
+        if request.get("mods"):
+            return [issue._asdict() for issue in self.mod_controller.verify_mods_folder(request["mods"])]
+        return {mods_folder: [issue._asdict() for issue in issues]
+                for mods_folder, issues in self.mod_controller.verify_all_mods_folders().items() if issues}
+
+    def discovery(self, request: dict) -> dict:
+        if request.get("max_depth") is not None or request.get("ignore") is not None:
+            settings = self.mod_controller.get_discovery_settings()
+            max_depth = settings["max_depth"] if request.get("max_depth") is None else request["max_depth"]
+            ignore = settings["ignore"] if request.get("ignore") is None else request["ignore"]
+            self.mod_controller.set_discovery_settings(max_depth, ignore)
+            # The other .minecraft folders pick the stored settings up when refreshed
+            self.instance_registry.refresh_all()
+        return self.mod_controller.get_discovery_settings()
+
+    def apply_mode(self, request: dict) -> str:
+        if request.get("mode") is not None:
+            self.mod_controller.set_apply_mode(request["mode"])
+        return self.mod_controller.get_apply_mode()
+
+    def import_profile(self, request: dict) -> dict:
+        result = self.mod_controller.import_profile(request["archive"], profile=request.get("profile"),
+                                                    mods_folder=request.get("mods"), options_file=request.get("options"))
+        return {"manifest": result.manifest, "jars_reused": result.jars_reused, "jars_written": result.jars_written}
+
+    def status(self, request: dict) -> dict:
+        def linked_name(link: str, *folders: str) -> typing.Optional[str]:
+            # A mods folder synced in copy mode isn't a link, its manifest names the folder it holds
+            target = read_link_target(link) or synced_source(link)
+            if target is None:
+                return None
+            for folder in folders:
+                if target.startswith(os.path.join(folder, "")):
+                    return os.path.relpath(target, folder).replace(os.sep, "/")
+            return target
+
+        return {
+            "minecraft_dir": self.mod_controller.MINECRAFT_DIR,
+            "mods": linked_name(self.mod_controller.MODS_DIR, self.mod_controller.MODS_FOLDERS_DIR),
+            "options": linked_name(self.mod_controller.OPTIONS_FILE, self.mod_controller.OPTIONS_FOLDER_DIR,
+                                   self.mod_controller.options_profiles.materialized_dir),
+        }
+
+    def run_in_worker(self, function: typing.Callable[[], None]) -> None:
+        """
+        Runs background work on the worker thread, in order with the requests, logging instead of losing its errors
+        :param function: The work to be run
+        :return: None
+        """
+
+        def run() -> None:
+            try:
+                function()
+            except Exception as e:
+                tracing.error("daemon background work failed", error=f"{type(e).__name__}: {e}")
+
+        self.executor.submit(run)
+
+    def start_watching(self) -> None:
+        """
+        Watches the mods/options folders, then builds the search indexes once, the watcher keeps them up to date after
+        Runs on the worker thread
+        :return: None
+        """
+        self.watched_folders = self.mod_controller.get_watched_folders()
+        self.folder_watcher = FolderWatcher({folder: folder for folder in self.watched_folders}, self.folders_changed)
+        # Started first, so whatever changes while the indexes are built is applied right after
+        self.folder_watcher.start()
+        self.mod_controller.set_folders_watched(True)
+        for is_mods in (True, False):
+            self.mod_controller.build_search_index(is_mods=is_mods)
+
+    def folders_changed(self, changed: typing.Set[str]) -> None:
+        """
+        Called from the folder watcher thread with the folders that changed
+        :param changed: The folders
+        :return: None
+        """
+        self.run_in_worker(lambda: self.apply_folder_changes(changed))
+
+    def apply_folder_changes(self, changed: typing.Set[str]) -> None:
+        watched_folders = self.watched_folders
+        for is_mods in (True, False):
+            folders = [folder for folder in changed if watched_folders.get(folder) == is_mods]
+            if folders:
+                self.mod_controller.apply_folder_changes(folders, is_mods=is_mods)
+        # Folders that were added are watched too
+        self.watched_folders = self.mod_controller.get_watched_folders()
+        self.folder_watcher.set_folders({folder: folder for folder in self.watched_folders})
+
+    def handle(self, request: typing.Any) -> dict:
+        """
+        Runs one request on the worker thread
+        :param request: The decoded request
+        :return: The reply
+        """
+        if not isinstance(request, dict):
+            return {"ok": False, "error": f"expected a json object, got {type(request).__name__}"}
+        name = request.get("command")
+        command = self.commands.get(name) if isinstance(name, str) else None
+        if command is None:
+            return {"ok": False, "error": f"unknown command {name!r}, expected one of {sorted(self.commands)}"}
+        try:
+            with tracing.span(f"daemon.{name}"):
+                result = command(request)
+            # Checked here so a result that can't be sent is answered like any other failure
+            json.dumps(result)
+            return {"ok": True, "result": result}
+        except Exception as e:
+            # Whatever a command raises is answered, so neither the connection nor the daemon goes down with it
+            tracing.error("daemon command failed", command=name, error=f"{type(e).__name__}: {e}")
+            return {"ok": False, "error": f"{type(e).__name__}: {e}"}
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                except (json.decoder.JSONDecodeError, UnicodeDecodeError) as e:
+                    reply = {"ok": False, "error": f"invalid json: {e}"}
+                else:
+                    tracing.debug("daemon request", command=request.get("command") if isinstance(request, dict) else None)
+                    reply = await loop.run_in_executor(self.executor, self.handle, request)
+                writer.write(json.dumps(reply).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def remove_stale_socket(self) -> None:
+        """
+        Removes the socket left behind by a daemon that exited without cleaning up
+        Raises if another daemon is still listening on it
+        :return: None
+        """
+        if not os.path.exists(self.socket_path):
+            return
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            try:
+                probe.connect(self.socket_path)
+            except OSError:
+                os.unlink(self.socket_path)
+                return
+        raise RuntimeError(f"A daemon is already listening on {self.socket_path}")
+
+    async def serve(self) -> None:
+        """
+        Listens until cancelled
+        :return: None
+        """
+        self.remove_stale_socket()
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+        # Bound under a umask instead of chmod'ed afterwards, so other users can never connect, the API can apply and
+        # delete profiles
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        old_umask = os.umask(0o177)
+        try:
+            listener.bind(self.socket_path)
+        except OSError:
+            listener.close()
+            raise
+        finally:
+            os.umask(old_umask)
+        server = await asyncio.start_unix_server(self.handle_connection, sock=listener)
+        tracing.info("daemon listening", socket_path=self.socket_path)
+        self.run_in_worker(self.start_watching)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+            # Stopped before the worker, so no more changes are handed to it
+            if self.folder_watcher is not None:
+                self.folder_watcher.stop()
+                self.mod_controller.set_folders_watched(False)
+            self.executor.shutdown()
+            self.instance_registry.shutdown()
+            self.mod_controller.state_store.flush()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Keeps a ModController running and serves it over a local socket")
+    parser.add_argument("--socket", default=None, help="socket to listen on")
+    args = parser.parse_args()
+
+    # For the metrics command
+    tracing.collect_stats()
+    daemon = ModControllerDaemon(mmc.get_mod_controller(), args.socket or default_socket_path(), get_instance_registry())
+    try:
+        asyncio.run(daemon.serve())
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+import functools
+import json
+import os
+import re
+import typing
+import zipfile
+import zlib
+from stat_keyed_index import StatKeyedIndex, compute_in_pool
+import tracing
+
+FABRIC_METADATA = "fabric.mod.json"
+FORGE_METADATA = "META-INF/mods.toml"
+LEGACY_FORGE_METADATA = "mcmod.info"
+MANIFEST = "META-INF/MANIFEST.MF"
+
+# Below this many changed jars the process pool costs more to start than it saves
+MIN_JARS_FOR_POOL = 8
+
+
+class ModMetadata(typing.NamedTuple):
+    """
+    What a jar says about one of the mods inside it
+    """
+    mod_id: str
+    version: str
+    loader: str
+    minecraft_version: typing.Optional[str]
+    # mod id -> required version range, in the loader's own syntax ("*" if any version will do)
+    dependencies: typing.Dict[str, str]
+    # The jar's path relative to its mods folder, with "/" separators, e.g. "1.20/jei.jar"
+    jar: str
+
+
+def _parse_toml_value(value: str) -> typing.Any:
+    value = value.strip()
+    if value[:1] in ("'", '"'):
+        quote = value[0]
+        end = value.find(quote, 1)
+        return value[1:end] if end != -1 else value[1:]
+    value = value.split("#", 1)[0].strip()
+    if value in ("true", "false"):
+        return value == "true"
+    return value
+
+
+def parse_mods_toml(text: str) -> typing.Tuple[typing.List[dict], typing.Dict[str, typing.List[dict]], dict]:
+    """
+    Reads the parts of a Forge mods.toml that describe mods and their dependencies
+    This is not a full TOML parser, it handles the flat key = value tables mods.toml files use.
+    :param text: The contents of the mods.toml file
+    :return: The [[mods]] tables, the [[dependencies.<modid>]] tables by mod id, and the top level keys
+    """
+
+    mods = []
+    dependencies = {}
+    top_level = {}
+    current = top_level
+    in_multiline = False
+
+    for line in text.splitlines():
+        stripped = line.strip()
+        if in_multiline:
+            in_multiline = "'''" not in stripped and '"""' not in stripped
+            continue
+        if not stripped or stripped.startswith("#"):
+            continue
+
+        table = re.match(r"^\[\[\s*([^\]]+?)\s*\]\]", stripped)
+        if table:
+            current = {}
+            name = table.group(1)
+            if name == "mods":
+                mods.append(current)
+            elif name.startswith("dependencies."):
+                dependencies.setdefault(name.split(".", 1)[1].strip('"'), []).append(current)
+            continue
+        if stripped.startswith("["):
+            current = {}
+            continue
+
+        if "=" not in stripped:
+            continue
+        key, value = stripped.split("=", 1)
+        value = value.strip()
+        if value.startswith("'''") or value.startswith('"""'):
+            in_multiline = value.count(value[:3]) == 1
+            continue
+        current[key.strip().strip('"')] = _parse_toml_value(value)
+
+    return mods, dependencies, top_level
+
+
+def _read_manifest_version(jar: zipfile.ZipFile) -> typing.Optional[str]:
+    try:
+        manifest = jar.read(MANIFEST).decode("utf-8", "replace")
+    except KeyError:
+        return None
+    match = re.search(r"^Implementation-Version:\s*(\S+)", manifest, re.MULTILINE)
+    return match.group(1) if match else None
+
+
+def _read_fabric(jar: zipfile.ZipFile, jar_name: str) -> typing.List[ModMetadata]:
+    info = json.loads(jar.read(FABRIC_METADATA).decode("utf-8", "replace"), strict=False)
+    depends = {}
+    for mod_id, version_range in (info.get("depends") or {}).items():
+        depends[mod_id] = " || ".join(version_range) if isinstance(version_range, list) else str(version_range)
+    return [ModMetadata(mod_id=str(info.get("id", "")), version=str(info.get("version", "")), loader="fabric",
+                        minecraft_version=depends.get("minecraft"), dependencies=depends, jar=jar_name)]
+
+
+def _read_forge(jar: zipfile.ZipFile, jar_name: str) -> typing.List[ModMetadata]:
+    mods, dependencies, _top_level = parse_mods_toml(jar.read(FORGE_METADATA).decode("utf-8", "replace"))
+    result = []
+    for mod in mods:
+        mod_id = str(mod.get("modId", ""))
+        version = str(mod.get("version", ""))
+        if "${file.jarVersion}" in version:
+            version = _read_manifest_version(jar) or version
+
+        depends = {}
+        for dependency in dependencies.get(mod_id, []):
+            if dependency.get("mandatory", True) is False or dependency.get("type", "required") != "required":
+                continue
+            depends[str(dependency.get("modId", ""))] = str(dependency.get("versionRange", "*")) or "*"
+        result.append(ModMetadata(mod_id=mod_id, version=version, loader="forge", minecraft_version=depends.get("minecraft"),
+                                  dependencies=depends, jar=jar_name))
+    return result
+
+
+def _read_legacy_forge(jar: zipfile.ZipFile, jar_name: str) -> typing.List[ModMetadata]:
+    info = json.loads(jar.read(LEGACY_FORGE_METADATA).decode("utf-8", "replace"), strict=False)
+    if isinstance(info, dict):
+        info = info.get("modList", [])
+
+    result = []
+    for mod in info:
+        depends = {}
+        for requirement in mod.get("requiredMods", []) or []:
+            # Entries look like "modid" or "modid@[1.0,)"
+            mod_id, _, version_range = str(requirement).partition("@")
+            depends[mod_id] = version_range or "*"
+        result.append(ModMetadata(mod_id=str(mod.get("modid", "")), version=str(mod.get("version", "")), loader="forge",
+                                  minecraft_version=mod.get("mcversion"), dependencies=depends, jar=jar_name))
+    return result
+
+
+def read_jar_metadata(jar_path: str) -> typing.List[ModMetadata]:
+    """
+    Reads the mods in a jar from its metadata entry, opening only the zip central directory and that one entry
+    :param jar_path: The path of the jar
+    :return: The mods described by the jar, empty if it has no metadata or can't be read
+    """
+
+    jar_name = os.path.basename(jar_path)
+    try:
+        with zipfile.ZipFile(jar_path) as jar:
+            names = set(jar.namelist())
+            if FABRIC_METADATA in names:
+                return _read_fabric(jar, jar_name)
+            if FORGE_METADATA in names:
+                return _read_forge(jar, jar_name)
+            if LEGACY_FORGE_METADATA in names:
+                return _read_legacy_forge(jar, jar_name)
+    except (OSError, zipfile.BadZipFile, zlib.error, EOFError, RuntimeError, NotImplementedError, ValueError, AttributeError,
+            TypeError) as e:
+        tracing.warning("could not read jar metadata", jar=jar_path, error=e)
+    return []
+
+
+def _read_jar_mods(jar_path: str) -> typing.List[dict]:
+    # The mods as dicts, as stored in the index, a top level function so process pools can pickle it
+    return [mod._asdict() for mod in read_jar_metadata(jar_path)]
+
+
+def find_jars(folder: str) -> typing.Iterator[os.DirEntry]:
+    """
+    Finds every jar in a mods folder, including the version subfolders Forge also loads from
+    :param folder: The mods folder to be searched
+    :return: The directory entries of the jars
+    """
+    try:
+        entries = list(os.scandir(folder))
+    except OSError:
+        return
+    for entry in entries:
+        if entry.is_dir():
+            yield from find_jars(entry.path)
+        elif entry.name.lower().endswith(".jar") and entry.is_file():
+            yield entry
+
+
+class ModMetadataIndex(StatKeyedIndex):
+    """
+    The mods in every jar of the mods folders, see StatKeyedIndex
+    """
+
+    @tracing.traced("mod_metadata.scan_folders")
+    def scan_folders(self, folders: typing.Dict[str, str], progress: typing.Optional[typing.Callable[[int, int], None]] = None
+                     ) -> typing.Dict[str, typing.List[ModMetadata]]:
+        """
+        Brings the index up to date for the given mods folders, reading only new or changed jars, in parallel
+        :param folders: Mods folder name -> path
+        :param progress: Called with (jars read, jars to read) while reading changed jars
+        :return: Mods folder name -> the mods in that folder
+        """
+
+        read_jars = functools.partial(compute_in_pool, _read_jar_mods, min_for_pool=MIN_JARS_FOR_POOL)
+        result = {}
+        for name, jars in self.update_folders(folders, find_jars, read_jars, progress).items():
+            # find_jars joins every path onto the folder, so cutting it off gives the path relative to the folder
+            prefix_length = len(os.path.join(folders[name], ""))
+            result[name] = [ModMetadata(**mod)._replace(jar=path[prefix_length:].replace(os.sep, "/"))
+                            for path, mods in jars for mod in mods]
+        return result
+
+    def lookup_folder(self, folder: str) -> typing.Tuple[typing.List[ModMetadata], bool]:
+        """
+        Retrieves the mods in a mods folder from the index only, without reading any jar
+        :param folder: The path of the mods folder
+        :return: The mods of the indexed jars, and whether every jar was indexed and unchanged since
+        """
+        prefix_length = len(os.path.join(folder, ""))
+        mods = []
+        complete = True
+        for jar in find_jars(folder):
+            try:
+                known, jar_mods = self.lookup(jar.path, jar.stat())
+            except OSError:
+                known, jar_mods = False, None
+            if not known:
+                complete = False
+                continue
+            mods.extend(ModMetadata(**mod)._replace(jar=jar.path[prefix_length:].replace(os.sep, "/")) for mod in jar_mods)
+        return mods, complete
+
+    def scan_folder(self, folder: str) -> typing.List[ModMetadata]:
+        """
+        Brings the index up to date for one mods folder
+        :param folder: The path of the mods folder
+        :return: The mods in that folder
+        """
+        return self.scan_folders({folder: folder})[folder]
@@ -0,0 +1,242 @@
+import re
+import typing
+from mod_metadata import ModMetadata
+import tracing
+
+# Provided by the game/loader rather than by a jar in the mods folder, so they can't be checked here
+PROVIDED_BY_LAUNCHER = {"minecraft", "java", "forge", "fml", "javafml", "mcp", "neoforge", "fabricloader", "fabric-loader", "quilt_loader"}
+
+
+class ModIssue(typing.NamedTuple):
+    """
+    A problem found between the mods in a mods folder
+    kind: "duplicate", "missing_dependency", "version_mismatch" or "corrupt_jar"
+    mod_id: The mod with the problem
+    message: Readable description of the problem
+    """
+    kind: str
+    mod_id: str
+    message: str
+
+
+# Rank of pre-release labels, anything unknown sorts after these but still before the release
+PRE_RELEASE_RANKS = {"alpha": 0, "a": 0, "beta": 1, "b": 1, "pre": 2, "rc": 3, "cr": 3, "snapshot": 4}
+
+
+def parse_version(version: str) -> typing.Optional[typing.List[tuple]]:
+    """
+    Splits a version into parts that compare the way versions do, e.g. 1.10 > 1.9, 1.0 == 1.0.0 and 1.0-beta < 1.0
+    Anything before the first number (like "v") is ignored, and so is build metadata after "+"
+    :param version: The version to be parsed
+    :return: The comparable parts, or None if the version has no numbers
+    """
+    version = version.split("+", 1)[0]
+    first_digit = re.search(r"\d", version)
+    if first_digit is None:
+        return None
+
+    parts = []
+    for token in re.findall(r"\d+|[A-Za-z]+", version[first_digit.start():]):
+        if token.isdigit():
+            parts.append((2, int(token), ""))
+        else:
+            parts.append((1, PRE_RELEASE_RANKS.get(token.lower(), len(PRE_RELEASE_RANKS)), token.lower()))
+    return parts
+
+
+def compare_versions(a: str, b: str) -> typing.Optional[int]:
+    """
+    :param a: A version
+    :param b: Another version
+    :return: Negative if a < b, 0 if equal, positive if a > b, None if either can't be parsed
+    """
+    parsed_a = parse_version(a)
+    parsed_b = parse_version(b)
+    if parsed_a is None or parsed_b is None:
+        return None
+
+    # Missing parts count as 0, so they sort after pre-release labels but before any other number
+    length = max(len(parsed_a), len(parsed_b))
+    parsed_a += [(2, 0, "")] * (length - len(parsed_a))
+    parsed_b += [(2, 0, "")] * (length - len(parsed_b))
+    return (parsed_a > parsed_b) - (parsed_a < parsed_b)
+
+
+def _satisfies_maven_range(version: str, version_range: str) -> typing.Optional[bool]:
+    """
+    Checks a version against a Forge/Maven range like "[1.0,2.0)", "[1.0,)", "[1.0]" or "[1.0,2.0),[3.0,)"
+    """
+    if not re.search(r"[\[\]()]", version_range):
+        # A bare version is only a recommendation in Maven ranges
+        return True
+    if not re.fullmatch(r"\s*[\[(][^\[\]()]*[\])](\s*,\s*[\[(][^\[\]()]*[\])])*\s*", version_range):
+        # Malformed, e.g. an unclosed bracket, so whether the version is in it can't be told
+        return None
+
+    ranges = re.findall(r"([\[(])([^\[\]()]*)([\])])", version_range)
+
+    unknown = False
+    for opening, bounds, closing in ranges:
+        low, comma, high = (bound.strip() for bound in bounds.partition(","))
+        if not comma:
+            high = low
+        checks = []
+        if low:
+            cmp = compare_versions(version, low)
+            checks.append(None if cmp is None else cmp > 0 or (cmp == 0 and opening == "["))
+        if high:
+            cmp = compare_versions(version, high)
+            checks.append(None if cmp is None else cmp < 0 or (cmp == 0 and closing == "]"))
+        if all(check is True for check in checks):
+            return True
+        unknown = unknown or (None in checks and False not in checks)
+    return None if unknown else False
+
+
+def _satisfies_semver_predicate(version: str, predicate: str) -> typing.Optional[bool]:
+    """
+    Checks a version against a Fabric predicate like ">=1.2", "~1.2", "^1.2", "1.16.x" or "*"
+    """
+    predicate = predicate.strip()
+    if predicate in ("", "*"):
+        return True
+
+    operator, bound = re.match(r"^(>=|<=|>|<|=|~|\^)?\s*(.*)$", predicate).groups()
+    if bound.endswith((".x", ".X", ".*")) or bound in ("x", "X"):
+        prefix = re.sub(r"\.?[xX*]$", "", bound)
+        parsed = parse_version(version)
+        parsed_prefix = parse_version(prefix) if prefix else []
+        if parsed is None or parsed_prefix is None:
+            return None
+        return parsed[:len(parsed_prefix)] == parsed_prefix
+
+    cmp = compare_versions(version, bound)
+    if cmp is None:
+        return None
+    if operator == ">=":
+        return cmp >= 0
+    if operator == "<=":
+        return cmp <= 0
+    if operator == ">":
+        return cmp > 0
+    if operator == "<":
+        return cmp < 0
+    if operator in ("~", "^"):
+        # ~1.2.3 allows 1.2.x, ^1.2.3 allows 1.x.x
+        significant = 2 if operator == "~" else 1
+        return cmp >= 0 and parse_version(version)[:significant] == parse_version(bound)[:significant]
+    return cmp == 0
+
+
+def version_satisfies(version: str, version_range: str, loader: str) -> typing.Optional[bool]:
+    """
+    Checks a version against a dependency's version range
+    :param version: The version of the mod that is present
+    :param version_range: The range required by the dependent mod
+    :param loader: "forge" for Maven ranges, "fabric" for semver predicates
+    :return: Whether the version is in range, or None if that can't be told
+    """
+    version_range = version_range.strip()
+    if version_range in ("", "*"):
+        return True
+
+    if loader == "forge" or version_range[:1] in ("[", "("):
+        return _satisfies_maven_range(version, version_range)
+
+    unknown = False
+    for alternative in version_range.split("||"):
+        results = [_satisfies_semver_predicate(version, predicate) for predicate in alternative.split()]
+        if all(result is True for result in results):
+            return True
+        unknown = unknown or None in results
+    return None if unknown else False
+
+
+def _mod_key(mod: ModMetadata) -> tuple:
+    # Everything the checks look at, so a jar updated in place with new dependencies is checked again
+    return mod.jar, mod.mod_id, mod.version, mod.loader, mod.minecraft_version, tuple(sorted(mod.dependencies.items()))
+
+
+class ModFolderValidator:
+    """
+    Keeps the dependency graph of one mods folder, and on each check only re-evaluates the mods that changed
+    and the mods that depend on them
+    """
+
+    def __init__(self) -> None:
+        self._mods: typing.Dict[tuple, ModMetadata] = {}
+        # mod id -> the mods in the folder providing it
+        self._providers: typing.Dict[str, typing.List[ModMetadata]] = {}
+        # mod id -> ids of the mods that depend on it
+        self._dependents: typing.Dict[str, typing.Set[str]] = {}
+        self._issues: typing.Dict[str, typing.List[ModIssue]] = {}
+
+    @tracing.traced("mod_validation.check")
+    def check(self, mods: typing.Iterable[ModMetadata]) -> typing.List[ModIssue]:
+        """
+        Updates the graph to the given mods and reports duplicates, missing dependencies and version range violations
+        :param mods: Every mod currently in the mods folder
+        :return: The problems found
+        """
+
+        new_mods = {_mod_key(mod): mod for mod in mods if mod.mod_id}
+        added = [mod for key, mod in new_mods.items() if key not in self._mods]
+        removed = [mod for key, mod in self._mods.items() if key not in new_mods]
+
+        changed_ids = set()
+        for mod in removed:
+            self._providers[mod.mod_id].remove(mod)
+            if not self._providers[mod.mod_id]:
+                del self._providers[mod.mod_id]
+            remaining = self._providers.get(mod.mod_id, [])
+            for dependency in mod.dependencies:
+                if not any(dependency in provider.dependencies for provider in remaining):
+                    self._dependents[dependency].discard(mod.mod_id)
+            changed_ids.add(mod.mod_id)
+        for mod in added:
+            self._providers.setdefault(mod.mod_id, []).append(mod)
+            for dependency in mod.dependencies:
+                self._dependents.setdefault(dependency, set()).add(mod.mod_id)
+            changed_ids.add(mod.mod_id)
+        self._mods = new_mods
+
+        affected = set(changed_ids)
+        for mod_id in changed_ids:
+            affected |= self._dependents.get(mod_id, set())
+
+        for mod_id in affected:
+            issues = self._evaluate(mod_id)
+            if issues:
+                self._issues[mod_id] = issues
+            else:
+                self._issues.pop(mod_id, None)
+
+        return [issue for issues in self._issues.values() for issue in issues]
+
+    def _evaluate(self, mod_id: str) -> typing.List[ModIssue]:
+        """
+        Finds the problems of a single mod id against the rest of the graph
+        :param mod_id: The mod to be checked
+        :return: The problems found
+        """
+
+        providers = self._providers.get(mod_id, [])
+        issues = []
+
+        if len(providers) > 1:
+            found = ", ".join(f"{mod.version} ({mod.jar})" for mod in providers)
+            issues.append(ModIssue("duplicate", mod_id, f"{mod_id} is present more than once: {found}"))
+
+        for mod in providers:
+            for dependency, version_range in mod.dependencies.items():
+                if dependency in PROVIDED_BY_LAUNCHER:
+                    continue
+                dependency_providers = self._providers.get(dependency)
+                if not dependency_providers:
+                    issues.append(ModIssue("missing_dependency", mod_id, f"{mod_id} ({mod.jar}) requires {dependency} {version_range}, which is missing"))
+                    continue
+                if not any(version_satisfies(provider.version, version_range, mod.loader) is not False for provider in dependency_providers):
+                    found = ", ".join(provider.version for provider in dependency_providers)
+                    issues.append(ModIssue("version_mismatch", mod_id, f"{mod_id} ({mod.jar}) requires {dependency} {version_range}, found {found}"))
+
+        return issues
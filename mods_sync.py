@@ -0,0 +1,267 @@
+import errno
+import json
+import os
+import shutil
+import typing
+from atomic_link import atomic_write
+import tracing
+
+# Kept in the synced mods folder, Forge and Fabric only load jars so it is ignored by the game
+MANIFEST_NAME = ".mmc-manifest.json"
+MANIFEST_FORMAT = 1
+
+# copy_file_range errors meaning the kernel or filesystem can't do it, so the data is copied the regular way
+_COPY_FILE_RANGE_UNSUPPORTED = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EPERM}
+
+
+class SyncResult(typing.NamedTuple):
+    """
+    What syncing a mods folder did
+    added: Files that weren't in the synced folder before
+    changed: Files placed again because their source changed
+    removed: Files removed because the source no longer has them
+    unchanged: Files left alone
+    hardlinked: Of the added and changed files, those placed as a hardlink instead of a copy
+    """
+    added: int
+    changed: int
+    removed: int
+    unchanged: int
+    hardlinked: int
+
+
+def _file_key(stat: os.stat_result) -> typing.List[int]:
+    return [stat.st_size, stat.st_mtime_ns, stat.st_ino]
+
+
+def _copy_file_range(src_path: str, dst_path: str) -> bool:
+    """
+    Copies a file inside the kernel, which filesystems like btrfs and XFS turn into a reflink that shares the data
+    :return: Whether the whole file was copied, False if copy_file_range isn't supported here
+    """
+    if not hasattr(os, "copy_file_range"):
+        return False
+    with open(src_path, "rb") as src, open(dst_path, "wb") as dst:
+        remaining = os.fstat(src.fileno()).st_size
+        try:
+            while remaining > 0:
+                copied = os.copy_file_range(src.fileno(), dst.fileno(), remaining)
+                if copied == 0:
+                    break
+                remaining -= copied
+        except OSError as e:
+            if e.errno in _COPY_FILE_RANGE_UNSUPPORTED:
+                return False
+            raise
+    return remaining == 0
+
+
+def place_file(src_path: str, dst_path: str) -> bool:
+    """
+    Puts a file at dst_path with the contents of src_path, replacing whatever is there in one step
+    Hardlinks when src and dst are on the same drive, otherwise copies with copy_file_range, or shutil.copyfile
+    which uses sendfile/fcopyfile where available.
+    :param src_path: The file to be placed
+    :param dst_path: Where it is placed
+    :return: True if it was hardlinked, False if it was copied
+    """
+
+    staged = f"{dst_path}.mmc-tmp"
+    if os.path.lexists(staged):
+        os.unlink(staged)
+
+    try:
+        try:
+            os.link(src_path, staged)
+            hardlinked = True
+        except OSError:
+            hardlinked = False
+            if not _copy_file_range(src_path, staged):
+                shutil.copyfile(src_path, staged)
+        os.replace(staged, dst_path)
+        if os.path.lexists(staged):
+            # Renaming a hardlink over another link to the same file does nothing
+            os.unlink(staged)
+    except BaseException:
+        if os.path.lexists(staged):
+            os.unlink(staged)
+        raise
+    return hardlinked
+
+
+def _read_manifest(folder: str) -> typing.Optional[dict]:
+    manifest_file = os.path.join(folder, MANIFEST_NAME)
+    if not os.path.isfile(manifest_file):
+        return None
+    try:
+        with open(manifest_file, "r") as f:
+            manifest = json.load(f)
+    except (OSError, json.decoder.JSONDecodeError) as e:
+        tracing.warning("ignoring unreadable sync manifest", folder=folder, error=e)
+        return {"format": MANIFEST_FORMAT, "source": None, "files": {}}
+    if manifest.get("format") != MANIFEST_FORMAT:
+        return {"format": MANIFEST_FORMAT, "source": None, "files": {}}
+    return manifest
+
+
+def _write_manifest(folder: str, manifest: dict) -> None:
+    _write_json(os.path.join(folder, MANIFEST_NAME), manifest)
+
+
+def _write_json(file: str, contents: dict) -> None:
+    with atomic_write(file) as outfile:
+        json.dump(contents, outfile)
+
+
+def _file_manifest(path: str) -> str:
+    # Next to the file, e.g. options.txt.mmc-manifest.json, which the game doesn't read
+    return path + MANIFEST_NAME
+
+
+def is_synced_folder(folder: str) -> bool:
+    """
+    :param folder: A mods folder used by the game
+    :return: Whether its files were placed by sync_folder instead of it being a link
+    """
+    return not os.path.islink(folder) and os.path.isfile(os.path.join(folder, MANIFEST_NAME))
+
+
+def synced_source(path: str) -> typing.Optional[str]:
+    """
+    :param path: A mods folder or options file used by the game
+    :return: The folder/file last synced into it, or None if it wasn't synced
+    """
+    if os.path.islink(path):
+        return None
+    if os.path.isfile(path):
+        try:
+            with open(_file_manifest(path), "r") as f:
+                return json.load(f).get("source")
+        except (OSError, json.decoder.JSONDecodeError):
+            return None
+    if not is_synced_folder(path):
+        return None
+    return (_read_manifest(path) or {}).get("source")
+
+
+def sync_file(src_path: str, dst_path: str) -> bool:
+    """
+    Places a single file with place_file, and records where it came from for synced_source
+    :param src_path: The file to be placed, e.g. an options file
+    :param dst_path: Where it is placed
+    :return: True if it was hardlinked, False if it was copied
+    """
+    hardlinked = place_file(src_path, dst_path)
+    _write_json(_file_manifest(dst_path), {"format": MANIFEST_FORMAT, "source": src_path})
+    return hardlinked
+
+
+def clear_synced_file(path: str) -> None:
+    """
+    Forgets where a file placed by sync_file came from, once it was replaced with a link
+    :param path: The file
+    :return: None
+    """
+    if os.path.lexists(_file_manifest(path)):
+        os.unlink(_file_manifest(path))
+
+
+def _list_files(folder: str) -> typing.Dict[str, str]:
+    files = {}
+    for root, dirs, names in os.walk(folder):
+        for name in names:
+            path = os.path.join(root, name)
+            files[os.path.relpath(path, folder).replace(os.sep, "/")] = path
+    return files
+
+
+def _remove_file(folder: str, relative: str) -> None:
+    """
+    Removes a synced file and the folders it leaves empty
+    """
+    path = os.path.join(folder, *relative.split("/"))
+    if os.path.lexists(path):
+        os.unlink(path)
+    parent = os.path.dirname(path)
+    while os.path.normpath(parent) != os.path.normpath(folder):
+        try:
+            os.rmdir(parent)
+        except OSError:
+            break
+        parent = os.path.dirname(parent)
+
+
+@tracing.traced("mods_sync.sync_folder")
+def sync_folder(src: str, dst: str) -> SyncResult:
+    """
+    Makes dst hold the files of src, placing only what was added or changed since the last sync and removing what is gone
+    A manifest in dst records the source and placed copy of every file, so syncing only stats files and finding
+    what changed is a cheap diff. Jars shared by mods folders through the jar store are hardlinks to one file, so
+    switching between mods folders only places the jars that differ.
+    Files in dst that weren't placed by a sync are left alone, but a dst with files and no manifest is refused.
+    :param src: The mods folder to be synced
+    :param dst: The mods folder used by the game, a real folder
+    :return: How many files were added, changed, removed and left alone
+    """
+
+    manifest = _read_manifest(dst)
+    if manifest is None:
+        if os.listdir(dst):
+            raise OSError(errno.ENOTEMPTY, f"{dst} is a folder with files in it, move them into a mods folder first", dst)
+        manifest = {"format": MANIFEST_FORMAT, "source": None, "files": {}}
+
+    entries: typing.Dict[str, dict] = manifest["files"]
+    added = changed = removed = unchanged = hardlinked = 0
+    try:
+        src_files = _list_files(src)
+
+        for relative in [relative for relative in entries if relative not in src_files]:
+            _remove_file(dst, relative)
+            del entries[relative]
+            removed += 1
+
+        for relative, src_path in src_files.items():
+            src_key = _file_key(os.stat(src_path))
+            dst_path = os.path.join(dst, *relative.split("/"))
+            entry = entries.get(relative)
+            if entry is not None and entry["src"] == src_key:
+                try:
+                    if _file_key(os.stat(dst_path)) == entry["dst"]:
+                        unchanged += 1
+                        continue
+                except FileNotFoundError:
+                    pass
+
+            os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+            if place_file(src_path, dst_path):
+                hardlinked += 1
+            entries[relative] = {"src": src_key, "dst": _file_key(os.stat(dst_path))}
+            if entry is None:
+                added += 1
+            else:
+                changed += 1
+        manifest["source"] = src
+    finally:
+        # Kept up to date even if syncing stopped partway, so the next sync carries on from there
+        if added or changed or removed or manifest["source"] != src or not is_synced_folder(dst):
+            _write_manifest(dst, manifest)
+
+    tracing.info("synced mods folder", src=src, added=added, changed=changed, removed=removed, unchanged=unchanged,
+                 hardlinked=hardlinked)
+    return SyncResult(added, changed, removed, unchanged, hardlinked)
+
+
+def clear_synced_folder(folder: str) -> int:
+    """
+    Removes the files sync_folder placed in a folder and its manifest, so it can be replaced with a link
+    :param folder: The synced mods folder
+    :return: The number of files removed
+    """
+    manifest = _read_manifest(folder)
+    if manifest is None:
+        return 0
+    for relative in manifest["files"]:
+        _remove_file(folder, relative)
+    os.unlink(os.path.join(folder, MANIFEST_NAME))
+    tracing.info("cleared synced mods folder", folder=folder, files=len(manifest["files"]))
+    return len(manifest["files"])
@@ -0,0 +1,338 @@
+import collections
+import hashlib
+import json
+import os
+import re
+import threading
+import typing
+from atomic_link import atomic_write
+import tracing
+
+DELTA_SUFFIX = ".delta.json"
+
+# The base deltas were stored over before each delta named its base
+LEGACY_BASE_NAME = "base.txt"
+
+# Options in a category can be taken from one profile and the rest from another, see merge_options
+# Keys not matched by any category fall under "other"
+OPTION_CATEGORIES: typing.Dict[str, typing.Callable[[str], bool]] = {
+    "keybinds": lambda key: key.startswith("key_"),
+    "video": lambda key: key in VIDEO_OPTIONS,
+    "sound": lambda key: key.startswith("soundCategory_") or key in ("soundDevice", "showSubtitles", "directionalAudio"),
+    "controls": lambda key: key in CONTROLS_OPTIONS,
+    "chat": lambda key: key.startswith("chat") or key in ("hideMatchedNames", "narrator", "onlyShowSecureChat"),
+    "resource_packs": lambda key: key in ("resourcePacks", "incompatibleResourcePacks"),
+}
+
+VIDEO_OPTIONS = {
+    "ao", "biomeBlendRadius", "bobView", "chunkUpdateThreads", "clouds", "darknessEffectScale", "enableVsync",
+    "entityDistanceScaling", "entityShadows", "fancyGraphics", "fov", "fovEffectScale", "fullscreen",
+    "fullscreenResolution", "gamma", "glintSpeed", "glintStrength", "graphicsMode", "guiScale", "maxFps",
+    "mipmapLevels", "overrideHeight", "overrideWidth", "particles", "prioritizeChunkUpdates", "renderClouds",
+    "renderDistance", "screenEffectScale", "simulationDistance", "useVbo",
+}
+
+CONTROLS_OPTIONS = {
+    "autoJump", "discrete_mouse_scroll", "invertYMouse", "mouseSensitivity", "mouseWheelSensitivity", "rawMouseInput",
+    "toggleCrouch", "toggleSprint", "touchscreen",
+}
+
+
+def parse_options(text: str) -> typing.Dict[str, str]:
+    """
+    Parses the key:value lines of an options.txt, keeping their order
+    :param text: The contents of the options file
+    :return: Dict of option -> value, both as written in the file
+    """
+    options = {}
+    for line in text.splitlines():
+        key, separator, value = line.partition(":")
+        if separator and key:
+            options[key] = value
+    return options
+
+
+def format_options(options: typing.Dict[str, str]) -> str:
+    """
+    Writes options back in the options.txt format
+    :param options: Dict of option -> value
+    :return: The contents of the options file
+    """
+    return "".join(f"{key}:{value}\n" for key, value in options.items())
+
+
+def read_options(options_file: str) -> typing.Dict[str, str]:
+    with open(options_file, "r", encoding="utf-8", errors="replace") as f:
+        return parse_options(f.read())
+
+
+def diff_options(base: typing.Dict[str, str], options: typing.Dict[str, str]) -> typing.Dict[str, typing.Optional[str]]:
+    """
+    Finds what differs between options and a base
+    :param base: The options the delta is over
+    :param options: The options to describe
+    :return: Dict of option -> its value in options, or None if options doesn't have it
+    """
+    delta = {key: value for key, value in options.items() if base.get(key) != value}
+    delta.update((key, None) for key in base if key not in options)
+    return delta
+
+
+def apply_delta(base: typing.Dict[str, str], delta: typing.Dict[str, typing.Optional[str]]) -> typing.Dict[str, str]:
+    """
+    Rebuilds options from a base and a delta made by diff_options
+    :param base: The options the delta is over
+    :param delta: The changes to apply
+    :return: The options, in the base's order followed by the options the base doesn't have
+    """
+    options = dict(base)
+    for key, value in delta.items():
+        if value is None:
+            options.pop(key, None)
+        else:
+            options[key] = value
+    return options
+
+
+def category_of(key: str) -> str:
+    """
+    :param key: An option
+    :return: The category in OPTION_CATEGORIES the option belongs to, or "other"
+    """
+    for category, matches in OPTION_CATEGORIES.items():
+        if matches(key):
+            return category
+    return "other"
+
+
+def merge_options(base: typing.Dict[str, str],
+                  parts: typing.Iterable[typing.Tuple[typing.Dict[str, str], typing.Optional[typing.Iterable[str]]]]
+                  ) -> typing.Dict[str, str]:
+    """
+    Takes some categories of options from each of several profiles, e.g. keybinds from one and video from another
+    :param base: Where the options not taken from any part come from
+    :param parts: (options, categories to take from them, or None for all of them), later parts win over earlier ones
+    :return: The merged options
+    """
+    merged = dict(base)
+    for options, categories in parts:
+        if categories is None:
+            merged.update(options)
+            continue
+        categories = set(categories)
+        unknown = categories - set(OPTION_CATEGORIES) - {"other"}
+        if unknown:
+            raise ValueError(f"unknown options categories {sorted(unknown)}, expected some of {sorted(OPTION_CATEGORIES) + ['other']}")
+        for key in [key for key in merged if category_of(key) in categories and key not in options]:
+            del merged[key]
+        merged.update((key, value) for key, value in options.items() if category_of(key) in categories)
+    return merged
+
+
+def _write_atomic(file: str, contents: str) -> None:
+    with atomic_write(file, encoding="utf-8") as f:
+        f.write(contents)
+
+
+class OptionsProfiles:
+    """
+    Options profiles stored as the few options that differ from a shared base options file
+    Profiles are materialized into full options files only when linked, and only rewritten when their options changed.
+    Changes the game makes to a linked materialized file are folded back into its delta before it is rewritten.
+    Every delta names the base it is over, and a new base is written next to the old one and only made current once
+    every delta was rewritten over it, so a crash while rebasing leaves each profile loadable over its own base.
+    """
+
+    def __init__(self, deltas_dir: str) -> None:
+        self.deltas_dir = deltas_dir
+        # Names the current base, the one new deltas are stored over
+        self.base_pointer_file = os.path.join(deltas_dir, "base.json")
+        self.materialized_dir = os.path.join(deltas_dir, "materialized")
+        self._lock = threading.RLock()
+
+    def _delta_file(self, name: str) -> str:
+        return os.path.join(self.deltas_dir, name + DELTA_SUFFIX)
+
+    def materialized_path(self, name: str) -> str:
+        return os.path.join(self.materialized_dir, name)
+
+    def names(self) -> typing.List[str]:
+        """
+        :return: The names of the stored profiles, nested ones separated with /, e.g. "pack/pvp"
+        """
+        names = []
+        for root, dirs, files in os.walk(self.deltas_dir):
+            if root == self.deltas_dir and os.path.basename(self.materialized_dir) in dirs:
+                dirs.remove(os.path.basename(self.materialized_dir))
+            relative = os.path.relpath(root, self.deltas_dir).replace(os.sep, "/")
+            names += [file[:-len(DELTA_SUFFIX)] if relative == "." else f"{relative}/{file[:-len(DELTA_SUFFIX)]}"
+                      for file in files if file.endswith(DELTA_SUFFIX)]
+        return names
+
+    def exists(self, name: str) -> bool:
+        return os.path.isfile(self._delta_file(name))
+
+    def delta_size(self, name: str) -> int:
+        """
+        :param name: The profile
+        :return: The bytes the profile takes on disk, not counting the shared base
+        """
+        return os.path.getsize(self._delta_file(name))
+
+    def _base_name(self) -> str:
+        if not os.path.isfile(self.base_pointer_file):
+            return LEGACY_BASE_NAME
+        with open(self.base_pointer_file, "r", encoding="utf-8") as f:
+            return json.load(f)["base"]
+
+    def _read_base(self, base_name: str) -> typing.Dict[str, str]:
+        base_file = os.path.join(self.deltas_dir, base_name)
+        if not os.path.isfile(base_file):
+            return {}
+        return read_options(base_file)
+
+    def get_base(self) -> typing.Dict[str, str]:
+        """
+        :return: The current base options, the ones new profiles are stored over
+        """
+        return self._read_base(self._base_name())
+
+    def set_base(self, base: typing.Dict[str, str]) -> None:
+        """
+        Replaces the base options, re-deriving every profile's delta so the profiles keep their options
+        :param base: The new base options
+        :return: None
+        """
+        with self._lock:
+            self._rebase(base, {name: self.load(name) for name in self.names()})
+
+    def _rebase(self, base: typing.Dict[str, str], profiles: typing.Dict[str, typing.Dict[str, str]]) -> None:
+        """
+        Stores profiles over a new base, which only becomes current once every one of them was stored
+        :param base: The new base options
+        :param profiles: Every profile, name -> its full options
+        :return: None
+        """
+        contents = format_options(base)
+        base_name = f"base-{hashlib.sha1(contents.encode('utf-8')).hexdigest()[:16]}.txt"
+        os.makedirs(self.deltas_dir, exist_ok=True)
+        _write_atomic(os.path.join(self.deltas_dir, base_name), contents)
+        for name, options in profiles.items():
+            stored = self._read_delta(name) if self.exists(name) else {}
+            stored.update(base=base_name, delta=diff_options(base, options))
+            self._write_delta(name, stored)
+        _write_atomic(self.base_pointer_file, json.dumps({"base": base_name}))
+
+        # No delta is over the old bases anymore
+        for entry in os.scandir(self.deltas_dir):
+            if entry.name != base_name and (entry.name == LEGACY_BASE_NAME or re.fullmatch(r"base-[0-9a-f]+\.txt", entry.name)):
+                os.remove(entry.path)
+
+    def _read_delta(self, name: str) -> dict:
+        with open(self._delta_file(name), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_delta(self, name: str, stored: dict) -> None:
+        os.makedirs(os.path.dirname(self._delta_file(name)), exist_ok=True)
+        _write_atomic(self._delta_file(name), json.dumps(stored, separators=(",", ":")))
+
+    def _keep_game_changes(self, name: str) -> dict:
+        """
+        The game saves its options through the link, so folds what it changed in the materialized file into the delta
+        :param name: The profile
+        :return: The stored delta, up to date
+        """
+        stored = self._read_delta(name)
+        path = self.materialized_path(name)
+        if os.path.isfile(path) and os.stat(path).st_mtime_ns != stored.get("materialized_mtime"):
+            tracing.info("keeping options changed in game", profile=name)
+            stored["delta"] = diff_options(self._read_base(stored.get("base", LEGACY_BASE_NAME)), read_options(path))
+            stored["materialized_mtime"] = os.stat(path).st_mtime_ns
+            self._write_delta(name, stored)
+        return stored
+
+    def load(self, name: str) -> typing.Dict[str, str]:
+        """
+        :param name: The profile
+        :return: The profile's full options
+        """
+        with self._lock:
+            stored = self._keep_game_changes(name)
+            return apply_delta(self._read_base(stored.get("base", LEGACY_BASE_NAME)), stored["delta"])
+
+    def save(self, name: str, options: typing.Dict[str, str]) -> None:
+        """
+        Stores a profile as its delta over the base
+        :param name: The profile
+        :param options: The profile's full options
+        :return: None
+        """
+        with self._lock:
+            base_name = self._base_name()
+            stored = self._read_delta(name) if self.exists(name) else {}
+            stored.update(base=base_name, delta=diff_options(self._read_base(base_name), options))
+            self._write_delta(name, stored)
+
+    def remove(self, name: str) -> None:
+        with self._lock:
+            os.remove(self._delta_file(name))
+            if os.path.isfile(self.materialized_path(name)):
+                os.remove(self.materialized_path(name))
+
+    def materialize(self, name: str) -> str:
+        """
+        Writes a profile's full options file, unless it already holds the profile's options
+        :param name: The profile
+        :return: The path to the materialized options file
+        """
+        with self._lock:
+            stored = self._keep_game_changes(name)
+            path = self.materialized_path(name)
+
+            contents = format_options(apply_delta(self._read_base(stored.get("base", LEGACY_BASE_NAME)), stored["delta"]))
+            if os.path.isfile(path):
+                with open(path, "r", encoding="utf-8", errors="replace") as f:
+                    if f.read() == contents:
+                        return path
+
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            _write_atomic(path, contents)
+            stored["materialized_mtime"] = os.stat(path).st_mtime_ns
+            self._write_delta(name, stored)
+            tracing.debug("materialized options", profile=name, options=contents.count("\n"))
+            return path
+
+    def compact(self, options_files: typing.Dict[str, str]) -> int:
+        """
+        Stores whole options files as profiles, over a base of the value most of them share for each option
+        :param options_files: Dict of profile name -> options file, the files are removed once stored
+        :return: The bytes saved
+        """
+        with self._lock:
+            profiles = {name: self.load(name) for name in self.names()}
+            bytes_before = self._stored_size(profiles)
+            for name, options_file in options_files.items():
+                profiles[name] = read_options(options_file)
+                bytes_before += os.path.getsize(options_file)
+
+            # The most common value of each option keeps the deltas smallest
+            values = collections.defaultdict(collections.Counter)
+            for options in profiles.values():
+                for key, value in options.items():
+                    values[key][value] += 1
+            base = {key: counter.most_common(1)[0][0] for key, counter in values.items()}
+
+            self._rebase(base, profiles)
+            for options_file in options_files.values():
+                os.remove(options_file)
+
+            bytes_after = self._stored_size(profiles)
+            tracing.info("compacted options", profiles=len(profiles), bytes_before=bytes_before, bytes_after=bytes_after)
+            return bytes_before - bytes_after
+
+    def _stored_size(self, names: typing.Iterable[str]) -> int:
+        sizes = [os.path.getsize(self._delta_file(name)) for name in names if self.exists(name)]
+        base_file = os.path.join(self.deltas_dir, self._base_name())
+        if sizes and os.path.isfile(base_file):
+            sizes.append(os.path.getsize(base_file))
+        return sum(sizes)
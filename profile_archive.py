@@ -0,0 +1,289 @@
+import concurrent.futures
+import gzip
+import hashlib
+import io
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+import time
+import typing
+from jar_store import JarHashIndex, JarStore
+from mod_metadata import find_jars
+import tracing
+
+ARCHIVE_FORMAT = 1
+MANIFEST_NAME = "manifest.json"
+OPTIONS_NAME = "options.txt.gz"
+
+COPY_CHUNK_SIZE = 1024 * 1024
+# Compressed files stay in memory up to this size, bigger ones spill to a temporary file
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+# Files compressed or decompressed ahead of the one being written, per worker
+WINDOW_PER_WORKER = 2
+
+T = typing.TypeVar("T")
+R = typing.TypeVar("R")
+
+
+class ImportResult(typing.NamedTuple):
+    """
+    What importing a profile archive did
+    manifest: The archive's manifest
+    options_contents: The contents of the options file, left for the caller to store
+    jars_reused: Jars linked from a local copy with the same hash instead of being read from the archive
+    jars_written: Jars read from the archive
+    """
+    manifest: dict
+    options_contents: bytes
+    jars_reused: int
+    jars_written: int
+
+
+def _bounded_map(executor: concurrent.futures.Executor, func: typing.Callable[[T], R], items: typing.Iterable[T],
+                 window: int) -> typing.Iterator[typing.Tuple[T, R]]:
+    """
+    Like executor.map, but only keeps window items in flight, so memory stays constant however many items there are
+    """
+    pending = []
+    for item in items:
+        pending.append((item, executor.submit(func, item)))
+        if len(pending) >= window:
+            done_item, future = pending.pop(0)
+            yield done_item, future.result()
+    for done_item, future in pending:
+        yield done_item, future.result()
+
+
+def _compress(read: typing.Callable[[], typing.BinaryIO]) -> typing.BinaryIO:
+    """
+    Gzips a file into a spooled temporary file, zlib releases the GIL so this runs in parallel in threads
+    """
+    spooled = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    with read() as src, gzip.GzipFile(fileobj=spooled, mode="wb", mtime=0) as dst:
+        shutil.copyfileobj(src, dst, COPY_CHUNK_SIZE)
+    spooled.seek(0)
+    return spooled
+
+
+def _add_stream(tar: tarfile.TarFile, name: str, stream: typing.BinaryIO, size: int, mtime: float) -> None:
+    info = tarfile.TarInfo(name)
+    info.size = size
+    info.mtime = int(mtime)
+    info.mode = 0o644
+    tar.addfile(info, stream)
+
+
+def _stream_size(stream: typing.BinaryIO) -> int:
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(0)
+    return size
+
+
+def export_archive(archive: typing.BinaryIO, mods_folder: str, options_contents: bytes, info: dict,
+                   hash_index: JarHashIndex, workers: typing.Optional[int] = None) -> dict:
+    """
+    Streams a mods folder and an options file into an uncompressed tar archive, in constant memory
+    Jars are stored as they are since they are zips already, every other file is gzipped by parallel workers.
+    The manifest comes first and holds each jar's hash, so importing can skip the jars it already has.
+    :param archive: Where the archive is written, doesn't need to be seekable
+    :param mods_folder: The path of the mods folder
+    :param options_contents: The contents of the options file
+    :param info: Added to the manifest, e.g. the names of the mods folder and options file
+    :param hash_index: The cache of jar hashes
+    :param workers: Compression threads, defaults to one per core
+    :return: The manifest
+    """
+
+    files = []
+    for root, dirs, names in os.walk(mods_folder):
+        dirs.sort()
+        for name in sorted(names):
+            path = os.path.join(root, name)
+            if os.path.isfile(path):
+                files.append((os.path.relpath(path, mods_folder).replace(os.sep, "/"), path))
+
+    jars = [path for relative, path in files if relative.lower().endswith(".jar")]
+    hashes = hash_index.hash_jars(jars)
+    hash_index.save()
+
+    manifest = {
+        **info,
+        "format": ARCHIVE_FORMAT,
+        "created": time.time(),
+        "files": [{"path": relative, "size": os.path.getsize(path), "sha256": hashes.get(path),
+                   "compressed": path not in hashes} for relative, path in files],
+    }
+
+    def prepare(file: typing.Tuple[str, str]) -> typing.Optional[typing.BinaryIO]:
+        relative, path = file
+        if path in hashes:
+            return None
+        return _compress(lambda: open(path, "rb"))
+
+    workers = workers or os.cpu_count() or 1
+    with tarfile.open(fileobj=archive, mode="w|", format=tarfile.PAX_FORMAT) as tar, \
+            concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        manifest_bytes = json.dumps(manifest).encode()
+        _add_stream(tar, MANIFEST_NAME, io.BytesIO(manifest_bytes), len(manifest_bytes), time.time())
+
+        options = _compress(lambda: io.BytesIO(options_contents))
+        with options:
+            _add_stream(tar, OPTIONS_NAME, options, _stream_size(options), time.time())
+
+        for (relative, path), compressed in _bounded_map(executor, prepare, files, workers * WINDOW_PER_WORKER):
+            if compressed is None:
+                with open(path, "rb") as f:
+                    _add_stream(tar, f"mods/{relative}", f, os.fstat(f.fileno()).st_size, os.path.getmtime(path))
+            else:
+                with compressed:
+                    _add_stream(tar, f"mods/{relative}.gz", compressed, _stream_size(compressed), os.path.getmtime(path))
+
+    tracing.info("exported profile", files=len(files), jars=len(jars))
+    return manifest
+
+
+def _safe_relative(path: str) -> str:
+    """
+    Checks a path from an archive stays inside the folder it is extracted to
+    """
+    parts = path.split("/")
+    if not path or path.startswith("/") or any(part in ("", ".", "..") for part in parts) or "\\" in path or ":" in parts[0]:
+        raise ValueError(f"unsafe path in archive: {path!r}")
+    return os.path.join(*parts)
+
+
+def _copy_hashed(src: typing.BinaryIO, dst_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(dst_path, "wb") as dst:
+        for chunk in iter(lambda: src.read(COPY_CHUNK_SIZE), b""):
+            digest.update(chunk)
+            dst.write(chunk)
+    return digest.hexdigest()
+
+
+def _decompress_to(spooled: typing.BinaryIO, dst_path: str) -> None:
+    with spooled, gzip.GzipFile(fileobj=spooled, mode="rb") as src, open(dst_path, "wb") as dst:
+        shutil.copyfileobj(src, dst, COPY_CHUNK_SIZE)
+
+
+def import_archive(archive: typing.BinaryIO, destination: typing.Callable[[dict], str],
+                   jar_store: JarStore, local_folders: typing.Iterable[str] = (), workers: typing.Optional[int] = None
+                   ) -> ImportResult:
+    """
+    Streams a profile archive made by export_archive into a new mods folder, in constant memory
+    Jars that are already in the jar store or in local_folders are hardlinked from there instead of read.
+    The mods folder is filled in a hidden temporary folder next to it, and only renamed into place once complete.
+    :param archive: The archive to be read, doesn't need to be seekable
+    :param destination: Called with the manifest, returns the path of the mods folder to create
+    :param jar_store: Where local jars are looked for by hash, and where new jars are added
+    :param local_folders: Folders with jars that may be in the archive, e.g. the mods folders
+    :param workers: Decompression threads, defaults to one per core
+    :return: The manifest, the options file and how many jars were reused
+    """
+
+    workers = workers or os.cpu_count() or 1
+    jars_reused = 0
+    jars_written = 0
+    jar_hashes = {}
+
+    with tarfile.open(fileobj=archive, mode="r|") as tar:
+        member = tar.next()
+        if member is None or member.name != MANIFEST_NAME:
+            raise ValueError("not a profile archive, it doesn't start with a manifest")
+        manifest = json.load(tar.extractfile(member))
+        if manifest.get("format") != ARCHIVE_FORMAT:
+            raise ValueError(f"unsupported profile archive format {manifest.get('format')!r}")
+
+        mods_folder = destination(manifest)
+        if os.path.lexists(mods_folder):
+            raise FileExistsError(f"{mods_folder} already exists")
+
+        files = {}
+        for file in manifest["files"]:
+            relative = _safe_relative(file["path"])
+            files[f"mods/{file['path']}.gz" if file["compressed"] else f"mods/{file['path']}"] = (relative, file)
+
+        # Local jars that were never hashed are hashed now, only those of the size of a jar in the archive can match
+        # one, and the hash index keeps the hashes for the next import
+        archive_sizes = {file["size"] for file in manifest["files"] if file["sha256"]}
+        jar_store.hash_index.hash_jars([jar.path for folder in local_folders for jar in find_jars(folder)
+                                        if jar.stat().st_size in archive_sizes])
+        local_jars = jar_store.hash_index.known_hashes()
+        temp_folder = os.path.join(os.path.dirname(mods_folder), f".importing-{os.path.basename(mods_folder)}")
+        if os.path.lexists(temp_folder):
+            shutil.rmtree(temp_folder)
+        os.makedirs(temp_folder)
+
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+                pending = []
+                options_contents = None
+                # Entries of files, a truncated stream or an archive that lists more than it holds leaves some out
+                received = set()
+                for member in tar:
+                    if member.name == MANIFEST_NAME:
+                        continue
+                    if member.name == OPTIONS_NAME:
+                        with gzip.GzipFile(fileobj=tar.extractfile(member), mode="rb") as options:
+                            options_contents = options.read()
+                        continue
+                    if member.name not in files or not member.isfile():
+                        raise ValueError(f"unexpected entry in archive: {member.name!r}")
+
+                    received.add(member.name)
+                    relative, file = files[member.name]
+                    dst_path = os.path.join(temp_folder, relative)
+                    os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+
+                    if file["compressed"]:
+                        # Read sequentially from the stream, decompressed in parallel
+                        spooled = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+                        shutil.copyfileobj(tar.extractfile(member), spooled, COPY_CHUNK_SIZE)
+                        spooled.seek(0)
+                        pending.append(executor.submit(_decompress_to, spooled, dst_path))
+                        if len(pending) >= workers * WINDOW_PER_WORKER:
+                            pending.pop(0).result()
+                        continue
+
+                    digest = file["sha256"]
+                    stored = jar_store.stored_path(digest)
+                    local_jar = stored if os.path.isfile(stored) else local_jars.get(digest)
+                    if local_jar is not None:
+                        try:
+                            os.link(local_jar, dst_path)
+                        except OSError:
+                            shutil.copyfile(local_jar, dst_path)
+                        jar_hashes[relative] = digest
+                        jars_reused += 1
+                        # The jar's data is skipped by the next read from the archive
+                        continue
+
+                    if _copy_hashed(tar.extractfile(member), dst_path) != digest:
+                        raise ValueError(f"{file['path']} doesn't match its hash, the archive is damaged")
+                    jar_hashes[relative] = digest
+                    local_jars[digest] = dst_path
+                    jars_written += 1
+
+                for future in pending:
+                    future.result()
+
+            if options_contents is None:
+                raise ValueError("the archive has no options file")
+            missing = sorted(files[name][1]["path"] for name in files.keys() - received)
+            if missing:
+                raise ValueError(f"archive is missing {len(missing)} of its files, e.g. {missing[0]!r}, it may be truncated")
+            os.makedirs(os.path.dirname(mods_folder), exist_ok=True)
+            os.rename(temp_folder, mods_folder)
+        except BaseException:
+            shutil.rmtree(temp_folder, ignore_errors=True)
+            raise
+
+    # Keep the new jars in the store, so the next import finds them by hash, without hashing them again
+    for relative, digest in jar_hashes.items():
+        jar_store.hash_index.record(os.path.join(mods_folder, relative), digest)
+    jar_store.deduplicate_folders([mods_folder])
+    tracing.info("imported profile", jars_reused=jars_reused, jars_written=jars_written)
+    return ImportResult(manifest=manifest, options_contents=options_contents, jars_reused=jars_reused, jars_written=jars_written)
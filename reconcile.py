@@ -0,0 +1,60 @@
+import typing
+
+
+class ReconcileResult(typing.NamedTuple):
+    """
+    Result of reconciling the mods folders/options files on disk against their saved order
+    resolved: The resolved list, in display order
+    added: Items found on disk but not in the saved order, in the order they appear in resolved
+    removed: Items in the saved order that no longer exist on disk, in their saved order
+    kept: Items present in both, in their saved order
+    """
+    resolved: typing.List[str]
+    added: typing.List[str]
+    removed: typing.List[str]
+    kept: typing.List[str]
+
+    @property
+    def changed(self) -> bool:
+        """
+        Whether the resolved list differs from the saved order
+        :return: True if anything was added or removed
+        """
+        return bool(self.added or self.removed)
+
+
+
+def reconcile_mods_or_options(file_list: typing.Iterable[str], order_list: typing.Iterable[str]) -> ReconcileResult:
+    """
+    Merges the list of files/folders with the saved order in O(n)
+    New items go to the top of the list, the most recently listed one first, and the rest keep their saved order.
+    Duplicate entries in the saved order are collapsed to their first occurrence.
+    Neither argument is modified.
+    :param file_list: The mods folders/options files currently on disk
+    :param order_list: The saved order
+    :return: The resolved list along with what was added, removed and kept
+    """
+
+    file_list = list(file_list)
+    file_set = set(file_list)
+
+    kept = []
+    removed = []
+    seen = set()
+    for order_item in order_list:
+        if order_item in seen:
+            continue
+        seen.add(order_item)
+        if order_item in file_set:
+            kept.append(order_item)
+        else:
+            removed.append(order_item)
+
+    added = []
+    for file_item in file_list:
+        if file_item not in seen:
+            seen.add(file_item)
+            added.append(file_item)
+    added.reverse()
+
+    return ReconcileResult(resolved=added + kept, added=added, removed=removed, kept=kept)
@@ -0,0 +1,212 @@
+import bisect
+import functools
+import os
+import re
+import threading
+import typing
+from mod_metadata import ModMetadata
+
+# Versions like 1.16.5 stay one token, "mod@version" ties a version to its mod, e.g. jei@11 only matches JEI 11 and 11.x
+_TOKEN_PATTERN = re.compile(r"[a-z0-9_\-]+@\S+|[a-z0-9]+(?:\.[a-z0-9]+)*")
+
+# Fuzzy matching allows one typo in tokens at least this long with a letter in them, shorter ones would match too much
+FUZZY_MIN_LENGTH = 3
+FUZZY_MAX_LENGTH = 32
+
+# Matches of single query tokens kept while the index is unchanged, typing a query only extends its last token
+MAX_CACHED_TOKENS = 1024
+
+
+def tokenize(text: str) -> typing.List[str]:
+    """
+    Splits text into lowercase search tokens
+    :param text: A name, or a query
+    :return: The tokens, in order
+    """
+    return _TOKEN_PATTERN.findall(text.lower())
+
+
+def mod_terms(mods: typing.Iterable[ModMetadata]) -> typing.List[str]:
+    """
+    The tokens a mods folder is found by besides its name
+    :param mods: The mods in the mods folder
+    :return: Tokens of each mod's id, version, loader, Minecraft version and jar, and its "mod_id@version"
+    """
+    terms = []
+    for mod in mods:
+        terms += _mod_terms(mod.mod_id, mod.version, mod.loader, mod.minecraft_version, os.path.basename(mod.jar))
+    return terms
+
+
+# The same jars are in many mods folders
+@functools.lru_cache(maxsize=16384)
+def _mod_terms(mod_id: str, version: str, loader: str, minecraft_version: typing.Optional[str], jar_name: str) -> typing.Tuple[str, ...]:
+    text = " ".join(filter(None, (mod_id, version, loader, minecraft_version, os.path.splitext(jar_name)[0])))
+    return (*tokenize(text), f"{mod_id}@{version}".lower())
+
+
+def _deletions(token: str) -> typing.Set[str]:
+    # A set, deleting either letter of a double letter gives the same string
+    return {token[:i] + token[i + 1:] for i in range(len(token))}
+
+
+def _is_fuzzy(token: str) -> bool:
+    return FUZZY_MIN_LENGTH <= len(token) <= FUZZY_MAX_LENGTH and "@" not in token and any(c.isalpha() for c in token)
+
+
+class SearchIndex:
+    """
+    Inverted index of the mods folders/options files, matching every query token as a prefix, or with one typo
+    Tokens are kept sorted so the tokens starting with a prefix are a bisected slice, and each token's one character
+    deletions are indexed so a typo is found with a few dict lookups instead of comparing against every token.
+    New tokens are only merged into the sorted tokens by the next search, so indexing many documents doesn't insert
+    into the middle of a long list for every token.
+    Documents are added, changed and removed one at a time, so the index follows the folders without being rebuilt.
+    Safe to share between threads.
+    """
+
+    def __init__(self) -> None:
+        self._documents: typing.Dict[str, typing.FrozenSet[str]] = {}
+        self._postings: typing.Dict[str, typing.Set[str]] = {}
+        self._tokens: typing.List[str] = []
+        self._unsorted_tokens: typing.List[str] = []
+        # Whether self._tokens may hold duplicates or tokens no document has anymore
+        self._stale_tokens = False
+        # Token with one character deleted -> the tokens it comes from
+        self._deletions: typing.Dict[str, typing.Set[str]] = {}
+        self._cache: typing.Dict[str, typing.FrozenSet[str]] = {}
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._documents
+
+    def names(self) -> typing.List[str]:
+        with self._lock:
+            return list(self._documents)
+
+    def _add_token(self, token: str, name: str) -> None:
+        documents = self._postings.get(token)
+        if documents is None:
+            documents = self._postings[token] = set()
+            self._unsorted_tokens.append(token)
+            if _is_fuzzy(token):
+                for deletion in _deletions(token):
+                    self._deletions.setdefault(deletion, set()).add(token)
+        documents.add(name)
+
+    def _remove_token(self, token: str, name: str) -> None:
+        documents = self._postings[token]
+        documents.discard(name)
+        if documents:
+            return
+        del self._postings[token]
+        self._stale_tokens = True
+        if _is_fuzzy(token):
+            for deletion in _deletions(token):
+                tokens = self._deletions[deletion]
+                tokens.discard(token)
+                if not tokens:
+                    del self._deletions[deletion]
+
+    def set_document(self, name: str, terms: typing.Iterable[str] = ()) -> None:
+        """
+        Adds a mods folder/options file, or changes what it is found by, only touching the tokens that differ
+        :param name: The mods folder/options file, its name is always searched
+        :param terms: Tokens it is found by besides its name, see mod_terms
+        :return: None
+        """
+        tokens = frozenset(tokenize(name)).union(terms)
+        with self._lock:
+            previous = self._documents.get(name, frozenset())
+            if tokens == previous and name in self._documents:
+                return
+            for token in previous - tokens:
+                self._remove_token(token, name)
+            postings = self._postings
+            for token in tokens - previous:
+                documents = postings.get(token)
+                if documents is None:
+                    self._add_token(token, name)
+                else:
+                    documents.add(name)
+            self._documents[name] = tokens
+            self._cache.clear()
+
+    def remove_document(self, name: str) -> None:
+        """
+        Removes a mods folder/options file, nothing happens if it isn't in the index
+        :param name: The mods folder/options file
+        :return: None
+        """
+        with self._lock:
+            for token in self._documents.pop(name, frozenset()):
+                self._remove_token(token, name)
+            self._cache.clear()
+
+    def _sorted_tokens(self) -> typing.List[str]:
+        if self._unsorted_tokens:
+            # Sorting a sorted list with a few new tokens at its end is close to linear
+            self._tokens += self._unsorted_tokens
+            self._tokens.sort()
+            self._unsorted_tokens = []
+            self._stale_tokens = True
+        if self._stale_tokens:
+            tokens = self._tokens
+            self._tokens = [token for i, token in enumerate(tokens) if token in self._postings and (i == 0 or tokens[i - 1] != token)]
+            self._stale_tokens = False
+        return self._tokens
+
+    def _match(self, query_token: str) -> typing.FrozenSet[str]:
+        matches = self._cache.get(query_token)
+        if matches is not None:
+            return matches
+
+        # "11.x" means any 11. version
+        prefix = query_token[:-1] if query_token.endswith(".x") else query_token
+        tokens = self._sorted_tokens()
+        start = bisect.bisect_left(tokens, prefix)
+        end = bisect.bisect_left(tokens, prefix + "\uffff", start)
+        candidates = tokens[start:end]
+        if "@" in prefix and not prefix.endswith("@"):
+            # A mod's version matches on whole components, jei@11 matches jei@11 and jei@11.2 but not jei@110
+            version_end = len(prefix.rstrip("."))
+            candidates = [token for token in candidates if len(token) == version_end or not token[version_end].isalnum()]
+        documents = set()
+        for token in candidates:
+            documents |= self._postings[token]
+
+        if not documents and _is_fuzzy(query_token):
+            # A missing, extra, wrong or swapped character
+            similar = set(self._deletions.get(query_token, ()))
+            for deletion in _deletions(query_token):
+                similar |= self._deletions.get(deletion, set())
+                if deletion in self._postings:
+                    similar.add(deletion)
+            for token in similar:
+                documents |= self._postings[token]
+
+        matches = frozenset(documents)
+        if len(self._cache) >= MAX_CACHED_TOKENS:
+            self._cache.clear()
+        self._cache[query_token] = matches
+        return matches
+
+    def search(self, query: str) -> typing.Optional[typing.Set[str]]:
+        """
+        Finds the mods folders/options files matching every token of a query
+        :param query: e.g. "skyblock" or "jei@11.x"
+        :return: The matching names, or None if the query has no tokens so everything matches
+        """
+        query_tokens = tokenize(query)
+        if not query_tokens:
+            return None
+        with self._lock:
+            # Intersecting from the rarest token keeps every intersection small
+            token_matches = sorted((self._match(query_token) for query_token in query_tokens), key=len)
+            matches = set(token_matches[0])
+            for other_matches in token_matches[1:]:
+                matches &= other_matches
+            return matches
@@ -0,0 +1,244 @@
+import bisect
+import concurrent.futures
+import hashlib
+import json
+import os
+import threading
+import typing
+from atomic_link import atomic_write
+import tracing
+
+
+def size_and_mtime(stat: os.stat_result) -> list:
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def compute_in_pool(compute: typing.Callable[[str], typing.Any], paths: typing.List[str], *, min_for_pool: int = 1,
+                    executor_class: typing.Type[concurrent.futures.Executor] = concurrent.futures.ProcessPoolExecutor,
+                    chunks_per_worker: int = 4) -> typing.Generator[typing.Any, None, None]:
+    """
+    Computes the values of many files across a pool, or one after another when there are too few to pay for starting it
+    Closing the generator early, e.g. for a cancelled job, drops the files not started yet.
+    :param compute: Computes the value of one file, must be picklable for a process pool
+    :param paths: The paths of the files
+    :param min_for_pool: Fewer files than this are computed without a pool
+    :param executor_class: The pool, a process pool for CPU bound work
+    :param chunks_per_worker: How many chunks the files are split into per core, for a process pool
+    :return: The value of each file, in the same order as paths
+    """
+    if len(paths) < min_for_pool:
+        yield from map(compute, paths)
+        return
+
+    executor = executor_class()
+    try:
+        yield from executor.map(compute, paths, chunksize=max(1, len(paths) // (chunks_per_worker * (os.cpu_count() or 1))))
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+
+class StatKeyedIndex:
+    """
+    Values computed from files, e.g. the mods in a jar, stored on disk and keyed by each file's path and stat,
+    so a file's value is only computed again once the file changed
+    The entries are stored in a json file per folder holding the files, and only the files of folders whose entries
+    changed are written again. Safe to share between threads.
+    """
+
+    def __init__(self, index_dir: str, stat_key: typing.Callable[[os.stat_result], list] = size_and_mtime) -> None:
+        """
+        :param index_dir: The folder the json files are stored in
+        :param stat_key: The parts of a file's stat that must be unchanged for its value to be reused
+        """
+        self.index_dir = index_dir
+        self.stat_key = stat_key
+        # Folder -> file name -> {"key": stat_key of the file, "value": ...}
+        self._folders: typing.Optional[typing.Dict[str, typing.Dict[str, dict]]] = None
+        self._dirty: typing.Set[str] = set()
+        # The folders sorted, so the folders inside one are a bisected slice, None until a prune needs them
+        self._sorted_folders: typing.Optional[typing.List[str]] = None
+        # Not held while values are computed, so lookups don't wait for a long update
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _split(path: str) -> typing.Tuple[str, str]:
+        folder, name = os.path.split(path)
+        return os.path.normpath(folder), name
+
+    def _folder_file(self, folder: str) -> str:
+        return os.path.join(self.index_dir, f"{hashlib.sha1(os.fsencode(folder)).hexdigest()}.json")
+
+    def _load(self) -> typing.Dict[str, typing.Dict[str, dict]]:
+        if self._folders is None:
+            self._folders = {}
+            try:
+                names = os.listdir(self.index_dir)
+            except FileNotFoundError:
+                names = []
+            for name in names:
+                if not name.endswith(".json"):
+                    continue
+                try:
+                    with open(os.path.join(self.index_dir, name), "r") as f:
+                        stored = json.load(f)
+                    self._folders[stored["folder"]] = stored["entries"]
+                except (OSError, ValueError, KeyError, TypeError) as e:
+                    # Its files are computed again and the file is rewritten
+                    tracing.warning("skipping unreadable index file", file=os.path.join(self.index_dir, name), error=e)
+        return self._folders
+
+    def save(self) -> None:
+        """
+        Writes the entries of the folders that changed to disk
+        :return: None
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+            os.makedirs(self.index_dir, exist_ok=True)
+            for folder in self._dirty:
+                folder_file = self._folder_file(folder)
+                entries = self._folders.get(folder)
+                if not entries:
+                    if os.path.exists(folder_file):
+                        os.unlink(folder_file)
+                    continue
+                # Lost entries are only computed again, so they aren't flushed to disk one file at a time
+                with atomic_write(folder_file, durable=False) as outfile:
+                    json.dump({"folder": folder, "entries": entries}, outfile)
+            self._dirty.clear()
+
+    def lookup(self, path: str, stat: os.stat_result) -> typing.Tuple[bool, typing.Any]:
+        """
+        :param path: The path of a file
+        :param stat: The file's current stat
+        :return: Whether the file's value is known and it is unchanged since, and that value
+        """
+        folder, name = self._split(path)
+        with self._lock:
+            entry = self._load().get(folder, {}).get(name)
+        if entry is None or entry["key"] != self.stat_key(stat):
+            return False, None
+        return True, entry["value"]
+
+    def store(self, path: str, stat: os.stat_result, value: typing.Any) -> None:
+        """
+        Stores the value of a file, e.g. after the file was changed without changing its value
+        :param path: The path of the file
+        :param stat: The file's current stat
+        :param value: The value, must be json serializable
+        :return: None
+        """
+        self._store(path, self.stat_key(stat), value)
+
+    def _store(self, path: str, key: list, value: typing.Any) -> None:
+        folder, name = self._split(path)
+        with self._lock:
+            folders = self._load()
+            if folder not in folders:
+                folders[folder] = {}
+                self._sorted_folders = None
+            folders[folder][name] = {"key": key, "value": value}
+            self._dirty.add(folder)
+
+    def items(self) -> typing.List[typing.Tuple[str, typing.Any]]:
+        """
+        :return: The path and value of every file in the index, some may have changed since
+        """
+        with self._lock:
+            return [(os.path.join(folder, name), entry["value"])
+                    for folder, entries in self._load().items() for name, entry in entries.items()]
+
+    def update(self, files: typing.List[typing.Tuple[str, os.stat_result]],
+               compute: typing.Callable[[typing.List[str]], typing.Generator[typing.Any, None, None]],
+               progress: typing.Optional[typing.Callable[[int, int], None]] = None) -> typing.Dict[str, typing.Any]:
+        """
+        Brings the entries of files up to date, computing only the values of new or changed files
+        If computing stops early, e.g. because progress raised to cancel a job, the values computed so far are kept.
+        :param files: The path and current stat of each file
+        :param compute: Computes the values of many files, yielding them in the same order as the paths it is given
+        :param progress: Called with (values computed, values to compute)
+        :return: Path -> value of each file
+        """
+
+        result = {}
+        stale = []
+        with self._lock:
+            folders = self._load()
+            for path, stat in files:
+                folder, name = self._split(path)
+                key = self.stat_key(stat)
+                entry = folders.get(folder, {}).get(name)
+                if entry is not None and entry["key"] == key:
+                    result[path] = entry["value"]
+                else:
+                    stale.append((path, key))
+
+        if not stale:
+            return result
+
+        tracing.info("updating index", index=self.index_dir, count=len(stale))
+        values = compute([path for path, _key in stale])
+        try:
+            for i, ((path, key), value) in enumerate(zip(stale, values)):
+                self._store(path, key, value)
+                result[path] = value
+                if progress is not None:
+                    progress(i + 1, len(stale))
+        finally:
+            values.close()
+            self.save()
+        return result
+
+    def update_folders(self, folders: typing.Dict[str, str], find_files: typing.Callable[[str], typing.Iterable[os.DirEntry]],
+                       compute: typing.Callable[[typing.List[str]], typing.Generator[typing.Any, None, None]],
+                       progress: typing.Optional[typing.Callable[[int, int], None]] = None
+                       ) -> typing.Dict[str, typing.List[typing.Tuple[str, typing.Any]]]:
+        """
+        Brings the entries of every file in the folders up to date, and forgets the files that were removed from them
+        :param folders: Folder name -> path
+        :param find_files: Finds the files of a folder
+        :param compute: Computes the values of many files, see update
+        :param progress: Called with (values computed, values to compute)
+        :return: Folder name -> the path and value of every file in that folder
+        """
+
+        folder_files = {name: list(find_files(folder)) for name, folder in folders.items()}
+        self.prune(folders.values(), {entry.path for files in folder_files.values() for entry in files})
+        values = self.update([(entry.path, entry.stat()) for files in folder_files.values() for entry in files], compute, progress)
+        self.save()
+        return {name: [(entry.path, values[entry.path]) for entry in files] for name, files in folder_files.items()}
+
+    def _folders_in(self, root: str) -> typing.List[str]:
+        """
+        Finds the stored folders inside a folder without looking at the others
+        :param root: The folder, as an os.path.normpath path
+        :return: root and the folders in it that have entries
+        """
+        if self._sorted_folders is None:
+            self._sorted_folders = sorted(self._folders)
+        prefix = os.path.join(root, "")
+        start = bisect.bisect_left(self._sorted_folders, prefix)
+        end = bisect.bisect_left(self._sorted_folders, prefix + "\uffff", start)
+        return ([root] if root in self._folders else []) + self._sorted_folders[start:end]
+
+    def prune(self, folders: typing.Iterable[str], keep: typing.Set[str]) -> None:
+        """
+        Forgets the files in folders, and in the folders in them, that aren't in keep, e.g. jars removed from mods folders
+        Only the entries inside folders are looked at, however many other files the index holds.
+        :param folders: The folders
+        :param keep: The paths of the files still in them
+        :return: None
+        """
+
+        keep = {os.path.normpath(path) for path in keep}
+        with self._lock:
+            stored = self._load()
+            for folder in {found for root in folders for found in self._folders_in(os.path.normpath(root))}:
+                entries = stored[folder]
+                for name in [name for name in entries if os.path.join(folder, name) not in keep]:
+                    del entries[name]
+                    self._dirty.add(folder)
+                if not entries:
+                    del stored[folder]
+                    self._sorted_folders = None
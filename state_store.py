@@ -0,0 +1,166 @@
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import typing
+import tracing
+
+
+class StateStore:
+    """
+    Key/value store for saved state, like the order of the mods/options lists, backed by SQLite
+    Writes are held in memory and flushed together shortly after the first one, each flush is a single transaction,
+    so rapid changes cost one write and a crash never leaves a half written value behind.
+    """
+
+    def __init__(self, db_file: str, *, flush_delay: float = 0.5) -> None:
+        """
+        :param db_file: The SQLite database file, created if it doesn't exist
+        :param flush_delay: How long to collect writes before flushing them, in seconds
+        """
+        self.db_file = db_file
+        self.flush_delay = flush_delay
+
+        self._connection = sqlite3.connect(db_file, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+        self._lock = threading.RLock()
+        # Decoded values that have been read or written, so each key is only read from disk once
+        self._cache: typing.Dict[str, typing.Any] = {}
+        # Encoded values waiting to be flushed, None marks a deleted key
+        self._pending: typing.Dict[str, typing.Optional[str]] = {}
+        self._flush_timer: typing.Optional[threading.Timer] = None
+
+        atexit.register(self.close)
+
+    def get(self, key: str, default: typing.Any = None) -> typing.Any:
+        """
+        Retrieves a value, the returned value must not be modified
+        Once closed, only the values that were already read or written can be retrieved.
+        :param key: The key of the value
+        :param default: Returned if the key doesn't exist or can't be decoded
+        :return: The stored value
+        """
+        with self._lock:
+            if key in self._cache:
+                return self._cache[key]
+
+            self._check_open()
+            row = self._connection.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return default
+            try:
+                value = json.loads(row[0])
+            except json.decoder.JSONDecodeError:
+                tracing.warning("could not decode stored value", key=key)
+                return default
+            self._cache[key] = value
+            return value
+
+    def set(self, key: str, value: typing.Any) -> None:
+        """
+        Stores a value, it is written to disk with any other changes made within flush_delay
+        :param key: The key of the value
+        :param value: The value, must be json serializable
+        :return: None
+        """
+        encoded = json.dumps(value)
+        with self._lock:
+            self._check_open()
+            self._cache[key] = json.loads(encoded)
+            self._pending[key] = encoded
+            self._schedule_flush()
+
+    def delete(self, key: str) -> None:
+        """
+        Removes a value
+        :param key: The key of the value
+        :return: None
+        """
+        with self._lock:
+            self._check_open()
+            self._cache.pop(key, None)
+            self._pending[key] = None
+            self._schedule_flush()
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    def _check_open(self) -> None:
+        if self._connection is None:
+            raise RuntimeError(f"state store {self.db_file} is closed")
+
+    def _schedule_flush(self) -> None:
+        # Writes arriving while a flush is scheduled are coalesced into it
+        if self._flush_timer is not None:
+            return
+        self._flush_timer = threading.Timer(self.flush_delay, self.flush)
+        self._flush_timer.daemon = True
+        self._flush_timer.start()
+
+    @tracing.traced("state_store.flush")
+    def flush(self) -> None:
+        """
+        Writes every pending change to disk in one transaction
+        :return: None
+        """
+        with self._lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            if not self._pending:
+                return
+
+            pending = self._pending
+            self._pending = {}
+            try:
+                with self._connection:
+                    self._connection.execute("BEGIN")
+                    self._connection.executemany("INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)",
+                                                 [(key, value) for key, value in pending.items() if value is not None])
+                    self._connection.executemany("DELETE FROM state WHERE key = ?",
+                                                 [(key,) for key, value in pending.items() if value is None])
+            except sqlite3.Error:
+                # Keep the changes so the next flush retries them, unless newer ones replaced them
+                self._pending = {**pending, **self._pending}
+                raise
+            tracing.debug("flushed state changes", count=len(pending))
+
+    def close(self) -> None:
+        """
+        Flushes the pending changes and closes the database
+        :return: None
+        """
+        with self._lock:
+            if self._connection is None:
+                return
+            self.flush()
+            self._connection.close()
+            self._connection = None
+        atexit.unregister(self.close)
+
+    def migrate_json_file(self, key: str, json_file: str) -> None:
+        """
+        Imports a value from a json file the state used to be kept in, and renames the file so it isn't imported again
+        A file that can't be decoded is left where it is instead of being deleted.
+        :param key: The key to store the value under, nothing is imported if it already exists
+        :param json_file: The json file to be imported
+        :return: None
+        """
+        if not os.path.isfile(json_file) or key in self:
+            return
+
+        try:
+            with open(json_file, "r") as f:
+                value = json.load(f)
+        except (OSError, json.decoder.JSONDecodeError) as e:
+            tracing.warning("could not migrate", json_file=json_file, error=e)
+            return
+
+        self.set(key, value)
+        self.flush()
+        os.replace(json_file, f"{json_file}.migrated")
+        tracing.info("migrated", json_file=json_file, key=key)
@@ -0,0 +1,122 @@
+import pytest
+from mod_metadata import ModMetadata
+from mod_validation import ModFolderValidator, compare_versions, version_satisfies
+
+
+def mod(mod_id: str, version: str, loader: str = "forge", jar: str = None, **dependencies: str) -> ModMetadata:
+    return ModMetadata(mod_id, version, loader, "1.20.1", dependencies, jar or f"{mod_id}.jar")
+
+
+@pytest.mark.parametrize("a, b, expected", [
+    ("1.10", "1.9", 1),
+    ("1.0", "1.0.0", 0),
+    ("1.0-beta", "1.0", -1),
+    ("1.0-alpha", "1.0-beta", -1),
+    ("v2.1", "2.1", 0),
+    ("1.0+build.5", "1.0", 0),
+    ("abc", "1.0", None),
+])
+def test_compare_versions(a, b, expected):
+    assert compare_versions(a, b) == expected
+
+
+@pytest.mark.parametrize("version, expected", [
+    ("1.1", False),
+    ("1.2", True),
+    ("1.9.9", True),
+    ("2", False),
+    ("2.0.1", False),
+])
+def test_maven_half_open_range(version, expected):
+    assert version_satisfies(version, "[1.2,2)", "forge") is expected
+
+
+@pytest.mark.parametrize("version, expected", [
+    ("0.1", True),
+    ("1.0", True),
+    ("1.0.0", True),
+    ("1.0.1", False),
+])
+def test_maven_range_without_lower_bound(version, expected):
+    assert version_satisfies(version, "(,1.0]", "forge") is expected
+
+
+@pytest.mark.parametrize("version, expected", [
+    ("1.5", True),
+    ("2.5", False),
+    ("3.1", True),
+])
+def test_maven_union_of_ranges(version, expected):
+    assert version_satisfies(version, "[1.0,2.0), [3.0,)", "forge") is expected
+
+
+def test_maven_bare_version_is_a_recommendation():
+    assert version_satisfies("0.5", "1.0", "forge") is True
+
+
+@pytest.mark.parametrize("version, expected", [
+    ("1.2", True),
+    ("1.2.5", True),
+    ("1.3", False),
+    ("1.1.9", False),
+])
+def test_semver_tilde(version, expected):
+    assert version_satisfies(version, "~1.2", "fabric") is expected
+
+
+@pytest.mark.parametrize("version, expected", [
+    ("1.2", True),
+    ("1.9", True),
+    ("2.0", False),
+])
+def test_semver_caret(version, expected):
+    assert version_satisfies(version, "^1.2", "fabric") is expected
+
+
+@pytest.mark.parametrize("loader", ["forge", "fabric"])
+def test_any_version(loader):
+    assert version_satisfies("9.9", "*", loader) is True
+    assert version_satisfies("9.9", "", loader) is True
+
+
+def test_semver_wildcards_and_alternatives():
+    assert version_satisfies("1.16.5", "1.16.x", "fabric") is True
+    assert version_satisfies("1.17", "1.16.x", "fabric") is False
+    assert version_satisfies("1.5", ">=1.0 <2.0", "fabric") is True
+    assert version_satisfies("2.0", ">=1.0 <2.0", "fabric") is False
+    assert version_satisfies("3.0", "<2.0 || >=3.0", "fabric") is True
+
+
+@pytest.mark.parametrize("version, version_range, loader", [
+    ("1.0", "[1.2", "forge"),
+    ("1.0", "[1.0,2.0", "forge"),
+    ("1.0", "1.2,2)", "forge"),
+    ("1.0", "[abc,def)", "forge"),
+    ("abc", "[1.0,)", "forge"),
+    ("1.0", "~abc", "fabric"),
+    ("1.0", ">=", "fabric"),
+    ("1.0", "~", "fabric"),
+])
+def test_malformed_input_is_unknown(version, version_range, loader):
+    assert version_satisfies(version, version_range, loader) is None
+
+
+def test_validator_reports_missing_and_mismatched_dependencies():
+    validator = ModFolderValidator()
+    issues = validator.check([mod("jei", "11.0", minecraft="*", forge="[47,)"), mod("addon", "1.0", jei="[12,)", lib="*")])
+    assert sorted((issue.kind, issue.mod_id) for issue in issues) == [("missing_dependency", "addon"),
+                                                                       ("version_mismatch", "addon")]
+
+
+def test_validator_reevaluates_dependents_of_changed_mods():
+    validator = ModFolderValidator()
+    assert [issue.kind for issue in validator.check([mod("jei", "11.0"), mod("addon", "1.0", jei="[12,)")])] == ["version_mismatch"]
+    assert validator.check([mod("jei", "12.1"), mod("addon", "1.0", jei="[12,)")]) == []
+    assert [issue.kind for issue in validator.check([mod("addon", "1.0", jei="[12,)")])] == ["missing_dependency"]
+
+
+def test_validator_ignores_unknown_versions_and_reports_duplicates():
+    validator = ModFolderValidator()
+    assert validator.check([mod("jei", "abc"), mod("addon", "1.0", jei="[12,)")]) == []
+    issues = validator.check([mod("jei", "12.0", jar="a.jar"), mod("jei", "12.1", jar="b.jar")])
+    assert [issue.kind for issue in issues] == ["duplicate"]
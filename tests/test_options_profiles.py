@@ -0,0 +1,139 @@
+import json
+import os
+import pytest
+from options_profiles import OptionsProfiles, apply_delta, diff_options, format_options, merge_options, parse_options
+
+BASE = {"fov": "70", "renderDistance": "12", "key_key.jump": "key.keyboard.space", "lang": "en_us"}
+PVP = {**BASE, "fov": "90", "key_key.jump": "key.keyboard.w"}
+BUILD = {"fov": "70", "renderDistance": "32", "lang": "en_us", "chatScale": "0.5"}
+
+
+@pytest.fixture
+def profiles(tmp_path):
+    profiles = OptionsProfiles(str(tmp_path / "options_deltas"))
+    profiles.set_base(BASE)
+    profiles.save("pvp", PVP)
+    profiles.save("pack/build", BUILD)
+    return profiles
+
+
+def base_files(profiles):
+    return sorted(name for name in os.listdir(profiles.deltas_dir) if name.startswith("base") and name.endswith(".txt"))
+
+
+def test_options_round_trip():
+    text = "fov:70\nlastServer:mc.example.com:25565\nnot an option\n"
+    options = parse_options(text)
+    assert options == {"fov": "70", "lastServer": "mc.example.com:25565"}
+    assert parse_options(format_options(options)) == options
+
+
+def test_delta_round_trip():
+    delta = diff_options(BASE, BUILD)
+    assert delta == {"renderDistance": "32", "chatScale": "0.5", "key_key.jump": None}
+    assert apply_delta(BASE, delta) == BUILD
+
+
+def test_profiles_store_only_their_differences(profiles):
+    assert sorted(profiles.names()) == ["pack/build", "pvp"]
+    assert profiles.load("pvp") == PVP
+    assert profiles.load("pack/build") == BUILD
+    with open(profiles._delta_file("pvp"), "r", encoding="utf-8") as f:
+        assert json.load(f)["delta"] == {"fov": "90", "key_key.jump": "key.keyboard.w"}
+
+
+def test_rebasing_keeps_every_profile_and_removes_the_old_base(profiles):
+    old_bases = base_files(profiles)
+    new_base = {**BASE, "fov": "90", "renderDistance": "32", "gamma": "1.0"}
+    profiles.set_base(new_base)
+
+    assert profiles.get_base() == new_base
+    assert profiles.load("pvp") == PVP
+    assert profiles.load("pack/build") == BUILD
+    assert len(base_files(profiles)) == 1 and base_files(profiles) != old_bases
+    # The deltas are over the new base, e.g. pvp's fov now matches it
+    with open(profiles._delta_file("pvp"), "r", encoding="utf-8") as f:
+        assert "fov" not in json.load(f)["delta"]
+
+
+def test_profiles_saved_after_a_rebase_use_the_new_base(profiles):
+    profiles.set_base(PVP)
+    profiles.save("new", {**PVP, "lang": "de_de"})
+    with open(profiles._delta_file("new"), "r", encoding="utf-8") as f:
+        assert json.load(f)["delta"] == {"lang": "de_de"}
+    assert profiles.load("new") == {**PVP, "lang": "de_de"}
+
+
+def test_interrupted_rebase_leaves_every_profile_loadable(profiles, monkeypatch):
+    written = []
+    write_delta = OptionsProfiles._write_delta
+
+    def crash_after_first(self, name, stored):
+        if written:
+            raise OSError("disk full")
+        written.append(name)
+        write_delta(self, name, stored)
+
+    monkeypatch.setattr(OptionsProfiles, "_write_delta", crash_after_first)
+    with pytest.raises(OSError):
+        profiles.set_base({"fov": "110"})
+    monkeypatch.undo()
+
+    # One delta is over the new base, the other still over the old one, which stays current
+    assert profiles.get_base() == BASE
+    assert profiles.load("pvp") == PVP
+    assert profiles.load("pack/build") == BUILD
+    profiles.set_base({"fov": "110"})
+    assert profiles.load("pvp") == PVP
+    assert profiles.load("pack/build") == BUILD
+    assert len(base_files(profiles)) == 1
+
+
+def test_changes_made_in_game_are_kept_when_rebasing(profiles):
+    path = profiles.materialize("pvp")
+    assert parse_options(open(path, encoding="utf-8").read()) == PVP
+    assert profiles.materialize("pvp") == path
+
+    in_game = {**PVP, "renderDistance": "6"}
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(format_options(in_game))
+    os.utime(path, ns=(os.stat(path).st_atime_ns, os.stat(path).st_mtime_ns + 1_000_000))
+    profiles.set_base(BUILD)
+    assert profiles.load("pvp") == in_game
+
+
+def test_legacy_deltas_without_a_base_name_load(tmp_path):
+    deltas_dir = tmp_path / "options_deltas"
+    deltas_dir.mkdir()
+    (deltas_dir / "base.txt").write_text(format_options(BASE), encoding="utf-8")
+    (deltas_dir / "old.delta.json").write_text(json.dumps({"delta": {"fov": "90"}}), encoding="utf-8")
+    profiles = OptionsProfiles(str(deltas_dir))
+    assert profiles.load("old") == {**BASE, "fov": "90"}
+
+    profiles.set_base(PVP)
+    assert profiles.load("old") == {**BASE, "fov": "90"}
+    assert not (deltas_dir / "base.txt").exists()
+
+
+def test_compact_stores_options_files_over_their_most_common_values(tmp_path):
+    options_folder = tmp_path / "options_folder"
+    options_folder.mkdir()
+    files = {}
+    for name, options in (("a", PVP), ("b", BASE), ("c", {**BASE, "lang": "fr_fr"})):
+        files[name] = str(options_folder / name)
+        (options_folder / name).write_text(format_options(options), encoding="utf-8")
+
+    profiles = OptionsProfiles(str(tmp_path / "options_deltas"))
+    profiles.compact(files)
+    assert os.listdir(options_folder) == []
+    assert profiles.get_base() == BASE
+    assert profiles.load("a") == PVP
+    assert profiles.load("c") == {**BASE, "lang": "fr_fr"}
+
+
+def test_merge_takes_categories_from_each_part():
+    merged = merge_options(BASE, [(PVP, ["keybinds"]), (BUILD, ["video"])])
+    assert merged == {**BASE, "key_key.jump": "key.keyboard.w", "renderDistance": "32"}
+    assert merge_options(BASE, [(BUILD, None)])["chatScale"] == "0.5"
+    with pytest.raises(ValueError):
+        merge_options(BASE, [(PVP, ["keybindings"])])
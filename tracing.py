@@ -0,0 +1,328 @@
+import atexit
+import collections
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import typing
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+OFF = 100
+
+LEVEL_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR", OFF: "OFF"}
+
+# Trace events kept in memory before the oldest are dropped, about 200 bytes each
+MAX_TRACE_EVENTS = 200_000
+
+# Histogram buckets are powers of two in microseconds, the last one also holds everything slower (~67s)
+HISTOGRAM_BUCKETS = 27
+
+_level = WARNING
+_log_file = sys.stderr
+_log_lock = threading.Lock()
+
+_trace_events: typing.Optional[typing.Deque[dict]] = None
+_trace_file: typing.Optional[str] = None
+_trace_start = time.perf_counter()
+_pid = os.getpid()
+
+_histograms: typing.Dict[str, "LatencyHistogram"] = {}
+_histograms_lock = threading.Lock()
+# Spans are only timed into their histograms while collecting stats or tracing, otherwise they cost a check
+_collect_stats = False
+
+
+def set_level(level: typing.Union[int, str]) -> None:
+    """
+    Sets the lowest level that is logged, messages below it cost a single comparison
+    :param level: One of DEBUG/INFO/WARNING/ERROR/OFF, or its name
+    :return: None
+    """
+    global _level
+    if isinstance(level, str):
+        names = {name: value for value, name in LEVEL_NAMES.items()}
+        if level.upper() not in names:
+            raise ValueError(f"unknown log level {level!r}, expected one of {sorted(names)}")
+        level = names[level.upper()]
+    _level = level
+
+
+def is_enabled(level: int) -> bool:
+    """
+    Whether messages at a level are logged, to skip building expensive fields
+    :param level: The level to check
+    :return: True if it would be logged
+    """
+    return level >= _level
+
+
+def log(level: int, message: str, **fields: typing.Any) -> None:
+    """
+    Logs a message with structured fields, formatting only happens if the level is enabled
+    :param level: The message's level
+    :param message: A fixed description of the event, the variable parts go in fields
+    :param fields: Written after the message as key=value
+    :return: None
+    """
+    if level < _level:
+        return
+    line = f"{time.strftime('%H:%M:%S')} {LEVEL_NAMES.get(level, level)} {message}"
+    if fields:
+        line += " " + " ".join(f"{key}={value!r}" if isinstance(value, str) else f"{key}={value}"
+                               for key, value in fields.items())
+    with _log_lock:
+        print(line, file=_log_file)
+
+
+def debug(message: str, **fields: typing.Any) -> None:
+    if DEBUG >= _level:
+        log(DEBUG, message, **fields)
+
+
+def info(message: str, **fields: typing.Any) -> None:
+    if INFO >= _level:
+        log(INFO, message, **fields)
+
+
+def warning(message: str, **fields: typing.Any) -> None:
+    if WARNING >= _level:
+        log(WARNING, message, **fields)
+
+
+def error(message: str, **fields: typing.Any) -> None:
+    if ERROR >= _level:
+        log(ERROR, message, **fields)
+
+
+class LatencyHistogram:
+    """
+    Counts the durations of one kind of span in power of two buckets
+    Recording is constant time and memory, percentiles are accurate to within a factor of two.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.buckets = [0] * HISTOGRAM_BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        """
+        Adds one duration
+        :param seconds: How long the span took
+        :return: None
+        """
+        bucket = min(int(seconds * 1_000_000).bit_length(), HISTOGRAM_BUCKETS - 1)
+        with self._lock:
+            self.buckets[bucket] += 1
+            self.count += 1
+            self.total += seconds
+            if seconds < self.min:
+                self.min = seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def percentile(self, fraction: float) -> float:
+        """
+        Estimates a percentile from the buckets
+        :param fraction: Between 0 and 1, 0.5 is the median
+        :return: The upper bound of the bucket holding the percentile in seconds, capped to the slowest duration
+        """
+        with self._lock:
+            if self.count == 0:
+                return 0.0
+            wanted = fraction * self.count
+            seen = 0
+            for bucket, bucket_count in enumerate(self.buckets):
+                seen += bucket_count
+                if seen >= wanted and bucket_count > 0:
+                    return min((1 << bucket) / 1_000_000, self.max)
+            return self.max
+
+    def summary(self) -> typing.Dict[str, float]:
+        """
+        :return: The count and the mean, median, p95, p99 and max in seconds
+        """
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+            "max": self.max,
+        }
+
+
+def get_histogram(name: str) -> LatencyHistogram:
+    """
+    Gets the histogram of a kind of span, creating it if needed
+    :param name: The span name
+    :return: The span's histogram
+    """
+    histogram = _histograms.get(name)
+    if histogram is None:
+        with _histograms_lock:
+            histogram = _histograms.setdefault(name, LatencyHistogram(name))
+    return histogram
+
+
+def latency_summary() -> typing.Dict[str, typing.Dict[str, float]]:
+    """
+    :return: Each span that ran with the summary of its histogram, slowest total time first
+    """
+    histograms = sorted((histogram for histogram in list(_histograms.values()) if histogram.count > 0),
+                        key=lambda histogram: histogram.total, reverse=True)
+    return {histogram.name: histogram.summary() for histogram in histograms}
+
+
+def reset_histograms() -> None:
+    with _histograms_lock:
+        _histograms.clear()
+
+
+def collect_stats(enabled: bool = True) -> None:
+    """
+    Starts or stops timing every span into its histogram, see latency_summary
+    :param enabled: Whether to time the spans
+    :return: None
+    """
+    global _collect_stats
+    _collect_stats = enabled
+
+
+class span:
+    """
+    Times a block of code into the span's histogram, and into the trace while tracing
+    Usable as a context manager, `with tracing.span("name", key=value):`, fields are only kept in the trace.
+    """
+
+    __slots__ = ("name", "fields", "start")
+
+    def __init__(self, name: str, **fields: typing.Any) -> None:
+        self.name = name
+        self.fields = fields
+        self.start = 0.0
+
+    def __enter__(self) -> "span":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        end = time.perf_counter()
+        if _collect_stats:
+            get_histogram(self.name).record(end - self.start)
+        if _trace_events is not None:
+            args = self.fields
+            if exc_type is not None:
+                args = {**args, "error": exc_type.__name__}
+            _record_event(self.name, self.start, end, args)
+
+
+def traced(name: str) -> typing.Callable:
+    """
+    Decorates a function so every call is a span
+    :param name: The span name
+    :return: The decorator
+    """
+    def decorator(func: typing.Callable) -> typing.Callable:
+        histogram = get_histogram(name)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _collect_stats and _trace_events is None:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                end = time.perf_counter()
+                if _collect_stats:
+                    histogram.record(end - start)
+                if _trace_events is not None:
+                    _record_event(name, start, end, {})
+        return wrapper
+    return decorator
+
+
+def _record_event(name: str, start: float, end: float, args: dict) -> None:
+    event = {
+        "name": name,
+        "ph": "X",
+        "ts": (start - _trace_start) * 1_000_000,
+        "dur": (end - start) * 1_000_000,
+        "pid": _pid,
+        "tid": threading.get_ident(),
+    }
+    if args:
+        event["args"] = {key: value if isinstance(value, (int, float, bool)) else str(value) for key, value in args.items()}
+    events = _trace_events
+    if events is not None:
+        events.append(event)
+
+
+def start_trace(trace_file: typing.Optional[str] = None) -> None:
+    """
+    Starts keeping span events for a trace
+    :param trace_file: If given, the trace is written there when the program exits
+    :return: None
+    """
+    global _trace_events, _trace_file
+    if _trace_events is None:
+        _trace_events = collections.deque(maxlen=MAX_TRACE_EVENTS)
+    if trace_file is not None:
+        if _trace_file is None:
+            atexit.register(_export_at_exit)
+        _trace_file = trace_file
+
+
+def stop_trace() -> typing.List[dict]:
+    """
+    Stops keeping span events
+    :return: The events kept so far
+    """
+    global _trace_events
+    events = list(_trace_events or [])
+    _trace_events = None
+    return events
+
+
+def export_trace(trace_file: str) -> int:
+    """
+    Writes the events kept so far in Chrome's trace event format, open it in chrome://tracing or Perfetto
+    :param trace_file: The json file to write
+    :return: The number of events written
+    """
+    events = list(_trace_events or [])
+    thread_names = [{"name": "thread_name", "ph": "M", "pid": _pid, "tid": thread.ident, "args": {"name": thread.name}}
+                    for thread in threading.enumerate()]
+    # Imported here, atomic_link logs through this module
+    from atomic_link import atomic_write
+    with atomic_write(trace_file) as f:
+        json.dump({"traceEvents": thread_names + events, "displayTimeUnit": "ms"}, f)
+    return len(events)
+
+
+def _export_at_exit() -> None:
+    if _trace_file is None or _trace_events is None:
+        return
+    try:
+        export_trace(_trace_file)
+    except OSError as e:
+        warning("could not write trace", trace_file=_trace_file, error=e)
+
+
+# MMC_LOG_LEVEL=debug logs everything, MMC_STATS=1 times every span, MMC_TRACE_FILE=trace.json records a trace of the whole run
+if os.environ.get("MMC_LOG_LEVEL"):
+    set_level(os.environ["MMC_LOG_LEVEL"])
+if os.environ.get("MMC_STATS"):
+    collect_stats()
+if os.environ.get("MMC_TRACE_FILE"):
+    start_trace(os.environ["MMC_TRACE_FILE"])